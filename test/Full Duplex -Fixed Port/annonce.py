@@ -0,0 +1,102 @@
+# annonce.py
+"""
+Format compact des annonces multicast.
+
+L'ancien format (voir ports.MULTICAST_MSG_SIZE) a une taille fixe de
+1470 octets, surtout des zéros : champs de noms de 200 octets, place pour
+une clé de 1024 octets. Ici, seuls les champs présents sont transmis :
+    [ANNONCE_MAGIC: 3 octets] [Version: 1 octet] [Champs] [CRC32: 4 octets]
+Structure d'un champ (comme les extensions de poignee) :
+    [Type: 1 octet] [Longueur: 2 octets] [Valeur]
+Les champs de type inconnu sont ignorés, pour que les versions suivantes
+puissent en ajouter. Une annonce compacte fait toujours moins de 1470
+octets : la taille suffit à distinguer les deux formats.
+
+La clé publique n'est pas annoncée, seulement son empreinte : la clé
+est demandée au pair quand une session s'ouvre (voir
+Chats.cle_publique_pair). La taille d'une annonce ne dépend donc pas de
+celle de la clé.
+
+Une requête de découverte est une annonce (celle du demandeur) qui porte
+en plus CHAMP_REQUETE :
+    [Drapeaux: 1 octet] [Empreintes des pairs déjà connus: 4 octets chacune]
+Les pairs dont l'empreinte (annuaire.empreinte_pair) est listée ne
+répondent pas. Sans REPONSE_MULTICAST, la réponse (l'annonce du pair)
+est envoyée à l'adresse source de la requête ; avec, sur le groupe, où
+tous les appareils l'entendent.
+"""
+
+import binascii
+from typing import Dict, List, Set, Tuple
+
+ANNONCE_MAGIC = b"ANN"
+VERSION = 1
+
+CHAMP_NOMS = 1
+CHAMP_PRENOMS = 2
+CHAMP_CLE_PUB = 3         # clé entière : lu, plus émis (voir CHAMP_EMPREINTE_CLE)
+CHAMP_ADRESSE = 4  # [IP: 4 octets] [Port P2P: 2 octets]
+CHAMP_CHAINE = 5   # [Indice de la chaîne revendiquée + 1: 2 octets]
+CHAMP_ETAT = 6     # [Empreinte de l'annuaire de l'émetteur: 4 octets] (voir trickle)
+CHAMP_REQUETE = 7
+CHAMP_EMPREINTE_CLE = 8   # [Empreinte de la clé publique: ports.TAILLE_EMPREINTE octets]
+
+REPONSE_MULTICAST = 0x01
+TAILLE_EMPREINTE_PAIR = 4
+CONNUS_MAX = 300  # la requête tient dans un datagramme
+
+TAILLE_ENTETE = len(ANNONCE_MAGIC) + 1
+TAILLE_CRC = 4
+
+
+class ErreurAnnonce(Exception):
+    """Annonce compacte illisible"""
+    pass
+
+
+def encoder_requete(multicast: bool, connus: List[int]) -> bytes:
+    """Valeur de CHAMP_REQUETE ; au-delà de CONNUS_MAX, les pairs connus en trop répondront."""
+    return bytes([REPONSE_MULTICAST if multicast else 0]) + b"".join(
+        e.to_bytes(TAILLE_EMPREINTE_PAIR, 'big') for e in connus[:CONNUS_MAX])
+
+
+def decoder_requete(valeur: bytes) -> Tuple[bool, Set[int]]:
+    """(réponse sur le groupe, empreintes des pairs connus du demandeur)"""
+    if not valeur:
+        raise ErreurAnnonce("Requête vide")
+    connus = {int.from_bytes(valeur[i:i + TAILLE_EMPREINTE_PAIR], 'big')
+              for i in range(1, len(valeur) - TAILLE_EMPREINTE_PAIR + 1, TAILLE_EMPREINTE_PAIR)}
+    return bool(valeur[0] & REPONSE_MULTICAST), connus
+
+
+def encoder(champs: List[Tuple[int, bytes]]) -> bytes:
+    """Annonce portant les champs (type, valeur) donnés ; les valeurs vides sont omises."""
+    sortie = bytearray(ANNONCE_MAGIC + bytes([VERSION]))
+    for type_champ, valeur in champs:
+        if valeur:
+            sortie += bytes([type_champ]) + len(valeur).to_bytes(2, 'big') + valeur
+    return bytes(sortie) + binascii.crc32(sortie).to_bytes(TAILLE_CRC, 'big')
+
+
+def decoder(octets: bytes) -> Dict[int, bytes]:
+    """Champs d'une annonce compacte, par type."""
+    if len(octets) < TAILLE_ENTETE + TAILLE_CRC or not octets.startswith(ANNONCE_MAGIC):
+        raise ErreurAnnonce("Pas une annonce compacte")
+    corps, crc = octets[:-TAILLE_CRC], octets[-TAILLE_CRC:]
+    if binascii.crc32(corps).to_bytes(TAILLE_CRC, 'big') != crc:
+        raise ErreurAnnonce("CRC invalide")
+    if corps[len(ANNONCE_MAGIC)] != VERSION:
+        raise ErreurAnnonce("Version inconnue")
+    champs = {}
+    i = TAILLE_ENTETE
+    while i < len(corps):
+        if i + 3 > len(corps):
+            raise ErreurAnnonce("Champ tronqué")
+        type_champ = corps[i]
+        longueur = int.from_bytes(corps[i + 1:i + 3], 'big')
+        i += 3
+        if i + longueur > len(corps):
+            raise ErreurAnnonce("Champ tronqué")
+        champs.setdefault(type_champ, corps[i:i + longueur])
+        i += longueur
+    return champs
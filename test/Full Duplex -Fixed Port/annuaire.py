@@ -0,0 +1,231 @@
+# annuaire.py
+"""
+Annuaire des pairs découverts par multicast.
+
+Les entrées sont indexées par (ip, port P2P) : une annonce d'un pair
+connu ne coûte qu'une recherche dans un dictionnaire. Chaque entrée
+expire `ttl` secondes après sa dernière annonce ; les échéances sont
+rangées dans un tas, sans y toucher quand un pair se réannonce :
+l'échéance périmée est replacée à sa vraie date quand elle sort du tas.
+Seule l'arrivée d'un nouveau pair coûte un ajout dans le tas.
+
+Une entrée n'est jamais modifiée après insertion (une annonce la
+remplace par une nouvelle). Les lecteurs obtiennent un instantané,
+tuple d'entrées dans l'ordre d'arrivée, reconstruit seulement après un
+changement et lu sans verrou.
+
+L'empreinte de l'annuaire (voir trickle) est le XOR des empreintes des
+pairs : mise à jour à chaque arrivée ou départ, sans tout relire.
+
+Les changements sont publiés sous forme d'Evenement (APPARU, MIS_A_JOUR,
+DISPARU) aux abonnés (voir abonner) : une interface se met à jour pair
+par pair au lieu de relire tout l'instantané. Une annonce identique à la
+précédente (hors last_seen et empreinte d'état) ne publie rien.
+"""
+
+import hashlib
+import heapq
+import threading
+import time
+from queue import Queue, Empty
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+TTL = 90.0  # s, sans annonce du pair
+TAILLE_EMPREINTE = 4
+
+Cle = Tuple[str, int]
+
+APPARU = 0      # nouveau pair
+MIS_A_JOUR = 1  # annonce différente d'un pair connu (nom, clé, chaîne...)
+DISPARU = 2     # entrée expirée ou retirée
+
+
+class Evenement(NamedTuple):
+    type: int
+    entree: dict    # pour DISPARU, la dernière entrée connue
+    numero: int     # rang du changement dans l'annuaire (voir attendre_changement)
+
+
+def empreinte_pair(ip: str, port: int) -> int:
+    return int.from_bytes(hashlib.sha256(f"{ip}:{port}".encode()).digest()[:TAILLE_EMPREINTE], 'big')
+
+
+def _contenu(parsed: dict) -> dict:
+    """Ce qui distingue deux annonces pour les abonnés (l'état de l'annuaire de l'émetteur en est exclu)."""
+    return {k: v for k, v in parsed.items() if k != 'etat'}
+
+
+class Abonnement:
+    """
+    Abonnement aux changements d'un Annuaire, reçus dans une file
+    (prochain), ou passés à un rappel dans le fil qui reçoit les annonces.
+    """
+
+    def __init__(self, annuaire: "Annuaire", rappel: Optional[Callable[[Evenement], None]] = None):
+        self.annuaire = annuaire
+        self.rappel = rappel
+        self.evenements: Queue = Queue()
+
+    def _publier(self, evenement: Evenement):
+        if self.rappel is None:
+            self.evenements.put(evenement)
+            return
+        try:
+            self.rappel(evenement)
+        except Exception:
+            pass
+
+    def prochain(self, timeout: Optional[float] = None) -> Optional[Evenement]:
+        """Prochain changement (file seulement) ; None si aucun avant timeout."""
+        try:
+            return self.evenements.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def fermer(self):
+        self.annuaire.desabonner(self)
+
+
+class Annuaire:
+    """
+    Args:
+        ttl: durée de vie par défaut d'une entrée sans nouvelle annonce (s)
+        horloge: source de temps, time.time par défaut (last_seen en dépend)
+    """
+
+    def __init__(self, ttl: float = TTL, horloge: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.horloge = horloge
+        self._entrees: Dict[Cle, dict] = {}
+        self._expirations: Dict[Cle, float] = {}
+        self._echeances: List[Tuple[float, Cle]] = []
+        self._empreinte = 0
+        self._verrou = threading.Condition()
+        self._version = 0
+        self._instantane: Tuple[int, Tuple[dict, ...]] = (0, ())
+        self._abonnements: Tuple[Abonnement, ...] = ()
+        self.changements = 0  # nombre d'événements publiés
+
+    def __len__(self) -> int:
+        return len(self._entrees)
+
+    @property
+    def empreinte(self) -> bytes:
+        return self._empreinte.to_bytes(TAILLE_EMPREINTE, 'big')
+
+    def ajouter(self, ip: str, port: int, parsed: dict, payload: bytes = b'',
+                ttl: Optional[float] = None) -> bool:
+        """Entrée (re)mise à jour par une annonce. Retourne True pour un nouveau pair."""
+        maintenant = self.horloge()
+        cle = (ip, port)
+        ttl = self.ttl if ttl is None else ttl
+        entree = {'payload': payload, 'ip': ip, 'port': port, 'parsed': parsed, 'last_seen': maintenant, 'ttl': ttl}
+        expiration = maintenant + ttl
+        with self._verrou:
+            ancienne = self._entrees.get(cle)
+            nouveau = ancienne is None
+            self._entrees[cle] = entree
+            if nouveau or expiration < self._expirations[cle]:
+                heapq.heappush(self._echeances, (expiration, cle))
+            self._expirations[cle] = expiration
+            if nouveau:
+                self._empreinte ^= empreinte_pair(ip, port)
+                evenements = self._noter([(APPARU, entree)])
+            elif _contenu(ancienne['parsed']) != _contenu(parsed):
+                evenements = self._noter([(MIS_A_JOUR, entree)])
+            else:
+                evenements = []
+            self._version += 1
+        self._publier(evenements)
+        return nouveau
+
+    def retirer(self, ip: str, port: int) -> bool:
+        cle = (ip, port)
+        with self._verrou:
+            entree = self._entrees.pop(cle, None)
+            if entree is None:
+                return False
+            del self._expirations[cle]  # son échéance, restée dans le tas, sera ignorée
+            self._empreinte ^= empreinte_pair(ip, port)
+            self._version += 1
+            evenements = self._noter([(DISPARU, entree)])
+        self._publier(evenements)
+        return True
+
+    def expirer(self) -> List[dict]:
+        """Retire les entrées échues ; retourne celles retirées."""
+        maintenant = self.horloge()
+        retirees = []
+        with self._verrou:
+            while self._echeances and self._echeances[0][0] <= maintenant:
+                _, cle = heapq.heappop(self._echeances)
+                expiration = self._expirations.get(cle)
+                if expiration is None:
+                    continue  # retirée entre-temps
+                if expiration > maintenant:
+                    heapq.heappush(self._echeances, (expiration, cle))  # réannoncée depuis
+                    continue
+                del self._expirations[cle]
+                retirees.append(self._entrees.pop(cle))
+                self._empreinte ^= empreinte_pair(*cle)
+            if retirees:
+                self._version += 1
+            evenements = self._noter([(DISPARU, entree) for entree in retirees])
+        self._publier(evenements)
+        return retirees
+
+    def get(self, ip: str, port: int) -> Optional[dict]:
+        return self._entrees.get((ip, port))
+
+    def instantane(self) -> Tuple[dict, ...]:
+        """Entrées actuelles, dans l'ordre d'arrivée (tuple à ne pas modifier)."""
+        version, entrees = self._instantane
+        if version == self._version:
+            return entrees
+        with self._verrou:
+            self._instantane = (self._version, tuple(self._entrees.values()))
+            return self._instantane[1]
+
+    def abonner(self, rappel: Optional[Callable[[Evenement], None]] = None) -> Abonnement:
+        """
+        Abonnement aux changements suivants. Sans rappel, les événements
+        s'accumulent dans abonnement.evenements jusqu'à fermer().
+        """
+        abonnement = Abonnement(self, rappel)
+        with self._verrou:
+            self._abonnements += (abonnement,)
+        return abonnement
+
+    def desabonner(self, abonnement: Abonnement):
+        with self._verrou:
+            self._abonnements = tuple(a for a in self._abonnements if a is not abonnement)
+
+    def attendre_changement(self, depuis: int, timeout: Optional[float] = None) -> int:
+        """
+        Attend qu'il y ait eu plus de `depuis` changements (voir
+        changements) ; retourne le nombre atteint, inchangé au timeout.
+        """
+        with self._verrou:
+            self._verrou.wait_for(lambda: self.changements > depuis, timeout)
+            return self.changements
+
+    # ------------------------------------------------------------------
+
+    def _noter(self, changements: List[Tuple[int, dict]]) -> List[Evenement]:
+        """Numérote les changements et réveille attendre_changement (verrou tenu)."""
+        evenements = []
+        for type_evenement, entree in changements:
+            self.changements += 1
+            evenements.append(Evenement(type_evenement, entree, self.changements))
+        if evenements:
+            self._verrou.notify_all()
+        return evenements
+
+    def _publier(self, evenements: List[Evenement]):
+        """Hors verrou : un rappel peut relire l'annuaire."""
+        if not evenements:
+            return
+        abonnements = self._abonnements
+        for evenement in evenements:
+            for abonnement in abonnements:
+                abonnement._publier(evenement)
@@ -0,0 +1,133 @@
+# balayage.py
+"""
+Balayage unicast d'un sous-réseau, quand le multicast ne passe pas.
+
+Une sonde (un datagramme) est envoyée à chaque cible (ip, port) depuis
+des sockets non bloquantes, à tour de rôle ; les réponses arrivent sur
+la socket d'envoi, de n'importe quel port de l'hôte sondé. Une sonde
+vers une adresse inoccupée attend la résolution ARP (quelques secondes,
+jusqu'à l'échec) en occupant le tampon d'envoi de sa socket : avec une
+seule socket, le tampon plein limiterait le balayage à quelques dizaines
+de sondes par seconde. D'où SOCKETS sockets, au tampon agrandi
+(TAILLE_TAMPON, dans la limite du système). L'envoi est limité par
+un seau à jetons (DEBIT sondes par seconde, rafales de RAFALE) et par
+le nombre de sondes en vol (EN_VOL_MAX), une sonde restant en vol DELAI
+secondes. Un hôte qui a répondu n'est plus sondé : en rangeant les
+cibles port par port, le port le plus probable d'abord, les autres
+ports des pairs trouvés sont épargnés.
+"""
+
+import selectors
+import socket
+import time
+from collections import deque
+from typing import Callable, List, Set, Tuple
+
+DEBIT = 2000.0     # sondes par seconde
+RAFALE = 64
+EN_VOL_MAX = 512
+DELAI = 0.25       # s, attente d'une réponse à une sonde
+SOCKETS = 8
+TAILLE_TAMPON = 1 << 20
+TAILLE_MAX = 4096
+
+
+class Balayage:
+    """
+    Args:
+        cibles: (ip, port) à sonder, dans l'ordre
+        sonde: datagramme envoyé à chaque cible
+        reponse: appelé avec (données, source) pour chaque datagramme
+            reçu ; retourne True si c'est une réponse valide (l'hôte
+            n'est alors plus sondé)
+    """
+
+    def __init__(self, cibles: List[Tuple[str, int]], sonde: bytes,
+                 reponse: Callable[[bytes, Tuple[str, int]], bool],
+                 debit: float = DEBIT, en_vol_max: int = EN_VOL_MAX, delai: float = DELAI):
+        self.cibles = cibles
+        self.sonde = sonde
+        self.reponse = reponse
+        self.debit = debit
+        self.en_vol_max = en_vol_max
+        self.delai = delai
+        self.envoyees = 0
+        self.repondu: Set[str] = set()
+        self._arret = False
+
+    def arreter(self):
+        self._arret = True
+
+    def executer(self) -> int:
+        """Balaye toutes les cibles, attend les dernières réponses ; retourne le nombre d'hôtes qui ont répondu."""
+        selecteur = selectors.DefaultSelector()
+        sockets = []
+        en_vol = deque()  # expirations, croissantes
+        jetons, dernier = float(RAFALE), time.monotonic()
+        i = 0
+        try:
+            for _ in range(SOCKETS):
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sockets.append(sock)
+                sock.setblocking(False)
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, TAILLE_TAMPON)
+                except OSError:
+                    pass
+                selecteur.register(sock, selectors.EVENT_READ)
+            tour = 0
+            while not self._arret:
+                maintenant = time.monotonic()
+                while en_vol and en_vol[0] <= maintenant:
+                    en_vol.popleft()
+                jetons = min(RAFALE, jetons + (maintenant - dernier) * self.debit)
+                dernier = maintenant
+                pleines = 0
+                while i < len(self.cibles) and jetons >= 1 and len(en_vol) < self.en_vol_max:
+                    ip, port = self.cibles[i]
+                    if ip in self.repondu:
+                        i += 1
+                        continue
+                    sock = sockets[tour]
+                    tour = (tour + 1) % len(sockets)
+                    try:
+                        sock.sendto(self.sonde, (ip, port))
+                    except BlockingIOError:
+                        pleines += 1
+                        if pleines == len(sockets):
+                            break  # tous les tampons pleins : on réessaie après l'attente
+                        continue
+                    except OSError:
+                        pass  # hôte ou réseau injoignable
+                    i += 1
+                    self.envoyees += 1
+                    en_vol.append(maintenant + self.delai)
+                    jetons -= 1
+                if i >= len(self.cibles) and not en_vol:
+                    break
+                if i < len(self.cibles) and len(en_vol) < self.en_vol_max:
+                    attente = max(0.001, (1 - jetons) / self.debit)
+                else:
+                    attente = en_vol[0] - maintenant
+                for cle, _ in selecteur.select(attente):
+                    self._lire(cle.fileobj)
+        finally:
+            selecteur.close()
+            for sock in sockets:
+                sock.close()
+        return len(self.repondu)
+
+    def _lire(self, sock: socket.socket):
+        while True:
+            try:
+                donnees, source = sock.recvfrom(TAILLE_MAX)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue  # erreur ICMP remontée par un envoi précédent
+            try:
+                valide = self.reponse(donnees, source)
+            except Exception:
+                valide = False
+            if valide:
+                self.repondu.add(source[0])
@@ -0,0 +1,77 @@
+# bench_annonces.py
+"""
+Trafic des annonces multicast en régime stable, selon le nombre
+d'appareils : intervalle fixe (ancien ANNOUNCE_INTERVAL de 0.6 s) contre
+Trickle (voir trickle), avec l'annonce de présence forcée (voir
+Chats.periode_presence).
+
+Simulation sans réseau, sur une horloge virtuelle : tous les appareils
+s'entendent et ont le même état, chaque annonce Trickle émise est comptée
+comme cohérente par tous les autres. Les appareils démarrent ensemble ;
+le trafic est mesuré après --chauffe secondes.
+
+    python bench_annonces.py [--appareils 10 50 200 1000] [--duree 600] [--chauffe 120]
+"""
+
+import argparse
+import heapq
+import random
+
+import ports
+import trickle
+
+INTERVALLE_FIXE = 0.6
+
+
+def periode_presence(appareils: int) -> float:
+    """Chats.periode_presence quand tous les appareils se connaissent."""
+    return max(ports.PRESENCE_MIN, appareils / ports.DEBIT_PRESENCE)
+
+
+def simuler(appareils: int, duree: float, chauffe: float) -> float:
+    """Annonces par seconde sur tout le réseau, après la chauffe."""
+    maintenant = [0.0]
+    horloge = lambda: maintenant[0]
+    regles = [trickle.Trickle(horloge=horloge) for _ in range(appareils)]
+    presence = periode_presence(appareils)
+    # Présences forcées décalées au hasard, comme des appareils démarrés à des instants différents
+    dernieres = [-random.uniform(0, presence) for _ in range(appareils)]
+    tas = [(r.echeance(), i) for i, r in enumerate(regles)]
+    tas += [(d + presence, i) for i, d in enumerate(dernieres)]
+    heapq.heapify(tas)
+    emises = 0
+    while tas:
+        instant, i = heapq.heappop(tas)
+        if instant > chauffe + duree:
+            break
+        maintenant[0] = instant
+        regle = regles[i]
+        if regle.avancer() or instant - dernieres[i] >= presence:
+            dernieres[i] = instant
+            emises += instant >= chauffe
+            for j, autre in enumerate(regles):
+                if j != i:
+                    autre.coherent()
+            heapq.heappush(tas, (instant + presence, i))
+        heapq.heappush(tas, (regle.echeance(), i))
+    return emises / duree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--appareils", type=int, nargs="+", default=[10, 50, 200, 1000])
+    parser.add_argument("--duree", type=float, default=600.0, help="durée mesurée (s virtuelles)")
+    parser.add_argument("--chauffe", type=float, default=120.0, help="durée ignorée au départ (s virtuelles)")
+    args = parser.parse_args()
+    print(f"Trickle : imin {trickle.IMIN} s, imax {trickle.IMIN * (1 << trickle.DOUBLEMENTS):.1f} s, "
+          f"k {trickle.K} ; présence forcée : au moins toutes les {ports.PRESENCE_MIN:.0f} s, "
+          f"au plus {ports.DEBIT_PRESENCE} /s au total")
+    print(f"{'appareils':>9} {'fixe /s':>9} {'Trickle /s':>11} {'dont présence /s':>17}")
+    for appareils in args.appareils:
+        trickle_s = simuler(appareils, args.duree, args.chauffe)
+        print(f"{appareils:>9} {appareils / INTERVALLE_FIXE:>9.1f} {trickle_s:>11.2f} "
+              f"{appareils / periode_presence(appareils):>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
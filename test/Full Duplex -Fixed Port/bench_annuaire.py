@@ -0,0 +1,63 @@
+# bench_annuaire.py
+"""
+Coût d'une annonce reçue selon le nombre de pairs connus : annuaire
+indexé (voir annuaire) contre l'ancienne liste de contenu_chaines
+(recherche du pair, puis d'une place libre, puis de la plus vieille
+entrée quand la liste est pleine). La liste a autant de places que de
+pairs, pour ne mesurer que le parcours.
+
+    python bench_annuaire.py [--pairs 100 1000 10000] [--annonces 20000]
+"""
+
+import argparse
+import random
+import time
+
+import annuaire
+
+
+def ancienne_liste(places: int):
+    contenu = [None] * places
+
+    def ajouter(ip, port, parsed):
+        for i, entree in enumerate(contenu):
+            if entree and entree.get('ip') == ip and entree.get('port') == port:
+                contenu[i] = {'ip': ip, 'port': port, 'parsed': parsed, 'last_seen': time.time()}
+                return
+        for i in range(len(contenu)):
+            if contenu[i] is None:
+                contenu[i] = {'ip': ip, 'port': port, 'parsed': parsed, 'last_seen': time.time()}
+                return
+        plus_vieille = min(range(len(contenu)),
+                           key=lambda i: contenu[i]['last_seen'] if contenu[i] else float('inf'))
+        contenu[plus_vieille] = {'ip': ip, 'port': port, 'parsed': parsed, 'last_seen': time.time()}
+    return ajouter
+
+
+def mesurer(ajouter, pairs, annonces: int) -> float:
+    """µs par annonce, tous les pairs déjà connus."""
+    for ip, port in pairs:
+        ajouter(ip, port, {})
+    tirages = [random.choice(pairs) for _ in range(annonces)]
+    debut = time.perf_counter()
+    for ip, port in tirages:
+        ajouter(ip, port, {})
+    return (time.perf_counter() - debut) / annonces * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--annonces", type=int, default=20000)
+    args = parser.parse_args()
+    print(f"{'pairs':>7} {'liste µs':>10} {'annuaire µs':>12}")
+    for n in args.pairs:
+        pairs = [(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 40000 + i % 1000) for i in range(n)]
+        # La liste est quadratique au remplissage : moins d'annonces mesurées
+        liste = mesurer(ancienne_liste(n), pairs, max(100, args.annonces * 100 // n))
+        index = mesurer(annuaire.Annuaire().ajouter, pairs, args.annonces)
+        print(f"{n:>7} {liste:>10.1f} {index:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
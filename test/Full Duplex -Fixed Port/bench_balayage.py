@@ -0,0 +1,44 @@
+# bench_balayage.py
+"""
+Durée d'un balayage unicast du sous-réseau (voir balayage et
+Chats.balayer_sous_reseau), sur tous les ports d'écoute, avec
+--pairs Chats locaux qui répondent.
+
+    python bench_balayage.py [--prefixe 24] [--debit 2000] [--pairs 1]
+"""
+
+import argparse
+import time
+
+import balayage
+import ports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prefixe", type=int, default=ports.PREFIXE_BALAYAGE)
+    parser.add_argument("--debit", type=float, default=balayage.DEBIT, help="sondes par seconde")
+    parser.add_argument("--pairs", type=int, default=1)
+    args = parser.parse_args()
+
+    pairs = [ports.Chats(multicast_active=True) for _ in range(args.pairs)]
+    for pair in pairs:
+        pair.balayage_auto = False
+    # Le balayeur n'écoute pas le multicast : seules les réponses aux sondes le renseignent
+    chats = ports.Chats(multicast_active=False)
+    chats.sock_de_recherche.close()
+    try:
+        debut = time.perf_counter()
+        trouves = chats.balayer_sous_reseau(args.prefixe, debit=args.debit)
+        ecoule = time.perf_counter() - debut
+        envoyees = chats.balayage.envoyees
+        print(f"{chats.ip}/{args.prefixe}, {len(ports.ports_decoutes)} ports : {envoyees} sondes en {ecoule:.2f} s "
+              f"({envoyees / ecoule:.0f} /s), {trouves} hôte(s), {len(chats.contenu_chaines)} pair(s) dans l'annuaire")
+    finally:
+        chats.close_all()
+        for pair in pairs:
+            pair.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# bench_cles.py
+"""
+Taille et coût de lecture d'une annonce compacte selon la taille de la
+clé publique : clé entière dans l'annonce (CHAMP_CLE_PUB, comme avant)
+contre empreinte seule (CHAMP_EMPREINTE_CLE, la clé étant demandée au
+pair à l'ouverture d'une session, voir Chats.cle_publique_pair).
+
+Sans réseau : les annonces sont construites et relues par
+Chats._build_multicast_payload et Chats._parse_multicast_payload.
+
+    python bench_cles.py [--tailles 0 32 256 1024] [--iterations 20000]
+"""
+
+import argparse
+import os
+import time
+
+import annonce
+import ports
+
+
+def annonce_cle_entiere(chats, cle: bytes) -> bytes:
+    """L'annonce avec la clé entière à la place de son empreinte."""
+    champs = annonce.decoder(chats._build_multicast_payload(b"Bench", b"Cle", cle, chats.port_p2p))
+    champs.pop(annonce.CHAMP_EMPREINTE_CLE, None)
+    champs[annonce.CHAMP_CLE_PUB] = cle
+    return annonce.encoder(sorted(champs.items()))
+
+
+def lecture_us(chats, charge: bytes, iterations: int) -> float:
+    debut = time.perf_counter()
+    for _ in range(iterations):
+        chats._parse_multicast_payload(charge)
+    return 1e6 * (time.perf_counter() - debut) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tailles", type=int, nargs="+", default=[0, 32, 256, 1024])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    chats = ports.Chats.__new__(ports.Chats)  # sans sockets
+    chats.ip, chats.port_p2p, chats.chaine_multicast, chats.annonces_compactes = "10.0.0.1", 5000, None, True
+    print(f"{'clé':>6} {'entière o':>10} {'lecture µs':>11} {'empreinte o':>12} {'lecture µs':>11}")
+    for taille in args.tailles:
+        cle = os.urandom(taille)
+        entiere = annonce_cle_entiere(chats, cle)
+        empreinte = chats._build_multicast_payload(b"Bench", b"Cle", cle, chats.port_p2p)
+        print(f"{taille:>6} {len(entiere):>10} {lecture_us(chats, entiere, args.iterations):>11.2f} "
+              f"{len(empreinte):>12} {lecture_us(chats, empreinte, args.iterations):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# bench_congestion.py
+"""
+Croissance du débit d'un Regulateur (voir congestion) en démarrage lent,
+et vérification : le débit doit doubler en un RTT, quels que soient le RTT
+et la taille des lots d'accusés.
+
+Sans réseau : un RTT acquitte les octets envoyés au débit du début du
+RTT, en lots de --lots octets, tous avec la même mesure de RTT.
+
+    python bench_congestion.py [--rtt 0.001 0.01 0.1] [--lots 1442 14420 144200] [--rtts 5]
+"""
+
+import argparse
+import sys
+
+import congestion
+
+TOLERANCE = 0.1  # écart toléré sur le facteur 2 par RTT
+
+
+def un_rtt(regulateur: congestion.Regulateur, rtt: float, lot: int):
+    """Accusés d'un RTT : debit * rtt octets, par lots de `lot` octets."""
+    reste = regulateur.debit * rtt
+    while reste > 0:
+        octets = min(lot, reste)
+        regulateur.accuse(int(octets) or 1, rtt)
+        reste -= octets
+
+
+def verifier(rtts: list, lots: list, n: int) -> int:
+    """Affiche le facteur de croissance par RTT ; retourne le nombre d'échecs."""
+    echecs = 0
+    print(f"{'RTT ms':>7} {'lot o':>8} " + " ".join(f"{'x RTT ' + str(i + 1):>8}" for i in range(n)))
+    for rtt in rtts:
+        for lot in lots:
+            regulateur = congestion.Regulateur()
+            regulateur.accuse(0, rtt)  # première mesure de RTT
+            facteurs = []
+            for _ in range(n):
+                avant = regulateur.debit
+                un_rtt(regulateur, rtt, lot)
+                if regulateur.debit >= congestion.DEBIT_MAX:
+                    break
+                facteurs.append(regulateur.debit / avant)
+            print(f"{1000 * rtt:>7.1f} {lot:>8} " + " ".join(f"{f:>8.2f}" for f in facteurs))
+            for f in facteurs:
+                if abs(f - 2) > 2 * TOLERANCE:
+                    echecs += 1
+                    print(f"  ÉCHEC : facteur {f:.2f} par RTT (RTT {1000 * rtt} ms, lots de {lot} o)")
+    return echecs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt", type=float, nargs="+", default=[0.001, 0.01, 0.1])
+    parser.add_argument("--lots", type=int, nargs="+",
+                        default=[congestion.TAILLE_PAQUET, 10 * congestion.TAILLE_PAQUET, 100 * congestion.TAILLE_PAQUET])
+    parser.add_argument("--rtts", type=int, default=5, help="RTT simulés par cas")
+    args = parser.parse_args()
+    echecs = verifier(args.rtt, args.lots, args.rtts)
+    print(f"{echecs} échec(s)")
+    sys.exit(1 if echecs else 0)
+
+
+if __name__ == "__main__":
+    main()
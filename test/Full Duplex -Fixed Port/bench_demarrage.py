@@ -0,0 +1,130 @@
+# bench_demarrage.py
+"""
+Temps de démarrage d'un Chats avec multicast : retour du constructeur et
+délai avant d'être annoncé sur une chaîne, selon le nombre de chaînes
+déjà occupées (des annonceurs factices émettent sur les premières
+adresses).
+
+La colonne « séquentiel » écoute les adresses une à une pendant le même
+intervalle, comme avant le sondage simultané (voir sondage). La colonne
+« essais » est le rang de la chaîne prise dans l'ordre d'essai du Chats
+(voir ordre_chaines).
+
+Avec --simulation, pas de réseau : des appareils arrivent un à un et
+prennent la première chaîne libre, soit en partant tous de la première
+adresse, soit dans l'ordre tiré de leur identité ; on compare le nombre
+moyen d'essais.
+
+    python bench_demarrage.py [--occupees 0 10 50] [--periode 0.02] [--simulation]
+"""
+
+import argparse
+import os
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+import ports
+
+
+def annonceurs(adresses, periode: float, arret: threading.Event):
+    """Émet une annonce valide (un pair factice par adresse) toutes les `periode` secondes."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+    charges = [ports.Chats._build_multicast_payload(SimpleNamespace(ip="10.0.0.1", port_p2p=1000 + i,
+                                                                    chaine_multicast=adresse), b"Occupe")
+               for i, adresse in enumerate(adresses)]
+    while not arret.is_set():
+        for adresse, charge in zip(adresses, charges):
+            try:
+                sock.sendto(charge, (adresse, ports.MULTICAST_PORT))
+            except OSError:
+                pass
+        arret.wait(periode)
+    sock.close()
+
+
+def sequentiel(ip: str) -> float:
+    """Première chaîne silencieuse, adresses écoutées une à une ; retourne la durée."""
+    debut = time.perf_counter()
+    for adresse in ports.adresses_multicast:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            s.bind((adresse, ports.MULTICAST_PORT))
+            s.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                         socket.inet_aton(adresse) + socket.inet_aton(ip))
+            s.settimeout(ports.MULTICAST_LISTEN_INTERVAL)
+            s.recvfrom(4096)
+        except socket.timeout:
+            break
+        finally:
+            s.close()
+    return time.perf_counter() - debut
+
+
+def mesurer(occupees: int, periode: float):
+    arret = threading.Event()
+    fil = threading.Thread(target=annonceurs, args=(ports.adresses_multicast[:occupees], periode, arret), daemon=True)
+    fil.start()
+    time.sleep(3 * periode)
+    try:
+        debut = time.perf_counter()
+        chats = ports.Chats(multicast_active=True)
+        constructeur = time.perf_counter() - debut
+        pret = chats.chaine_prete.wait(10)
+        annonce = time.perf_counter() - debut
+        essais = chats.essais_chaine if pret else -1
+        ip = chats.ip
+        chats.close_all()
+        duree_seq = sequentiel(ip)
+    finally:
+        arret.set()
+        fil.join()
+    print(f"{occupees:>9} {1000 * constructeur:>17.1f} {1000 * annonce if pret else float('nan'):>12.1f} "
+          f"{essais:>7} {1000 * duree_seq:>16.1f}")
+
+
+def simuler(appareils: int, par_identite: bool) -> float:
+    """Nombre moyen d'essais pour `appareils` arrivées successives."""
+    n = len(ports.adresses_multicast)
+    prises = set()
+    total = 0
+    for _ in range(appareils):
+        ordre = ports.ordre_chaines(os.urandom(16)) if par_identite else range(n)
+        for essai, indice in enumerate(ordre, 1):
+            if indice not in prises:
+                prises.add(indice)
+                total += essai
+                break
+    return total / appareils
+
+
+def simulation():
+    n = len(ports.adresses_multicast)
+    print(f"{n} chaînes ; essais moyens par appareil (arrivées successives)")
+    print(f"{'appareils':>9} {'occupation':>11} {'première adresse':>17} {'identité':>9}")
+    for appareils in (10, 50, 100, 150, 200, 250, 300):
+        lineaire = simuler(appareils, False)
+        hache = sum(simuler(appareils, True) for _ in range(20)) / 20
+        print(f"{appareils:>9} {appareils / n:>10.0%} {lineaire:>17.1f} {hache:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--occupees", type=int, nargs="+", default=[0, 10, 50])
+    parser.add_argument("--periode", type=float, default=0.02, help="période des annonceurs factices (s)")
+    parser.add_argument("--simulation", action="store_true", help="nombre d'essais simulé, sans réseau")
+    args = parser.parse_args()
+    if args.simulation:
+        simulation()
+        return
+    print(f"intervalle d'écoute : {1000 * ports.MULTICAST_LISTEN_INTERVAL:.0f} ms")
+    print(f"{'occupées':>9} {'constructeur ms':>17} {'annoncé ms':>12} {'essais':>7} {'séquentiel ms':>16}")
+    for occupees in args.occupees:
+        mesurer(occupees, args.periode)
+
+
+if __name__ == "__main__":
+    main()
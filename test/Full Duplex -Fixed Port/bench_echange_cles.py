@@ -0,0 +1,86 @@
+# bench_echange_cles.py
+"""
+Handshakes par seconde de l'échange de clés.
+
+1. En mémoire : offre + réponse + dérivation, pour chaque groupe.
+2. En boucle locale : création de sessions chiffrées entre deux Chats,
+   avec échange de clés complet (cache de tickets vidé avant chaque
+   session), puis par reprise sur ticket (voir reprise).
+
+    python bench_echange_cles.py [--duree 2] [--sessions 50]
+"""
+
+import argparse
+import time
+
+import echange_cles
+import ports
+import reprise
+
+
+def fdc_xor(octets: bytes, cle: bytes) -> bytes:
+    if not cle:
+        return octets
+    n = len(octets)
+    flux = (cle * (n // len(cle) + 1))[:n]
+    return (int.from_bytes(octets, 'big') ^ int.from_bytes(flux, 'big')).to_bytes(n, 'big')
+
+
+def bench_memoire(duree: float):
+    print("=== En mémoire ===")
+    cas = {"X25519": echange_cles.GROUPE_X25519, "MODP 2048": echange_cles.GROUPE_MODP2048}
+    disponibles = echange_cles.groupes_disponibles()
+    for nom, identifiant in cas.items():
+        if identifiant not in disponibles:
+            print(f"{nom:>10} : indisponible (module cryptography absent)")
+            continue
+        groupes = {identifiant: disponibles[identifiant]}
+        n = 0
+        debut = time.perf_counter()
+        while time.perf_counter() - debut < duree:
+            initiateur = echange_cles.Initiateur(groupes)
+            reponse, cle_r = echange_cles.repondre(initiateur.offre, groupes)
+            assert initiateur.terminer(reponse) == cle_r
+            n += 1
+        ecoule = time.perf_counter() - debut
+        print(f"{nom:>10} : {n / ecoule:8.1f} handshakes/s ({1000 * ecoule / n:.2f} ms)")
+
+
+def bench_sessions(n: int):
+    print("=== Sessions en boucle locale ===")
+    a = ports.Chats(ip="127.0.0.1", multicast_active=False, fdc=fdc_xor, fdd=fdc_xor)
+    b = ports.Chats(ip="127.0.0.1", multicast_active=False)
+    try:
+        b.annuaire.ajouter("127.0.0.1", a.port_p2p,
+                           {'noms': "Bench", 'prenoms': "A", 'cle_pub': None, 'infos_sup': b''})
+        for nom, complete in (("complètes", True), ("reprises", False)):
+            if not complete:  # première session : le ticket des suivantes
+                b.creer_session_par_multicast(0, fdc=fdc_xor, fdd=fdc_xor, session_supplementaire=True)
+            reprises = 0
+            debut = time.perf_counter()
+            for _ in range(n):
+                if complete:
+                    b.cache_tickets = reprise.CacheTickets()
+                session = b.creer_session_par_multicast(0, fdc=fdc_xor, fdd=fdc_xor, session_supplementaire=True)
+                if session.cle is None:
+                    raise RuntimeError("Échange de clés échoué")
+                reprises += session.reprise
+            ecoule = time.perf_counter() - debut
+            print(f"{n} sessions {nom:>9} : {n / ecoule:8.1f} sessions/s ({1000 * ecoule / n:.2f} ms par session, "
+                  f"{reprises} reprise(s))")
+    finally:
+        a.close_all()
+        b.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duree", type=float, default=2.0, help="durée par groupe (s)")
+    parser.add_argument("--sessions", type=int, default=50)
+    args = parser.parse_args()
+    bench_memoire(args.duree)
+    bench_sessions(args.sessions)
+
+
+if __name__ == "__main__":
+    main()
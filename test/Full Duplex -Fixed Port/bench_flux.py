@@ -0,0 +1,89 @@
+# bench_flux.py
+"""
+Débit d'un envoi de fichier en boucle locale selon le nombre de flux
+parallèles (voir Chats.ouvrir_flux et transfert).
+
+1. Nombre de flux fixé, de 1 à --flux.
+2. Nombre de flux ajusté au débit (comportement par défaut d'envoyer_fichier).
+
+    python bench_flux.py [--taille 64] [--flux 4] [--chiffre]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import ports
+
+
+def fdc_xor(octets: bytes, cle: bytes) -> bytes:
+    if not cle:
+        return octets
+    n = len(octets)
+    flux = (cle * (n // len(cle) + 1))[:n]
+    return (int.from_bytes(octets, 'big') ^ int.from_bytes(flux, 'big')).to_bytes(n, 'big')
+
+
+def envoyer(session, recepteur, chemin: str, adapter: bool):
+    """Un envoi complet ; retourne (Mo/s, flux actifs à la fin)."""
+    debut = time.perf_counter()
+    envoi = session.envoyer_fichier(chemin, adapter=adapter)
+    if not envoi.attendre(300):
+        raise RuntimeError(f"Transfert échoué : {envoi.erreur!r}")
+    ecoule = time.perf_counter() - debut
+    recu = recepteur.octets_a_recevoir.get(timeout=5)
+    os.remove(recu.chemin)
+    return envoi.taille / ecoule / 1e6, envoi.actifs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--taille", type=int, default=64, help="taille du fichier (Mo)")
+    parser.add_argument("--flux", type=int, default=4, help="nombre maximal de flux")
+    parser.add_argument("--chiffre", action="store_true", help="sessions chiffrées (XOR factice)")
+    args = parser.parse_args()
+
+    fdc = fdc_xor if args.chiffre else None
+    dossier = tempfile.mkdtemp()
+    chemin = os.path.join(dossier, "bench.bin")
+    with open(chemin, 'wb') as f:
+        for _ in range(args.taille):
+            f.write(os.urandom(1024 * 1024))
+
+    a = ports.Chats(ip="127.0.0.1", multicast_active=False, fdc=fdc, fdd=fdc)
+    b = ports.Chats(ip="127.0.0.1", multicast_active=False)
+    try:
+        a.voies_max = b.voies_max = max(1, args.flux - 1)
+        b.annuaire.ajouter("127.0.0.1", a.port_p2p,
+                           {'noms': "Bench", 'prenoms': "A", 'cle_pub': None, 'infos_sup': b''})
+        session = b.creer_session_par_multicast(0, fdc=fdc, fdd=fdc)
+        recepteur = a.sessions.par_id(session.id_distant)
+        tous = b.ouvrir_flux(session, args.flux - 1)
+        print(f"=== {args.taille} Mo, {'chiffré' if fdc else 'en clair'}, {len(tous) + 1} flux ouverts, {os.cpu_count()} CPU ===")
+
+        # Un premier envoi sur tous les flux, non mesuré : sort les régulateurs du démarrage lent
+        session.flux = tous
+        envoyer(session, recepteur, chemin, adapter=False)
+
+        print("--- Flux fixés ---")
+        reference = None
+        for n in range(1, len(tous) + 2):
+            session.flux = tous[:n - 1]
+            debit, _ = envoyer(session, recepteur, chemin, adapter=False)
+            reference = reference or debit
+            print(f"{n:>3} flux : {debit:8.1f} Mo/s  (x{debit / reference:.2f})")
+
+        print("--- Flux ajustés au débit ---")
+        session.flux = tous
+        debit, actifs = envoyer(session, recepteur, chemin, adapter=True)
+        print(f"{actifs:>3} flux retenus : {debit:8.1f} Mo/s")
+    finally:
+        a.close_all()
+        b.close_all()
+        shutil.rmtree(dossier, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
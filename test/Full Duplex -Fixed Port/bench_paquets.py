@@ -0,0 +1,301 @@
+# bench_paquets.py
+"""
+Mesure du coût de charger_octets / decharger_octets et vérification
+d'aller-retour par propriétés.
+
+    python bench_paquets.py                      # propriétés puis bench jusqu'à 100 Mo
+    python bench_paquets.py --max-taille 1000000 # bench plus court
+    python bench_paquets.py --proprietes 2000 --graine 7 --sans-bench
+
+Avec --copies, l'aller-retour est aussi vérifié entre les copies de
+paquets.py (courante, backup, backup v2) pour détecter une dérive de
+format. Une copie qui n'importe pas (dépendance absente) est signalée et
+sautée ; une dérive connue (DERIVES_CONNUES) est signalée sans échec.
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import contenus
+import paquets
+
+DOSSIER = os.path.dirname(os.path.abspath(__file__))
+COPIES = {
+    "courante": os.path.join(DOSSIER, "paquets.py"),
+    "backup": os.path.join(DOSSIER, "backup", "paquets.py"),
+    "backup v2": os.path.join(DOSSIER, "backup v2", "paquets.py"),
+}
+
+# Dérives attendues : nom de la copie qui décharge -> condition sur la taille.
+# decharger_octets des backups perd le dernier paquet quand il est plein
+# (taille multiple de 1431), corrigé dans la copie courante.
+DERIVES_CONNUES = {
+    "backup": lambda taille: taille and taille % 1431 == 0,
+    "backup v2": lambda taille: taille and taille % 1431 == 0,
+}
+
+TAILLES = [1, 1_000, 1_431, 64_000, 1_000_000, 10_000_000, 100_000_000]
+
+
+# ---------------------------------------------------------------------------
+# Chiffrement factice (XOR sur entiers, assez rapide pour 100 Mo)
+# ---------------------------------------------------------------------------
+
+def fdc_xor(octets: bytes, cle: bytes) -> bytes:
+    if not cle:
+        return octets
+    n = len(octets)
+    flux = (cle * (n // len(cle) + 1))[:n]
+    return (int.from_bytes(octets, 'big') ^ int.from_bytes(flux, 'big')).to_bytes(n, 'big')
+
+
+CLE = b"cle_de_test_bench"
+
+
+def charger_copie(nom: str, chemin: str):
+    """Charge une copie de paquets.py comme module indépendant ; retourne (module, erreur)."""
+    spec = importlib.util.spec_from_file_location(f"paquets_{nom.replace(' ', '_')}", chemin)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except ImportError as e:
+        print(f"  copie sautée : {nom} ({e})")
+        return None, str(e)
+    return module, None
+
+
+# ---------------------------------------------------------------------------
+# Propriétés
+# ---------------------------------------------------------------------------
+
+def tailles_limites(rng: random.Random):
+    """Tailles proches des frontières de paquets, puis tailles aléatoires."""
+    for k in range(4):
+        for delta in (-1, 0, 1):
+            if k * 1431 + delta >= 0:
+                yield k * 1431 + delta
+    while True:
+        yield rng.randrange(0, 20 * 1431)
+
+
+def verifier_proprietes(n: int, graine: int) -> int:
+    """Vérifie les propriétés d'aller-retour. Retourne le nombre d'échecs."""
+    rng = random.Random(graine)
+    registre = contenus.RegistreContenus()  # Gestionnaire brut pour tous les types
+    echecs = 0
+    tailles = tailles_limites(rng)
+
+    def echec(message):
+        nonlocal echecs
+        echecs += 1
+        print(f"  ÉCHEC (graine={graine}) : {message}")
+
+    for _ in range(n):
+        taille = next(tailles)
+        octets = rng.randbytes(taille)
+        tdc = rng.randrange(256).to_bytes(1, 'big')
+        infos = rng.randbytes(4)
+        chiffre = rng.random() < 0.5
+        fdc = fdc_xor if chiffre else NotImplemented
+        cle = CLE if chiffre else None
+
+        liste = paquets.charger_octets(octets, fdc, cle, tdc, infos)
+
+        # 1. decharger_octets(charger_octets(x)) == x
+        if paquets.decharger_octets(liste, fdc, cle) != octets:
+            echec(f"aller-retour taille={taille} chiffre={chiffre}")
+            continue
+
+        # 2. tailles fixes : entête 16 octets, paquets 1440 octets
+        if len(liste[0]) != 16 or any(len(p) != 1440 for p in liste[1:]):
+            echec(f"taille de paquet inattendue pour taille={taille}")
+
+        # 3. l'entête conserve tdc et infos_sup
+        entete = paquets.decharger_entete(fdc_xor(liste[0], cle) if chiffre else liste[0])
+        if entete[2] != tdc or entete[3] != infos:
+            echec(f"entête altérée pour taille={taille}")
+
+        # 4. le réassembleur accepte n'importe quel ordre d'arrivée
+        desordre = list(liste)
+        rng.shuffle(desordre)
+        reassembleur = paquets.Reassembleur(registre.creer, fdc, cle)
+        resultat = None
+        for d in desordre:
+            resultat = reassembleur.ajouter(d) if resultat is None else resultat
+        if resultat != octets:
+            echec(f"réassemblage dans le désordre taille={taille}")
+
+        # 5. paquets marqués : ceux d'un autre message (entête perdue) sont écartés
+        autre_infos = infos[:3] + bytes([(infos[3] + 1) % 256])
+        autres = paquets.charger_octets(rng.randbytes(taille), fdc, cle, tdc, autre_infos, marquer=True)
+        marques = paquets.charger_octets(octets, fdc, cle, tdc, infos, marquer=True)
+        reassembleur = paquets.Reassembleur(registre.creer, fdc, cle, marquage=True)
+        resultat = reassembleur.ajouter(marques[0])
+        for d in autres[1:]:
+            resultat = reassembleur.ajouter(d) if resultat is None else resultat
+        suite = marques[1:]
+        rng.shuffle(suite)
+        for d in suite:
+            resultat = reassembleur.ajouter(d) if resultat is None else resultat
+        if resultat != octets:
+            echec(f"paquets marqués mélangés taille={taille}")
+
+        # 5 bis. sans marque, un doublon arrivé après la fin n'entre pas dans le message suivant
+        suivant = rng.randbytes(taille)
+        reassembleur = paquets.Reassembleur(registre.creer, fdc, cle)
+        for d in liste:
+            reassembleur.ajouter(d)
+        resultat = None
+        for d in liste[1:] + paquets.charger_octets(suivant, fdc, cle, tdc, infos):
+            resultat = reassembleur.ajouter(d) if resultat is None else resultat
+        if resultat != suivant:
+            echec(f"doublon tardif mêlé au message suivant taille={taille}")
+
+        # 6. un bit modifié est détecté par le CRC
+        if not chiffre and len(liste) > 1:
+            i = rng.randrange(1, len(liste))
+            corrompu = bytearray(liste[i])
+            corrompu[rng.randrange(1436)] ^= 1 << rng.randrange(8)
+            try:
+                paquets.decharger_paquet(bytes(corrompu))
+                echec(f"corruption non détectée taille={taille}")
+            except paquets.CRCError:
+                pass
+
+    return echecs
+
+
+def verifier_copies(n: int, graine: int):
+    """
+    Croise charger_octets d'une copie et decharger_octets d'une autre.
+    Retourne (dérives inattendues, noms des copies qui n'ont pas pu être chargées).
+    """
+    rng = random.Random(graine)
+    chargees = {nom: charger_copie(nom, chemin) for nom, chemin in COPIES.items()}
+    modules = {nom: m for nom, (m, _) in chargees.items() if m is not None}
+    non_verifiees = [nom for nom, (m, _) in chargees.items() if m is None]
+    echecs = 0
+    tailles = tailles_limites(rng)
+    for _ in range(n):
+        taille = next(tailles)
+        octets = rng.randbytes(taille)
+        for source, ms in modules.items():
+            liste = ms.charger_octets(octets)
+            for cible, mc in modules.items():
+                try:
+                    ok = mc.decharger_octets(liste) == octets
+                except Exception:
+                    ok = False
+                if ok:
+                    continue
+                if cible in DERIVES_CONNUES and DERIVES_CONNUES[cible](taille):
+                    print(f"  dérive connue : {source} -> {cible} (taille={taille})")
+                else:
+                    echecs += 1
+                    print(f"  DÉRIVE : {source} -> {cible} (taille={taille})")
+    return echecs, non_verifiees
+
+
+# ---------------------------------------------------------------------------
+# Bench
+# ---------------------------------------------------------------------------
+
+def rss_max_mo() -> float:
+    """Pic de RSS du processus (Mo), None si indisponible."""
+    if resource is None:
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ko sous Linux, octets sous macOS
+    return pic / (1024 * 1024) if sys.platform == "darwin" else pic / 1024
+
+
+def mesurer(taille: int, chiffre: bool, repetitions: int):
+    octets = os.urandom(taille)
+    fdc = fdc_xor if chiffre else NotImplemented
+    cle = CLE if chiffre else None
+
+    t_charge = t_decharge = 0.0
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        liste = paquets.charger_octets(octets, fdc, cle)
+        t_charge += time.perf_counter() - debut
+        debut = time.perf_counter()
+        sortie = paquets.decharger_octets(liste, fdc, cle)
+        t_decharge += time.perf_counter() - debut
+        assert sortie == octets
+        del liste, sortie
+
+    # Allocations sur un seul passage, tracemalloc ralentit trop pour chronométrer
+    tracemalloc.start()
+    liste = paquets.charger_octets(octets, fdc, cle)
+    _, pic_charge = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    paquets.decharger_octets(liste, fdc, cle)
+    _, pic_decharge = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del liste
+
+    mo = taille * repetitions / 1e6
+    return {
+        'charge_mo_s': mo / t_charge if t_charge else float('inf'),
+        'decharge_mo_s': mo / t_decharge if t_decharge else float('inf'),
+        'alloc_charge_mo': pic_charge / 1e6,
+        'alloc_decharge_mo': pic_decharge / 1e6,
+        'rss_mo': rss_max_mo(),
+    }
+
+
+def bench(max_taille: int):
+    print(f"{'taille':>11} {'chiffre':>7} {'charge Mo/s':>12} {'décharge Mo/s':>14} "
+          f"{'alloc ch. Mo':>13} {'alloc déch. Mo':>15} {'RSS max Mo':>11}")
+    for taille in TAILLES:
+        if taille > max_taille:
+            break
+        repetitions = max(1, min(1000, 10_000_000 // taille))
+        for chiffre in (False, True):
+            r = mesurer(taille, chiffre, repetitions)
+            rss = f"{r['rss_mo']:.1f}" if r['rss_mo'] is not None else "?"
+            print(f"{taille:>11} {'oui' if chiffre else 'non':>7} {r['charge_mo_s']:>12.1f} "
+                  f"{r['decharge_mo_s']:>14.1f} {r['alloc_charge_mo']:>13.2f} "
+                  f"{r['alloc_decharge_mo']:>15.2f} {rss:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-taille", type=int, default=TAILLES[-1])
+    parser.add_argument("--proprietes", type=int, default=500, help="nombre de cas aléatoires")
+    parser.add_argument("--graine", type=int, default=None)
+    parser.add_argument("--sans-bench", action="store_true")
+    parser.add_argument("--copies", action="store_true", help="compare aussi les copies de paquets.py")
+    args = parser.parse_args()
+
+    graine = args.graine if args.graine is not None else random.randrange(1 << 32)
+    print(f"=== Propriétés ({args.proprietes} cas, graine={graine}) ===")
+    echecs = verifier_proprietes(args.proprietes, graine)
+    echecs_copies = 0
+    if args.copies:
+        print("=== Compatibilité entre copies de paquets.py ===")
+        echecs_copies, non_verifiees = verifier_copies(max(1, args.proprietes // 20), graine)
+        if non_verifiees:
+            print(f"{len(non_verifiees)} copie(s) sautée(s) : {', '.join(non_verifiees)}")
+    print(f"{echecs} échec(s), {echecs_copies} dérive(s) entre copies")
+
+    if not args.sans_bench:
+        print("\n=== Bench ===")
+        bench(args.max_taille)
+
+    sys.exit(1 if echecs or echecs_copies else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# bench_synchro.py
+"""
+Rattrapage de l'historique (voir synchro) en boucle locale, et
+vérification que seul un pair qui a prouvé son identité est servi.
+
+1. V (clé et preuve valides) se reconnecte à A, qui lui a écrit --messages
+   messages pendant son absence : V doit les rattraper tous.
+2. M annonce la clé de V sans pouvoir la prouver : il ne doit rien obtenir
+   de A, et A ne doit rien prendre de lui.
+
+Les preuves sont factices (HMAC d'un secret propre à chaque clé), vérifiées
+par Chats.verifier_preuve contre la clé d'empreinte session.empreinte.
+
+    python bench_synchro.py [--messages 2000]
+"""
+
+import argparse
+import hashlib
+import hmac
+import os
+import sys
+import tempfile
+import time
+
+import contenus
+import historique
+import ports
+import stockage
+
+TXT = contenus.tdc_en_octet(contenus.TDC_TEXTE)[0]
+
+SECRETS = {}  # empreinte de clé -> secret de signature factice
+
+
+def verifier_preuve(session, contexte: bytes, preuve: bytes) -> bool:
+    secret = SECRETS.get(session.empreinte)
+    return secret is not None and hmac.compare_digest(hmac.new(secret, contexte, hashlib.sha256).digest(), preuve)
+
+
+def pair(dossier: str, nom: str, cle: bytes = None, prouve: bool = True):
+    """Chats en boucle locale avec son magasin ; `cle` annoncée, prouvée seulement avec `prouve`."""
+    magasin = stockage.MagasinMessages(os.path.join(dossier, nom + ".db"))
+    chats = ports.Chats(ip="127.0.0.1", multicast_active=False, magasin=magasin)
+    chats.cle_publique = cle if cle is not None else os.urandom(64)
+    secret = SECRETS.setdefault(ports.empreinte_cle(chats.cle_publique), os.urandom(32)) if prouve else os.urandom(32)
+    chats.signer_preuve = lambda contexte: hmac.new(secret, contexte, hashlib.sha256).digest()
+    chats.verifier_preuve = verifier_preuve
+    return chats, magasin
+
+
+def connecter(chats, autre):
+    """Session de `chats` vers `autre`, synchronisations des deux côtés comprises ; retourne (session, durée en s)."""
+    chats.annuaire.ajouter("127.0.0.1", autre.port_p2p, {'noms': 'Pair', 'prenoms': 'Bench', 'cle_pub': None,
+                                                          'infos_sup': b'\0' * ports.INFOS_SUP_SIZE,
+                                                          'empreinte_cle': None})
+    index = [i for i, e in enumerate(chats.contenu_chaines) if e['port'] == autre.port_p2p][0]
+    debut = time.perf_counter()
+    session = chats.creer_session_par_multicast(index)
+    session.synchro.attendre(30)
+    distante = autre.sessions.par_id(session.id_distant)
+    if distante is not None:
+        distante.synchro.attendre(30)  # le pair rattrape aussi de son côté
+    return session, time.perf_counter() - debut
+
+
+def recus(magasin, conversation: str) -> int:
+    magasin.vider()
+    return magasin.resume_plage(conversation, historique.RECU, 0, (1 << 32) - 1)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+    echecs = 0
+    dossier = tempfile.mkdtemp()
+    a, ma = pair(dossier, "a")
+    v, mv = pair(dossier, "v")
+    m, mm = pair(dossier, "m", cle=v.cle_publique, prouve=False)
+    conv_a = ports.empreinte_cle(a.cle_publique).hex()
+    conv_v = ports.empreinte_cle(v.cle_publique).hex()
+    try:
+        # Écrits par A pour V pendant son absence ; M a préparé de faux messages « de V » pour A
+        for i in range(args.messages):
+            ma.ajouter(conv_v, conv_v, i, historique.ENVOYE, f"pour V {i}".encode(), TXT)
+            mm.ajouter(conv_a, conv_a, i, historique.ENVOYE, f"faux {i}".encode(), TXT)
+        ma.vider()
+        mm.vider()
+
+        session, duree = connecter(v, a)
+        obtenus = recus(mv, conv_a)
+        print(f"V prouvé : {obtenus}/{args.messages} rattrapés en {1000 * duree:.0f} ms "
+              f"(conversation {session.conversation[:8]}…)")
+        if obtenus != args.messages or session.conversation != conv_a:
+            echecs += 1
+            print("  ÉCHEC : V n'a pas tout rattrapé")
+
+        session, duree = connecter(m, a)
+        obtenus = recus(mm, session.conversation)
+        injectes = recus(ma, conv_v)
+        print(f"M non prouvé : {obtenus} obtenus, {injectes} injectés chez A en {1000 * duree:.0f} ms")
+        if obtenus or injectes:
+            echecs += 1
+            print("  ÉCHEC : historique servi ou accepté sans preuve d'identité")
+    finally:
+        for chats in (a, v, m):
+            chats.close_all()
+        for magasin in (ma, mv, mm):
+            magasin.fermer()
+    print(f"{echecs} échec(s)")
+    sys.exit(1 if echecs else 0)
+
+
+if __name__ == "__main__":
+    main()
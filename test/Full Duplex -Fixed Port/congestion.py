@@ -0,0 +1,103 @@
+# congestion.py
+"""
+Cadencement des envois et contrôle de congestion, par pair.
+
+Un seau à jetons laisse partir au plus `rafale` octets d'un coup puis
+`debit` octets par seconde, au lieu d'envoyer tous les paquets d'un
+message d'affilée (ce qui déborde le tampon de réception du pair ou la
+file d'un point d'accès).
+
+Le débit suit un AIMD piloté par les accusés de réception (voir
+retransmission) :
+- démarrage lent : le débit croît des octets acquittés (doublement par RTT) ;
+- ensuite : + un paquet par RTT ;
+- perte (délai de retransmission expiré) : débit divisé par deux, une fois par RTT ;
+- RTT qui gonfle (file qui se remplit) : débit réduit de 15 %, une fois par RTT.
+"""
+
+import threading
+import time
+from typing import Optional
+
+TAILLE_PAQUET = 1440 + 2  # paquet + identifiant de session
+
+DEBIT_INITIAL = 2 * 1024 * 1024  # octets/s
+DEBIT_MIN = 64 * 1024
+DEBIT_MAX = 1024 * 1024 * 1024
+RAFALE = 16 * TAILLE_PAQUET
+
+FACTEUR_PERTE = 0.5
+FACTEUR_RETARD = 0.85
+RETARD_TOLERE = 0.002  # s au-dessus du double du RTT minimal
+
+
+class Regulateur:
+    """
+    Args:
+        debit: débit de départ (octets/s)
+        rafale: taille du seau (octets)
+    """
+
+    def __init__(self, debit: float = DEBIT_INITIAL, rafale: int = RAFALE):
+        self.debit = debit
+        self.rafale = rafale
+        self.seuil: float = DEBIT_MAX  # fin du démarrage lent
+        self._jetons = float(rafale)
+        self._maj = time.monotonic()
+        self._rtt_min: Optional[float] = None
+        self._srtt: Optional[float] = None
+        self._dernier_recul = 0.0
+        self._verrou = threading.Lock()
+
+    def _remplir(self, maintenant: float):
+        self._jetons = min(self.rafale, self._jetons + (maintenant - self._maj) * self.debit)
+        self._maj = maintenant
+
+    def attente(self, n: int) -> float:
+        """Secondes avant que `n` octets puissent partir (0 : tout de suite)."""
+        with self._verrou:
+            maintenant = time.monotonic()
+            self._remplir(maintenant)
+            manque = min(n, self.rafale) - self._jetons
+            return manque / self.debit if manque > 0 else 0.0
+
+    def consommer(self, n: int):
+        with self._verrou:
+            self._jetons -= n
+
+    # ------------------------------------------------------------------
+    # Signaux
+    # ------------------------------------------------------------------
+
+    def _reculer(self, facteur: float, maintenant: float) -> bool:
+        """Réduit le débit, au plus une fois par RTT."""
+        if maintenant - self._dernier_recul < (self._srtt or 0.0):
+            return False
+        self._dernier_recul = maintenant
+        self.debit = max(DEBIT_MIN, self.debit * facteur)
+        self.seuil = self.debit
+        return True
+
+    def accuse(self, octets: int, rtt: Optional[float] = None):
+        """Message acquitté (`rtt` : mesure valide, ou None si le message a été renvoyé)."""
+        with self._verrou:
+            maintenant = time.monotonic()
+            if rtt is not None:
+                self._srtt = rtt if self._srtt is None else 0.875 * self._srtt + 0.125 * rtt
+                self._rtt_min = rtt if self._rtt_min is None else min(self._rtt_min, rtt)
+                if rtt > 2 * self._rtt_min + RETARD_TOLERE and self._reculer(FACTEUR_RETARD, maintenant):
+                    return
+            if not self._srtt:
+                return  # pas encore de RTT : débit de départ
+            if self.debit < self.seuil:
+                # un RTT acquitte environ debit * srtt octets : le débit double par RTT
+                self.debit += octets / self._srtt
+            else:
+                # + un paquet par RTT, réparti sur les octets d'un RTT
+                self.debit += TAILLE_PAQUET / self._srtt * octets / (self.debit * self._srtt)
+            self.debit = min(self.debit, DEBIT_MAX)
+
+    def perte(self):
+        """Délai de retransmission expiré."""
+        with self._verrou:
+            self._reculer(FACTEUR_PERTE, time.monotonic())
@@ -0,0 +1,138 @@
+# contenus.py
+"""
+Registre des types de contenu (octet `tdc` de l'entête des paquets).
+
+Chaque type est associé à une fabrique de gestionnaires de flux. Le
+Reassembleur de paquets.py transmet au gestionnaire les morceaux du
+message au fur et à mesure qu'ils sont remis dans l'ordre, ce qui évite
+de reconstituer tout le message avant de le traiter.
+"""
+
+import codecs
+import tempfile
+from typing import Callable, Dict, Optional
+
+# Types de contenu
+TDC_TEXTE = 0
+TDC_FICHIER = 1
+TDC_IMAGE = 2
+TDC_CONTROLE = 3
+TDC_ACCUSE = 4
+# Transfert de fichiers par morceaux (voir transfert)
+TDC_TRANSFERT = 5
+TDC_MORCEAU = 6
+# Rattrapage de l'historique entre pairs (voir synchro)
+TDC_SYNCHRO = 7
+
+
+def tdc_en_octet(tdc: int) -> bytes:
+    """Convertit un type de contenu en l'octet attendu par charger_octets."""
+    return tdc.to_bytes(1, 'big')
+
+
+class Gestionnaire:
+    """Gestionnaire par défaut : accumule les morceaux et rend les octets."""
+
+    def __init__(self, infos_sup: bytes = b'\x00\x00\x00\x00'):
+        self.infos_sup = infos_sup
+        self._octets = bytearray()
+
+    def recevoir(self, morceau: bytes):
+        self._octets.extend(morceau)
+
+    def terminer(self):
+        return bytes(self._octets)
+
+
+class GestionnaireTexte(Gestionnaire):
+    """Décode l'UTF-8 au fil des morceaux (un caractère peut être coupé entre deux paquets)."""
+
+    def __init__(self, infos_sup: bytes = b'\x00\x00\x00\x00'):
+        super().__init__(infos_sup)
+        self._decodeur = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._parties = []
+
+    def recevoir(self, morceau: bytes):
+        self._parties.append(self._decodeur.decode(morceau))
+
+    def terminer(self) -> str:
+        self._parties.append(self._decodeur.decode(b'', final=True))
+        return "".join(self._parties)
+
+
+class GestionnaireFichier(Gestionnaire):
+    """Écrit les morceaux dans un fichier temporaire et rend son chemin."""
+
+    def __init__(self, infos_sup: bytes = b'\x00\x00\x00\x00'):
+        super().__init__(infos_sup)
+        self._fichier = tempfile.NamedTemporaryFile(prefix="lan-chat-", delete=False)
+
+    def recevoir(self, morceau: bytes):
+        self._fichier.write(morceau)
+
+    def terminer(self) -> str:
+        self._fichier.close()
+        return self._fichier.name
+
+
+class GestionnaireImage(Gestionnaire):
+    """Les images restent en mémoire : elles sont affichées directement."""
+
+
+class GestionnaireControle(Gestionnaire):
+    """
+    Accumule un message de contrôle puis le passe à `rappel`.
+    Le premier octet du message est son sous-type.
+    """
+
+    def __init__(self, infos_sup: bytes = b'\x00\x00\x00\x00', rappel: Optional[Callable] = None):
+        super().__init__(infos_sup)
+        self.rappel = rappel
+
+    def terminer(self):
+        octets = bytes(self._octets)
+        if self.rappel is not None:
+            return self.rappel(octets)
+        return octets
+
+
+class GestionnaireAccuse(Gestionnaire):
+    """Accusé de réception : rend le numéro du message acquitté."""
+
+    def terminer(self) -> int:
+        return int.from_bytes(self._octets[:4], 'big')
+
+
+class RegistreContenus:
+    """Associe chaque valeur de `tdc` à une fabrique de gestionnaires."""
+
+    def __init__(self):
+        self._fabriques: Dict[int, Callable] = {}
+
+    def enregistrer(self, tdc: int, fabrique: Callable):
+        """fabrique(infos_sup) doit rendre un gestionnaire (recevoir / terminer)."""
+        if not 0 <= tdc <= 255:
+            raise ValueError("Le type de contenu doit tenir sur un octet")
+        self._fabriques[tdc] = fabrique
+
+    def retirer(self, tdc: int):
+        self._fabriques.pop(tdc, None)
+
+    def creer(self, tdc: int, infos_sup: bytes = b'\x00\x00\x00\x00'):
+        """Crée le gestionnaire d'un nouveau message (Gestionnaire si type inconnu)."""
+        return self._fabriques.get(tdc, Gestionnaire)(infos_sup)
+
+    def copie(self) -> "RegistreContenus":
+        registre = RegistreContenus()
+        registre._fabriques = dict(self._fabriques)
+        return registre
+
+
+def registre_par_defaut() -> RegistreContenus:
+    registre = RegistreContenus()
+    registre.enregistrer(TDC_TEXTE, GestionnaireTexte)
+    registre.enregistrer(TDC_FICHIER, GestionnaireFichier)
+    registre.enregistrer(TDC_IMAGE, GestionnaireImage)
+    registre.enregistrer(TDC_CONTROLE, GestionnaireControle)
+    registre.enregistrer(TDC_ACCUSE, GestionnaireAccuse)
+    return registre
@@ -0,0 +1,214 @@
+# echange_cles.py
+"""
+Échange de clés des sessions.
+
+Deux groupes sont proposés :
+- X25519 (rapide), si le module `cryptography` est installé ;
+- MODP 2048 bits du RFC 3526 (groupe 14), en Python pur : toujours
+  disponible, c'est le groupe utilisé sans `cryptography` (voir
+  requirements.txt).
+
+L'initiateur envoie une part pour chaque groupe qu'il connaît, le
+répondeur choisit le meilleur groupe commun et répond avec sa part :
+un seul aller-retour. Le secret partagé passe ensuite par HKDF-SHA256
+avec les deux parts en contexte.
+
+Structure d'un message d'échange :
+    [KEX_MAGIC: 9 octets] [Version: 1 octet] [Nombre de parts: 1 octet]
+    puis pour chaque part : [Groupe: 1 octet] [Longueur: 2 octets] [Valeur publique]
+Une réponse sans part (refus()) signifie que le répondeur ne chiffre pas :
+aucune clé n'est établie, ni d'un côté ni de l'autre.
+"""
+
+import hashlib
+import hmac
+import secrets
+from typing import Dict, List, Tuple
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+    X25519_DISPONIBLE = True
+except ImportError:
+    X25519_DISPONIBLE = False
+
+KEX_MAGIC = b"PORTS_KEX"
+VERSION = 1
+
+GROUPE_X25519 = 1
+GROUPE_MODP2048 = 2
+
+TAILLE_CLE_SESSION = 32
+
+# RFC 3526, groupe 14 (2048 bits), générateur 2
+P_MODP2048 = int(
+    "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD1"
+    "29024E088A67CC74020BBEA63B139B22514A08798E3404DD"
+    "EF9519B3CD3A431B302B0A6DF25F14374FE1356D6D51C245"
+    "E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+    "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3D"
+    "C2007CB8A163BF0598DA48361C55D39A69163FA8FD24CF5F"
+    "83655D23DCA3AD961C62F356208552BB9ED529077096966D"
+    "670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+    "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9"
+    "DE2BCBF6955817183995497CEA956AE515D2261898FA0510"
+    "15728E5A8AACAA68FFFFFFFFFFFFFFFF", 16)
+G_MODP2048 = 2
+TAILLE_MODP2048 = 256
+BITS_EXPOSANT = 256  # RFC 3526 : au moins deux fois la sécurité visée
+
+
+class ErreurEchange(Exception):
+    """Message d'échange de clés invalide ou sans groupe commun"""
+    pass
+
+
+class GroupeX25519:
+    identifiant = GROUPE_X25519
+
+    def generer(self):
+        """Retourne (clé privée, valeur publique)."""
+        privee = X25519PrivateKey.generate()
+        return privee, privee.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+
+    def deriver(self, privee, publique_pair: bytes) -> bytes:
+        if len(publique_pair) != 32:
+            raise ErreurEchange("Valeur publique X25519 de taille invalide")
+        secret = privee.exchange(X25519PublicKey.from_public_bytes(publique_pair))
+        if secret == bytes(32):
+            raise ErreurEchange("Valeur publique X25519 d'ordre faible")
+        return secret
+
+
+class GroupeMODP2048:
+    identifiant = GROUPE_MODP2048
+
+    def generer(self):
+        privee = secrets.randbits(BITS_EXPOSANT) | (1 << (BITS_EXPOSANT - 1))
+        return privee, pow(G_MODP2048, privee, P_MODP2048).to_bytes(TAILLE_MODP2048, 'big')
+
+    def deriver(self, privee: int, publique_pair: bytes) -> bytes:
+        if len(publique_pair) != TAILLE_MODP2048:
+            raise ErreurEchange("Valeur publique MODP de taille invalide")
+        B = int.from_bytes(publique_pair, 'big')
+        if not 1 < B < P_MODP2048 - 1:
+            raise ErreurEchange("Valeur publique MODP hors du groupe")
+        return pow(B, privee, P_MODP2048).to_bytes(TAILLE_MODP2048, 'big')
+
+
+def groupes_disponibles() -> Dict[int, object]:
+    """Groupes utilisables ici, du plus rapide au plus lent."""
+    groupes = {}
+    if X25519_DISPONIBLE:
+        groupes[GROUPE_X25519] = GroupeX25519()
+    groupes[GROUPE_MODP2048] = GroupeMODP2048()
+    return groupes
+
+
+# ---------------------------------------------------------------------------
+# Messages
+# ---------------------------------------------------------------------------
+
+def encoder_parts(parts: List[Tuple[int, bytes]]) -> bytes:
+    """Encode une liste de (groupe, valeur publique)."""
+    sortie = bytearray(KEX_MAGIC)
+    sortie += bytes([VERSION, len(parts)])
+    for groupe, publique in parts:
+        sortie += bytes([groupe]) + len(publique).to_bytes(2, 'big') + publique
+    return bytes(sortie)
+
+
+def refus() -> bytes:
+    """Réponse d'un répondeur sans fonction de chiffrement."""
+    return encoder_parts([])
+
+
+def decoder_parts(message: bytes) -> List[Tuple[int, bytes]]:
+    """Décode un message d'échange en liste de (groupe, valeur publique)."""
+    if not message.startswith(KEX_MAGIC) or len(message) < len(KEX_MAGIC) + 2:
+        raise ErreurEchange("Message d'échange de clés invalide")
+    i = len(KEX_MAGIC)
+    version, n = message[i], message[i + 1]
+    if version != VERSION:
+        raise ErreurEchange(f"Version d'échange de clés non supportée : {version}")
+    i += 2
+    parts = []
+    for _ in range(n):
+        if i + 3 > len(message):
+            raise ErreurEchange("Message d'échange de clés tronqué")
+        groupe = message[i]
+        longueur = int.from_bytes(message[i + 1:i + 3], 'big')
+        i += 3
+        if i + longueur > len(message):
+            raise ErreurEchange("Message d'échange de clés tronqué")
+        parts.append((groupe, message[i:i + longueur]))
+        i += longueur
+    return parts
+
+
+# ---------------------------------------------------------------------------
+# KDF
+# ---------------------------------------------------------------------------
+
+def hkdf(secret: bytes, sel: bytes, info: bytes, longueur: int = TAILLE_CLE_SESSION) -> bytes:
+    """HKDF-SHA256 (RFC 5869)."""
+    prk = hmac.new(sel or bytes(32), secret, hashlib.sha256).digest()
+    sortie, bloc = b"", b""
+    compteur = 1
+    while len(sortie) < longueur:
+        bloc = hmac.new(prk, bloc + info + bytes([compteur]), hashlib.sha256).digest()
+        sortie += bloc
+        compteur += 1
+    return sortie[:longueur]
+
+
+def deriver_cle_session(secret: bytes, offre: bytes, reponse: bytes,
+                        longueur: int = TAILLE_CLE_SESSION) -> bytes:
+    """Clé de session liée aux deux messages échangés."""
+    contexte = hashlib.sha256(offre + reponse).digest()
+    return hkdf(secret, contexte, b"lan-chat cle de session", longueur)
+
+
+# ---------------------------------------------------------------------------
+# Déroulement
+# ---------------------------------------------------------------------------
+
+class Initiateur:
+    """Prépare l'offre puis termine l'échange avec la réponse du pair."""
+
+    def __init__(self, groupes: Dict[int, object] = None):
+        self.groupes = groupes if groupes is not None else groupes_disponibles()
+        self._privees = {}
+        parts = []
+        for identifiant, groupe in self.groupes.items():
+            privee, publique = groupe.generer()
+            self._privees[identifiant] = privee
+            parts.append((identifiant, publique))
+        self.offre = encoder_parts(parts)
+
+    def terminer(self, reponse: bytes) -> bytes:
+        """Retourne la clé de session."""
+        parts = decoder_parts(reponse)
+        if not parts:
+            raise ErreurEchange("Le pair ne chiffre pas")
+        if len(parts) != 1 or parts[0][0] not in self._privees:
+            raise ErreurEchange("Réponse d'échange de clés inattendue")
+        identifiant, publique = parts[0]
+        secret = self.groupes[identifiant].deriver(self._privees[identifiant], publique)
+        return deriver_cle_session(secret, self.offre, reponse)
+
+
+def repondre(offre: bytes, groupes: Dict[int, object] = None) -> Tuple[bytes, bytes]:
+    """
+    Choisit le meilleur groupe commun.
+    Retourne (réponse à envoyer, clé de session).
+    """
+    groupes = groupes if groupes is not None else groupes_disponibles()
+    proposes = dict(decoder_parts(offre))
+    for identifiant, groupe in groupes.items():
+        if identifiant in proposes:
+            privee, publique = groupe.generer()
+            reponse = encoder_parts([(identifiant, publique)])
+            secret = groupe.deriver(privee, proposes[identifiant])
+            return reponse, deriver_cle_session(secret, offre, reponse)
+    raise ErreurEchange("Aucun groupe d'échange de clés en commun")
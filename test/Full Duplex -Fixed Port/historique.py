@@ -0,0 +1,159 @@
+# historique.py
+"""
+Historique borné d'une session.
+
+Les derniers messages restent en mémoire dans un anneau de taille fixe.
+Quand l'anneau est plein, le plus ancien est ajouté à la fin d'un fichier
+propre à la session (jamais réécrit). La lecture passe par un itérateur
+qui lit le fichier page par page avant de rendre le contenu de l'anneau.
+
+Le fichier contient les messages en clair : il est créé en 0o600 dans un
+dossier 0o700 propre à l'utilisateur (voir dossier_prive), et supprimé
+par fermer(). La conservation des messages est l'affaire de stockage.
+
+Structure d'un enregistrement sur disque :
+    [Horodatage: 8 octets (double)] [Sens: 1 octet] [Type: 1 octet] [Longueur: 4 octets] [Contenu]
+"""
+
+import os
+import struct
+import threading
+import time
+from collections import deque
+from typing import Iterator, Optional, Tuple, Union
+
+ENVOYE = 0
+RECU = 1
+
+CAPACITE_DEFAUT = 256
+TAILLE_PAGE = 64 * 1024
+MODE_DOSSIER = 0o700
+MODE_FICHIER = 0o600
+
+_ENTETE = struct.Struct(">dBBI")
+_TYPE_OCTETS = 0
+_TYPE_TEXTE = 1
+
+Entree = Tuple[float, int, Union[bytes, str]]
+
+
+def _encoder(contenu) -> Tuple[int, bytes]:
+    if isinstance(contenu, str):
+        return _TYPE_TEXTE, contenu.encode('utf-8')
+    return _TYPE_OCTETS, bytes(contenu)
+
+
+def dossier_prive(nom: str = "historique") -> str:
+    """Dossier `nom` de lan-chat dans le cache de l'utilisateur (pas le /tmp partagé)."""
+    base = (os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+            or os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "lan-chat", nom)
+
+
+def _ouvrir_prive(chemin: str):
+    """Ouvre `chemin` en ajout, créé 0o600, dans un dossier ramené à 0o700."""
+    dossier = os.path.dirname(chemin)
+    if dossier:
+        os.makedirs(dossier, mode=MODE_DOSSIER, exist_ok=True)
+        try:
+            os.chmod(dossier, MODE_DOSSIER)  # existant, ou créé avec un umask plus large
+        except OSError:
+            pass
+    drapeaux = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0) | getattr(os, "O_NOFOLLOW", 0)
+    fd = os.open(chemin, drapeaux, MODE_FICHIER)
+    if hasattr(os, "fchmod"):
+        os.fchmod(fd, MODE_FICHIER)  # fichier déjà présent
+    return os.fdopen(fd, 'ab')
+
+
+class HistoriqueBorne:
+    """
+    Historique en mémoire constante.
+
+    Args:
+        chemin: fichier de débordement (créé au premier débordement, supprimé par fermer)
+        capacite: nombre d'entrées gardées en mémoire
+    """
+
+    def __init__(self, chemin: str, capacite: int = CAPACITE_DEFAUT):
+        if capacite < 1:
+            raise ValueError("La capacité doit être positive")
+        self.chemin = chemin
+        self.capacite = capacite
+        self._anneau: deque = deque()
+        self._verrou = threading.Lock()
+        self._fichier = None
+        self._debut_disque: Optional[int] = None  # le fichier peut déjà exister
+        self._taille_disque = 0
+        self._nb_disque = 0
+
+    def ajouter(self, sens: int, contenu, horodatage: Optional[float] = None):
+        """Ajoute une entrée ; la plus ancienne déborde sur disque si l'anneau est plein."""
+        entree = (time.time() if horodatage is None else horodatage, sens, contenu)
+        with self._verrou:
+            if len(self._anneau) >= self.capacite:
+                self._deborder(self._anneau.popleft())
+            self._anneau.append(entree)
+
+    def _deborder(self, entree: Entree):
+        if self._fichier is None:
+            self._fichier = _ouvrir_prive(self.chemin)
+            if self._debut_disque is None:
+                self._debut_disque = self._fichier.tell()
+        horodatage, sens, contenu = entree
+        type_contenu, octets = _encoder(contenu)
+        self._fichier.write(_ENTETE.pack(horodatage, sens, type_contenu, len(octets)) + octets)
+        self._taille_disque += _ENTETE.size + len(octets)
+        self._nb_disque += 1
+
+    def __len__(self) -> int:
+        return self._nb_disque + len(self._anneau)
+
+    def __iter__(self) -> Iterator[Entree]:
+        return self.iterer()
+
+    def iterer(self, sens: Optional[int] = None) -> Iterator[Entree]:
+        """
+        Parcourt l'historique du plus ancien au plus récent.
+        Les entrées ajoutées pendant le parcours ne sont pas rendues.
+        """
+        with self._verrou:
+            if self._fichier is not None:
+                self._fichier.flush()
+            fin_disque = self._taille_disque
+            anneau = tuple(self._anneau)
+
+        if fin_disque:
+            for entree in self._lire_disque(fin_disque):
+                if sens is None or entree[1] == sens:
+                    yield entree
+        for entree in anneau:
+            if sens is None or entree[1] == sens:
+                yield entree
+
+    def _lire_disque(self, fin: int) -> Iterator[Entree]:
+        with open(self.chemin, 'rb', buffering=TAILLE_PAGE) as f:
+            f.seek(self._debut_disque)
+            position = 0
+            while position < fin:
+                entete = f.read(_ENTETE.size)
+                if len(entete) < _ENTETE.size:
+                    return
+                horodatage, sens, type_contenu, longueur = _ENTETE.unpack(entete)
+                octets = f.read(longueur)
+                position += _ENTETE.size + longueur
+                yield (horodatage, sens, octets.decode('utf-8') if type_contenu == _TYPE_TEXTE else octets)
+
+    def fermer(self):
+        """Ferme et supprime le fichier de débordement ; seul le contenu de l'anneau reste lisible."""
+        with self._verrou:
+            if self._fichier is not None:
+                self._fichier.close()
+                self._fichier = None
+                try:
+                    os.remove(self.chemin)
+                except OSError:
+                    pass
+            self._taille_disque = 0
+            self._nb_disque = 0
+            self._debut_disque = None
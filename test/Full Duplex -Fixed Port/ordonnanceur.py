@@ -0,0 +1,167 @@
+# ordonnanceur.py
+"""
+Ordonnanceur d'envoi partagé par toutes les sessions d'un Chats.
+
+Un seul fil envoie les paquets de toutes les sessions :
+- priorité stricte entre classes (contrôle > discussion > fichiers),
+- round-robin à déficit (DRR) entre les sessions d'une même classe,
+- le fil dort sur une condition tant qu'il n'y a rien à envoyer.
+
+Les paquets d'un même message ne sont jamais entrelacés avec ceux d'un
+autre message de la même session (le réassembleur attend un message à
+la fois) ; l'entrelacement se fait entre sessions.
+
+Une session qui a un `regulateur` (voir congestion) n'envoie que si son
+seau a assez de jetons ; en attendant, les autres sessions passent.
+"""
+
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+CONTROLE = 0
+INTERACTIF = 1
+VRAC = 2
+CLASSES = (CONTROLE, INTERACTIF, VRAC)
+
+QUANTUM = 4 * 1440  # octets crédités à une session par tour
+
+
+class _Message:
+    __slots__ = ("paquets", "index", "emettre", "fin")
+
+    def __init__(self, paquets: List[bytes], emettre: Callable, fin: Optional[Callable] = None):
+        self.paquets = paquets
+        self.index = 0
+        self.emettre = emettre
+        self.fin = fin
+
+
+class Ordonnanceur:
+    """
+    Args:
+        quantum: crédit (octets) ajouté à une session à chaque tour DRR
+    """
+
+    def __init__(self, quantum: int = QUANTUM):
+        self.quantum = quantum
+        self._condition = threading.Condition()
+        self._tours: Tuple[Deque, ...] = tuple(deque() for _ in CLASSES)
+        self._files: Dict[Tuple[object, int], Deque[_Message]] = {}
+        self._deficits: Dict[Tuple[object, int], int] = {}
+        # session -> classe du message dont une partie est déjà partie
+        self._en_cours: Dict[object, int] = {}
+        # délai avant qu'une session retenue par son régulateur puisse envoyer
+        self._reveil: Optional[float] = None
+        self._arret = False
+        self._fil = threading.Thread(target=self._boucle, daemon=True)
+        self._fil.start()
+
+    def soumettre(self, session, paquets: List[bytes], classe: int = INTERACTIF,
+                  emettre: Optional[Callable] = None, fin: Optional[Callable] = None):
+        """
+        Ajoute un message (liste de paquets) à la file de la session.
+        `emettre(paquet)` envoie un paquet ; par défaut session.emettre.
+        `fin()` est appelé par le fil d'envoi après le dernier paquet.
+        """
+        if classe not in CLASSES:
+            raise ValueError(f"Classe de priorité inconnue : {classe}")
+        if not paquets:
+            return
+        message = _Message(paquets, emettre if emettre is not None else session.emettre, fin)
+        with self._condition:
+            if self._arret:
+                raise RuntimeError("Ordonnanceur arrêté")
+            cle = (session, classe)
+            file = self._files.get(cle)
+            if file is None:
+                file = self._files[cle] = deque()
+                self._deficits[cle] = 0
+                self._tours[classe].append(session)
+            file.append(message)
+            self._condition.notify()
+
+    def retirer(self, session):
+        """Abandonne tout ce qui reste à envoyer pour cette session."""
+        with self._condition:
+            for classe in CLASSES:
+                if self._files.pop((session, classe), None) is not None:
+                    self._deficits.pop((session, classe), None)
+                    self._tours[classe].remove(session)
+            self._en_cours.pop(session, None)
+
+    def en_attente(self, session) -> int:
+        """Nombre de messages encore en file pour la session."""
+        with self._condition:
+            return sum(len(self._files.get((session, c), ())) for c in CLASSES)
+
+    def arreter(self):
+        with self._condition:
+            self._arret = True
+            self._condition.notify()
+        if threading.current_thread() is not self._fil:
+            self._fil.join()
+
+    # ------------------------------------------------------------------
+
+    def _prochain(self):
+        """Choisit le prochain paquet (verrou tenu). Retourne (session, message, paquet) ou None."""
+        self._reveil = None
+        for classe in CLASSES:
+            tour = self._tours[classe]
+            bloquees = 0
+            while tour and bloquees < len(tour):
+                session = tour[0]
+                en_cours = self._en_cours.get(session)
+                if en_cours is not None and en_cours != classe:
+                    # un message d'une autre classe doit d'abord finir
+                    tour.rotate(-1)
+                    bloquees += 1
+                    continue
+                cle = (session, classe)
+                file = self._files[cle]
+                message = file[0]
+                paquet = message.paquets[message.index]
+                if self._deficits[cle] < len(paquet):
+                    self._deficits[cle] += self.quantum
+                    tour.rotate(-1)
+                    continue
+                regulateur = getattr(session, 'regulateur', None)
+                if regulateur is not None:
+                    attente = regulateur.attente(len(paquet))
+                    if attente > 0:
+                        self._reveil = attente if self._reveil is None else min(self._reveil, attente)
+                        tour.rotate(-1)
+                        bloquees += 1
+                        continue
+                    regulateur.consommer(len(paquet))
+                self._deficits[cle] -= len(paquet)
+                message.index += 1
+                if message.index < len(message.paquets):
+                    self._en_cours[session] = classe
+                else:
+                    file.popleft()
+                    self._en_cours.pop(session, None)
+                    if not file:
+                        tour.popleft()
+                        del self._files[cle]
+                        del self._deficits[cle]
+                return session, message, paquet
+        return None
+
+    def _boucle(self):
+        while True:
+            with self._condition:
+                choix = self._prochain()
+                while choix is None and not self._arret:
+                    self._condition.wait(self._reveil)
+                    choix = self._prochain()
+                if self._arret:
+                    return
+            session, message, paquet = choix
+            try:
+                message.emettre(paquet)
+                if message.fin is not None and message.index == len(message.paquets):
+                    message.fin()
+            except Exception as e:
+                session.derniere_erreur = e
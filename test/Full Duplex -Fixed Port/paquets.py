@@ -1,10 +1,12 @@
 import socket
-import netifaces
 import time
 import threading
 import binascii
 from typing import Callable, Optional
 
+# Paquets marqués : [Marque: 1 octet] [Numéro d'ordre: 4 octets] à la place du numéro sur 5 octets
+MARQUE_DECALAGE = 32
+
 
 def trafic_libre(ip, port, duree):
     """
@@ -65,7 +67,8 @@ def charger_pacquet(id: int, bits: bytes, fdc: Callable = NotImplemented, cle :
        
     return bits_pret
 
-def charger_octets(octets: bytes, fdc: Callable = NotImplemented, cle : bytes = None, tdc: bytes = b'\x00', infos_sup: bytes=b'\x00\x00\x00\x00'):
+def charger_octets(octets: bytes, fdc: Callable = NotImplemented, cle : bytes = None, tdc: bytes = b'\x00', infos_sup: bytes=b'\x00\x00\x00\x00',
+                   marquer: bool = False):
     """
     Décompose un série d'occtets en pacquets pour l'envoi
 
@@ -79,6 +82,9 @@ def charger_octets(octets: bytes, fdc: Callable = NotImplemented, cle : bytes =
     Structure d'un packet :
         [Numéro d'ordre: 5 octets] [message: 1431 octets] [CRC: 4 octets]
 
+    Avec `marquer`, le premier octet du numéro d'ordre est la marque du
+    message (dernier octet d'infos_sup) : le réassembleur peut alors écarter
+    les paquets d'un autre message (voir Reassembleur).
     
     Args:
         octets: La séquence d'octets dans la message
@@ -86,6 +92,7 @@ def charger_octets(octets: bytes, fdc: Callable = NotImplemented, cle : bytes =
         cle: La cle de chiffrement
         tdc: Le type de contenu envoyé, O pour une chaine de caractères
         infos_sup: 4 octets supplemantaire pour n'importe quels infos qu'on veut ajouter. Sert aussi a rendre le message de taille 16 octets
+        marquer: marquer chaque paquet avec le dernier octet d'infos_sup
 
     Returns:
         Retourne une liste composé de l'entête puis de paquets du message
@@ -109,7 +116,8 @@ def charger_octets(octets: bytes, fdc: Callable = NotImplemented, cle : bytes =
     bits_manquant = b'\x00'*((1431-tddp)%1431)
     octets_complet = octets+bits_manquant
     
-    return [entete_charge]+[charger_pacquet(i,octets_complet[i*1431:(i+1)*1431],fdc,cle) for i in range(ndp)]
+    marque = infos_sup[-1] << MARQUE_DECALAGE if marquer else 0
+    return [entete_charge]+[charger_pacquet(marque | i,octets_complet[i*1431:(i+1)*1431],fdc,cle) for i in range(ndp)]
     
 class CRCError(Exception):
     """Erreur sur la valeur deu CRC"""
@@ -181,7 +189,127 @@ def decharger_octets(paquets: list[bytes], fdd: Callable = NotImplemented, cle:
             raise ValueError(f"Paquet hors ordre: attendu {i-1}, reçu {id_paquet}")
         octets_recus.extend(paquet_decharge[1])
 
-    return bytes(octets_recus[:(ndp - 1) * 1431 + tddp])
+    # tddp vaut 0 quand le dernier paquet est plein
+    taille = ndp * 1431 if tddp == 0 else (ndp - 1) * 1431 + tddp
+    return bytes(octets_recus[:taille])
+
+TAILLE_SID = 2
+SID_MAX = (1 << (8 * TAILLE_SID)) - 1
+
+
+def prefixer_sid(sid: int, datagramme: bytes) -> bytes:
+    """
+    Ajoute l'identifiant de session du destinataire devant un datagramme.
+    Il reste en clair pour que le destinataire aiguille avant de déchiffrer.
+
+    Structure :
+        [Identifiant de session: 2 octets] [datagramme (entête ou paquet)]
+    """
+    return sid.to_bytes(TAILLE_SID, 'big') + datagramme
+
+
+def separer_sid(datagramme: bytes):
+    """Retourne (identifiant de session, datagramme sans préfixe)."""
+    if len(datagramme) < TAILLE_SID:
+        raise ValueError("Datagramme trop court pour contenir un identifiant de session")
+    return int.from_bytes(datagramme[:TAILLE_SID], 'big'), datagramme[TAILLE_SID:]
+
+
+class Reassembleur:
+    """
+    Reconstitue un message datagramme par datagramme.
+
+    Les paquets peuvent arriver dans le désordre : ils sont mis de côté
+    puis transmis au gestionnaire dès qu'ils sont contigus. Le gestionnaire
+    est choisi à partir de l'entête (type de contenu) via `fabrique`.
+
+    Args:
+        fabrique: fonction (tdc, infos_sup) -> gestionnaire. Le gestionnaire
+            expose `recevoir(morceau)` et `terminer()`.
+        fdd: La fonction de déchiffrement qui est AES dans ce projet
+        cle: La cle de déchiffrement
+        marquage: les paquets portent la marque de leur message
+            (charger_octets(..., marquer=True)). Sans marque, un paquet
+            dont l'entête est perdue serait attribué au message en cours,
+            et un paquet arrivé après la fin d'un message est écarté : rien
+            ne le distingue d'un paquet du message suivant.
+    """
+
+    def __init__(self, fabrique: Callable, fdd: Callable = NotImplemented, cle: bytes = None,
+                 marquage: bool = False):
+        self.fabrique = fabrique
+        self.fdd = fdd
+        self.cle = cle
+        self.marquage = marquage
+        self._orphelins: dict = {}
+        # (tdc, infos_sup) du dernier message terminé
+        self.dernier_entete: Optional[tuple] = None
+        self._reinitialiser()
+
+    def _reinitialiser(self):
+        self.gestionnaire = None
+        self.entete = None
+        self.ndp = None
+        self.tddp = 0
+        self.prochain = 0
+        self.marque = None
+        self.en_attente: dict = {}
+
+    def ajouter(self, datagramme: bytes):
+        """
+        Ajoute un datagramme (entête ou paquet) au message en cours.
+
+        Returns:
+            Le résultat de `gestionnaire.terminer()` quand le message est
+            complet, None sinon.
+        """
+        clair = datagramme if self.fdd == NotImplemented else self.fdd(datagramme, self.cle)
+        if len(clair) == 16:
+            entete = decharger_entete(clair)
+            self._reinitialiser()
+            self.ndp = int.from_bytes(entete[0], 'big')
+            self.tddp = int.from_bytes(entete[1], 'big')
+            self.entete = (entete[2][0], entete[3])
+            self.gestionnaire = self.fabrique(*self.entete)
+            # Des paquets ont pu arriver avant l'entête
+            if self.marquage:
+                self.marque = entete[3][-1]
+                en_avance = {i: p for (m, i), p in self._orphelins.items() if m == self.marque and i < self.ndp}
+            else:
+                en_avance = {i: p for i, p in self._orphelins.items() if i < self.ndp}
+            self._orphelins = {}
+            self.en_attente.update(en_avance)
+        else:
+            id_paquet, morceau, _ = decharger_paquet(clair)
+            id_paquet = int.from_bytes(id_paquet, 'big')
+            if self.marquage:
+                marque, id_paquet = id_paquet >> MARQUE_DECALAGE, id_paquet & ((1 << MARQUE_DECALAGE) - 1)
+                if self.gestionnaire is None or marque != self.marque:
+                    self._orphelins[(marque, id_paquet)] = morceau
+                    return None
+            if self.gestionnaire is None:
+                if self.dernier_entete is None:  # avant le premier message : peut-être en avance
+                    self._orphelins[id_paquet] = morceau
+                return None
+            if id_paquet < self.prochain or id_paquet >= self.ndp:
+                return None  # doublon ou paquet d'un autre message
+            self.en_attente[id_paquet] = morceau
+        return self._vider()
+
+    def _vider(self):
+        while self.prochain in self.en_attente:
+            morceau = self.en_attente.pop(self.prochain)
+            if self.prochain == self.ndp - 1 and self.tddp:
+                morceau = morceau[:self.tddp]
+            self.gestionnaire.recevoir(morceau)
+            self.prochain += 1
+        if self.prochain == self.ndp:
+            resultat = self.gestionnaire.terminer()
+            self.dernier_entete = self.entete
+            self._reinitialiser()
+            return resultat
+        return None
+
 
 class TimeOutExeption(Exception):
     """Le temps imparti est épuisé"""
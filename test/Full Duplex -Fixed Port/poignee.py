@@ -0,0 +1,104 @@
+# poignee.py
+"""
+Poignée de main des sessions en un aller-retour.
+
+SESSION_REQUEST et SESSION_ACK portent, après les identifiants de session,
+des extensions : la part d'échange de clés, la reprise par ticket,
+l'empreinte de la clé publique de l'expéditeur, la preuve d'identité et
+le cookie. La clé de session et l'authentification
+sont donc établies par le même aller-retour que la session elle-même.
+
+Structure d'une extension :
+    [Type: 1 octet] [Longueur: 2 octets] [Valeur]
+
+La preuve d'identité est toujours la dernière extension : elle porte sur
+tout ce qui la précède (voir contexte_preuve).
+
+Le cookie prouve que l'initiateur reçoit bien à son adresse : le
+répondeur répond à une demande sans cookie valide par SESSION_RETRY +
+cookie, sans rien retenir ni calculer. La session et l'échange de clés
+ne viennent qu'avec la demande suivante, qui porte le cookie. Chaque
+SESSION_ACK remet un nouveau cookie : les sessions suivantes vers le
+même répondeur (reconnexion, flux) se font en un aller-retour.
+"""
+
+import hashlib
+import hmac
+import secrets
+import time
+from typing import Dict, List, Tuple
+
+EXT_KEX = 1       # offre (requête) ou réponse (ack) d'echange_cles
+EXT_REPRISE = 2   # requête : [nonce: 16 octets] [ticket] ; ack : [nonce: 16 octets]
+EXT_TICKET = 3    # nouveau ticket remis par le répondeur (reprise.encoder_ticket)
+EXT_COOKIE = 4
+EXT_PREUVE = 5    # toujours en dernier
+EXT_FLUX = 6      # (vide) session d'un flux parallèle : le répondeur répond depuis une autre socket
+EXT_IDENTITE = 7  # empreinte de la clé publique de l'expéditeur (ports.empreinte_cle)
+EXT_RETRANSMISSION = 8  # (vide) l'expéditeur renvoie ses messages non acquittés : le pair les acquitte
+
+DUREE_COOKIE = 120  # s
+TAILLE_COOKIE = 4 + 16
+
+
+class ErreurPoignee(Exception):
+    """Extensions de poignée de main illisibles"""
+    pass
+
+
+def encoder_extensions(extensions: List[Tuple[int, bytes]]) -> bytes:
+    sortie = bytearray()
+    for type_ext, valeur in extensions:
+        sortie += bytes([type_ext]) + len(valeur).to_bytes(2, 'big') + valeur
+    return bytes(sortie)
+
+
+def decoder_extensions(octets: bytes) -> Dict[int, bytes]:
+    extensions = {}
+    i = 0
+    while i < len(octets):
+        if i + 3 > len(octets):
+            raise ErreurPoignee("Extension tronquée")
+        type_ext = octets[i]
+        longueur = int.from_bytes(octets[i + 1:i + 3], 'big')
+        i += 3
+        if i + longueur > len(octets) or type_ext in extensions:
+            raise ErreurPoignee("Extension tronquée ou répétée")
+        extensions[type_ext] = octets[i:i + longueur]
+        i += longueur
+    return extensions
+
+
+def contexte_preuve(message: bytes, extensions: Dict[int, bytes], prefixe: bytes = b"") -> bytes:
+    """
+    Empreinte couverte par la preuve : `prefixe` (la demande, pour une
+    preuve du répondeur) suivi de tout ce qui précède EXT_PREUVE.
+    """
+    preuve = extensions.get(EXT_PREUVE)
+    if preuve is not None:
+        message = message[:len(message) - 3 - len(preuve)]
+    return hashlib.sha256(prefixe + message).digest()
+
+
+class EmetteurCookies:
+    """Cookies sans état, liés à l'adresse de l'initiateur."""
+
+    def __init__(self, duree_vie: float = DUREE_COOKIE):
+        self.duree_vie = duree_vie
+        self._cle = secrets.token_bytes(32)
+
+    def _mac(self, adresse: Tuple[str, int], horodatage: bytes) -> bytes:
+        ip, port = adresse
+        return hmac.new(self._cle, horodatage + f"{ip}:{port}".encode(), hashlib.sha256).digest()[:16]
+
+    def emettre(self, adresse: Tuple[str, int]) -> bytes:
+        horodatage = int(time.time()).to_bytes(4, 'big')
+        return horodatage + self._mac(adresse, horodatage)
+
+    def verifier(self, adresse: Tuple[str, int], cookie: bytes) -> bool:
+        if len(cookie) != TAILLE_COOKIE:
+            return False
+        horodatage = cookie[:4]
+        if time.time() - int.from_bytes(horodatage, 'big') > self.duree_vie:
+            return False
+        return hmac.compare_digest(cookie[4:], self._mac(adresse, horodatage))
@@ -8,15 +8,42 @@ import socket
 import threading
 import time
 import secrets
+import hashlib
+import itertools
+import math
 import random
-from typing import List, Optional, Callable, Tuple
+import os
+from collections import deque
+from queue import Queue, Empty
+from typing import Dict, List, Optional, Callable, Tuple
 
 import paquets
+import contenus
+import historique
+import stockage
+import ordonnanceur
+import echange_cles
+import reprise
+import poignee
+import rtt
+import retransmission
+import congestion
+import transfert
+import synchro
+import sondage
+import annonce
+import trickle
+import annuaire
+import balayage
+import ipaddress
+import logging
 
 # -------------------------------------------------------------------
 # Constantes et configuration
 # -------------------------------------------------------------------
 
+journal = logging.getLogger(__name__)
+
 BASE64_CUSTOM = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz!?"
 
 # Plage multicast privée (301 adresses)
@@ -28,6 +55,30 @@ for troisieme in range(1, 3):
             break
         adresses_multicast.append(base.format(f"{troisieme}.{quatrieme}"))
 
+
+def ordre_chaines(identite: bytes, n: int = len(adresses_multicast)) -> List[int]:
+    """
+    Ordre dans lequel un appareil essaie les n chaînes (indices dans
+    adresses_multicast), par double hachage de son identité : le départ et
+    le pas sont tirés de SHA-256(identite), le pas premier avec n pour que
+    la suite passe par toutes les chaînes. Deux appareils ne partent donc
+    presque jamais de la même chaîne, et ceux qui se rencontrent ne suivent
+    pas la même suite ensuite : le nombre moyen d'essais ne dépend que du
+    taux d'occupation (environ 1 / (1 - taux)), pas du nombre d'appareils.
+    """
+    h = hashlib.sha256(identite).digest()
+    depart = int.from_bytes(h[:8], 'big') % n
+    pas = 1 + int.from_bytes(h[8:16], 'big') % (n - 1) if n > 1 else 1
+    while math.gcd(pas, n) != 1:
+        pas = pas % (n - 1) + 1
+    return [(depart + k * pas) % n for k in range(n)]
+
+
+def chaine_revendiquee(infos_sup: bytes) -> Optional[str]:
+    """Chaîne dont l'annonceur se dit propriétaire (infos_sup[6:8] : indice + 1, 0 si aucune)."""
+    indice = int.from_bytes(infos_sup[6:8], 'big') - 1
+    return adresses_multicast[indice] if 0 <= indice < len(adresses_multicast) else None
+
 # Ports d'écoute "préférés" 
 ports_decoutes = [
     54321, 58732, 61248, 49876, 52413,
@@ -40,16 +91,80 @@ MULTICAST_PORT = 54321
 
 # Durées
 MULTICAST_LISTEN_INTERVAL = 0.12
-BACKOFF_MAX = 0.08
-APPROPRIATION_ATTEMPTS = 2
-ANNOUNCE_INTERVAL = 0.6
+# Cadence des annonces : voir trickle. Chaque appareil annonce quand même sa
+# présence, même si Trickle supprime ses annonces : au moins toutes les
+# PRESENCE_MIN secondes, et pas plus que DEBIT_PRESENCE annonces par seconde
+# sur tout le réseau (la période s'allonge avec le nombre de pairs connus).
+PRESENCE_MIN = 30.0
+DEBIT_PRESENCE = 0.5
+# Un pair est retiré de l'annuaire après FACTEUR_TTL périodes de présence sans annonce
+FACTEUR_TTL = 3
+
+# Découverte par annonces périodiques (voir trickle), ou seulement par requêtes
+# (voir Chats.interroger) : le trafic suit alors le nombre de requêtes, pas le temps.
+DECOUVERTE_ANNONCES = 0
+DECOUVERTE_REQUETES = 1
+DELAI_REPONSE = (0.02, 0.12)  # s, délai tiré avant de répondre à une requête
+DUREE_REQUETE = 0.5           # s, attente des réponses à une requête
+TTL_REPONSE = 300.0           # s, durée de vie d'un pair appris en mode requêtes
+# Sans aucun pair découvert DELAI_SECOURS secondes après le démarrage (multicast
+# filtré par le réseau), le sous-réseau est balayé en unicast (voir balayer_sous_reseau)
+DELAI_SECOURS = 3.0
+PREFIXE_BALAYAGE = 24
 SOCKET_RECV_BUFFER = 2048
 
-# Paquets de handshake
+# Types de contenu conservés par le stockage persistant
+TDC_STOCKES = (contenus.TDC_TEXTE, contenus.TDC_IMAGE)
+# Types traités par la session elle-même, hors historique et hors file de réception
+TDC_INTERNES = (contenus.TDC_TRANSFERT, contenus.TDC_MORCEAU, contenus.TDC_SYNCHRO)
+
+# Classe de priorité d'envoi selon le type de contenu
+PRIORITES = {
+    contenus.TDC_CONTROLE: ordonnanceur.CONTROLE,
+    contenus.TDC_ACCUSE: ordonnanceur.CONTROLE,
+    contenus.TDC_TEXTE: ordonnanceur.INTERACTIF,
+    contenus.TDC_IMAGE: ordonnanceur.VRAC,
+    contenus.TDC_FICHIER: ordonnanceur.VRAC,
+    contenus.TDC_TRANSFERT: ordonnanceur.CONTROLE,
+    contenus.TDC_MORCEAU: ordonnanceur.VRAC,
+    contenus.TDC_SYNCHRO: ordonnanceur.VRAC,
+}
+
+# Historique des sessions : entrées gardées en mémoire, le reste déborde sur disque
+HISTORIQUE_CAPACITE = 256
+DOSSIER_HISTORIQUE = historique.dossier_prive()
+
+# Numéros de messages reçus retenus pour écarter les renvois
+FENETRE_DOUBLONS = 1024
+
+# Paquets de handshake (un aller-retour, extensions : voir poignee)
+# SESSION_REQUEST + [id de session de l'initiateur: 2 octets] + [extensions]
+# SESSION_ACK + [id de l'initiateur: 2 octets] + [id du répondeur: 2 octets] + [extensions]
+# SESSION_RETRY + [id de l'initiateur: 2 octets] + [cookie]
 SESSION_REQUEST = b"PORTS_SESSION_REQ"
 SESSION_ACK = b"PORTS_SESSION_ACK"
-
-# Multicast message format sizes
+SESSION_RETRY = b"PORTS_SESSION_RTY"
+
+# Clé publique d'un pair, demandée par son empreinte (les annonces ne portent que l'empreinte)
+# CLE_DEMANDE + [empreinte: TAILLE_EMPREINTE octets] + [bourrage jusqu'à TAILLE_DEMANDE_CLE]
+# CLE_REPONSE + [clé publique]
+# Le bourrage rend la demande au moins aussi longue que la réponse : pas d'amplification.
+CLE_DEMANDE = b"PORTS_CLE_DEMANDE"
+CLE_REPONSE = b"PORTS_CLE_REPONSE"
+CLES_MAX = 1024  # clés des pairs gardées en cache
+CLES_ANNONCEES_MAX = 256  # clés entières des annonces de l'ancien format, à part
+
+# Au-delà de SEUIL_COOKIE sessions à demi ouvertes (créées depuis moins de
+# DELAI_DEMI_OUVERTE sans datagramme reçu du pair), une demande sans cookie
+# valide reçoit SESSION_RETRY et ne crée rien. 0 (défaut) : cookie toujours
+# exigé, aucun état ni échange de clés avant que l'initiateur ait prouvé qu'il
+# reçoit à son adresse ; un premier contact coûte alors un aller-retour de plus.
+SEUIL_COOKIE = 0
+DELAI_DEMI_OUVERTE = 10.0  # s
+# Sockets supplémentaires (avec leurs fils) pour les flux parallèles
+VOIES_MAX = 4
+
+# Multicast message format sizes (ancien format, à taille fixe ; voir annonce pour le format compact)
 NOMS_SIZE = 200
 PRENOMS_SIZE = 200
 TAILLE_CLE_SIZE = 2
@@ -58,6 +173,10 @@ INFOS_SUP_SIZE = 40
 CRC_SIZE = 4
 MULTICAST_MSG_SIZE = NOMS_SIZE + PRENOMS_SIZE + TAILLE_CLE_SIZE + CLE_PUB_MAX + INFOS_SUP_SIZE + CRC_SIZE
 
+# Empreinte d'une clé publique (SHA-256 tronqué)
+TAILLE_EMPREINTE = 8
+TAILLE_DEMANDE_CLE = len(CLE_REPONSE) + CLE_PUB_MAX
+
 # -------------------------------------------------------------------
 
 def encode_connexion_code(ip: str, port: int, alphabet: str = BASE64_CUSTOM) -> str:
@@ -82,6 +201,12 @@ def decode_connexion_code(code: str, alphabet: str = BASE64_CUSTOM) -> Tuple[str
     port = int(bits[32:48], 2)
     return f"{A}.{B}.{C}.{D}", port
 
+def empreinte_cle(cle_pub: Optional[bytes]) -> Optional[bytes]:
+    """Empreinte courte d'une clé publique, None si pas de clé."""
+    if not cle_pub:
+        return None
+    return hashlib.sha256(cle_pub).digest()[:TAILLE_EMPREINTE]
+
 class Utilisateur:
     def __init__(self, noms: List[str], prenoms: List[str],
                  cle_privee: Optional[bytes] = None,
@@ -106,112 +231,657 @@ class Appareil:
         self.ip = ip
         self.port = port
         self.ut = ut
-        self.sock_recep = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock_recep: Optional[socket.socket] = None
+
+    @property
+    def sock_recep(self) -> socket.socket:
+        # Créée à la demande : les sessions passent toutes par sock_p2p
+        if self._sock_recep is None:
+            self._sock_recep = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        return self._sock_recep
 
 class Session:
+    _compteur_ids = itertools.count(1)
+
     def __init__(self, sock_local: socket.socket, destinataire: Appareil,
-                 fdc: Optional[Callable] = None, cle: Optional[bytes] = None):
+                 fdc: Optional[Callable] = None, cle: Optional[bytes] = None,
+                 fdd: Optional[Callable] = None,
+                 registre: Optional[contenus.RegistreContenus] = None,
+                 dossier_historique: str = DOSSIER_HISTORIQUE,
+                 magasin: Optional[stockage.MagasinMessages] = None,
+                 ordonnanceur_envoi: Optional[ordonnanceur.Ordonnanceur] = None,
+                 id_session: Optional[int] = None,
+                 estimateur_rtt: Optional[rtt.EstimateurRTT] = None,
+                 retransmetteur: Optional[retransmission.Retransmetteur] = None,
+                 regulateur: Optional[congestion.Regulateur] = None,
+                 dossier_transferts: str = transfert.DOSSIER_TRANSFERTS,
+                 receptions: Optional[dict] = None):
+        # Identifiant local (alloué par TableSessions) et celui du pair,
+        # placé devant chaque datagramme envoyé
+        self.id_session = id_session if id_session is not None else next(Session._compteur_ids)
+        self.id_distant: Optional[int] = None
         self.cet_appareil = sock_local
         self.destinataire = destinataire
+        if fdc is not None and fdd is None:
+            raise ValueError("Fonction de déchiffrement (fdd) manquante")
         self.fdc = fdc
+        self.fdd = fdd
         self.cle = cle
-
-        self.octets_envoyes: List[bytes] = []
-        self.octets_recus: List[bytes] = []
-
-        from queue import Queue
-        self.octets_a_envoyer = Queue()
+        self.registre = registre.copie() if registre is not None else contenus.registre_par_defaut()
+        # Fichiers envoyés et reçus par morceaux (voir envoyer_fichier)
+        self.transferts = transfert.Transferts(self, dossier_transferts, receptions)
+        self.transferts.enregistrer(self.registre)
+        # Sessions supplémentaires vers le même pair pour les gros envois (Chats.ouvrir_flux)
+        self.flux: List[Session] = []
+        # Rattrapage des messages manqués, via le magasin (voir synchroniser)
+        self.synchro = synchro.Synchronisation(self)
+        # RTT du pair (partagé par les sessions vers la même adresse) ; sans
+        # retransmetteur, les messages ne sont pas renvoyés faute d'accusé
+        self.rtt = estimateur_rtt if estimateur_rtt is not None else rtt.EstimateurRTT()
+        self.retransmetteur = retransmetteur
+        # Le pair retransmet (EXT_RETRANSMISSION) : ses messages sont acquittés
+        self.accuser = False
+        # Cadencement des envois vers ce pair (partagé comme le RTT)
+        self.regulateur = regulateur
+        self._reassembleur = self._creer_reassembleur()
+
+        self.historique = historique.HistoriqueBorne(
+            os.path.join(dossier_historique, f"{os.getpid()}-{self.id_session}-{secrets.token_hex(4)}.log"),
+            HISTORIQUE_CAPACITE)
+        # Stockage persistant optionnel (partagé par les sessions d'un Chats)
+        self.magasin = magasin
+        self._prochain_numero: Optional[int] = None
+
+        # Rempli par la boucle de réception de Chats pendant un échange de clés
+        self._datagrammes_bruts: Optional[Queue] = None
+        # Côté répondeur : dernière offre reçue et réponse (renvoyée si l'offre est répétée)
+        self._derniere_offre: Optional[bytes] = None
+        self._derniere_reponse: Optional[bytes] = None
+
+        # Tickets de reprise : émis côté répondeur, rangés côté initiateur (assignés par Chats)
+        self.emetteur_tickets: Optional[reprise.EmetteurTickets] = None
+        self.sur_ticket: Optional[Callable] = None
+        self._ticket_en_attente: Optional[bytes] = None
+        self._dernier_ticket: Optional[bytes] = None
+        # Clé fixée par la poignée de main ; reprise : clé issue d'un ticket
+        self.cle_etablie = False
+        self.reprise = False
+        # Le pair ne chiffre pas (échange de clés refusé) : pas de clé, pas de nouvel essai
+        self.kex_refuse = False
+        # Côté répondeur : SESSION_ACK renvoyé si la demande est répétée
+        self._ack_envoye: Optional[bytes] = None
+
+        # Sans ordonnanceur (session hors Chats), l'envoi est synchrone
+        self.ordonnanceur = ordonnanceur_envoi
+        # Numéros des derniers messages reçus : un message renvoyé n'est livré qu'une fois
+        self._recus = set()
+        self._recus_ordre = deque()
+        self.derniere_erreur: Optional[Exception] = None
         self.octets_a_recevoir = Queue()
 
-        self.session_active = False
+        # Empreinte de clé annoncée par le pair dans la poignée de main (EXT_IDENTITE),
+        # quand sa clé publique n'est pas connue : identifie le pair dans le magasin une fois prouvée
+        self.empreinte_pair: Optional[bytes] = None
+
+        # Prévenu quand session_active change (TableSessions)
+        self._sur_changement: Optional[Callable] = None
+        self._session_active = False
         self.authentique = False
 
         self.demander_preuve: Optional[Callable] = None
         self.fournir_preuve: Optional[Callable] = None
         self.confirmer_preuve: Optional[Callable] = None
 
-        self._thread_envoi = None
-        self._stop_threads = False
+        self._fermee = False
+
+    @property
+    def session_active(self) -> bool:
+        return self._session_active
+
+    @session_active.setter
+    def session_active(self, valeur: bool):
+        changement = self._session_active != valeur
+        self._session_active = valeur
+        if changement and self._sur_changement is not None:
+            self._sur_changement(self)
+
+    @property
+    def empreinte(self) -> Optional[bytes]:
+        return empreinte_cle(self.destinataire.ut.cle_publique) or self.empreinte_pair
 
-    def envoyer_octets(self, octets: bytes, tdc: bytes = b'\x00', infos_sup: bytes = b'\x00\x00\x00\x00'):
-        """Envoie des octets via paquets.charger_octets."""
-        paq_list = paquets.charger_octets(octets, self.fdc if self.fdc is not None else paquets.NotImplemented,
-                                          self.cle if self.cle is not None else b'', tdc, infos_sup)
-        for p in paq_list:
-            self.cet_appareil.sendto(p, (self.destinataire.ip, self.destinataire.port))
-        self.octets_envoyes.append(octets)
+    @property
+    def conversation(self) -> str:
+        """
+        Identifiant stable du pair pour le stockage : empreinte de sa clé
+        (connue, ou annoncée dans la poignée de main) une fois qu'il a prouvé
+        la détenir (authentique), sinon son IP. Une empreinte se recopie
+        depuis les annonces : non prouvée, elle ne donne pas accès à
+        l'historique d'un autre pair.
+        """
+        empreinte = self.empreinte
+        return empreinte.hex() if empreinte is not None and self.authentique else self.destinataire.ip
+
+    def _numero_suivant(self) -> int:
+        """
+        Numéro du prochain message envoyé, transmis dans infos_sup. La suite
+        reprend après le dernier message stocké pour ce pair ; sans message
+        stocké, elle part d'un numéro tiré au hasard : un émetteur redémarré
+        ne réutilise pas des numéros que le pair a déjà rangés (il les
+        ignorerait comme doublons, voir stockage).
+        """
+        if self._prochain_numero is None:
+            dernier = self.magasin.dernier_id(self.conversation, historique.ENVOYE) if self.magasin is not None else -1
+            self._prochain_numero = (dernier + 1) % (1 << 32) if dernier >= 0 else secrets.randbelow(1 << 32)
+        numero = self._prochain_numero
+        self._prochain_numero = (numero + 1) % (1 << 32)
+        return numero
+
+    def _stocker(self, sens: int, numero: int, tdc: int, contenu):
+        if self.magasin is None or tdc not in TDC_STOCKES:
+            return
+        if isinstance(contenu, str):
+            contenu = contenu.encode('utf-8')
+        conversation = self.conversation
+        self.magasin.ajouter(conversation, conversation, numero, sens, contenu, tdc)
+
+    def _preparer(self, octets: bytes, tdc: bytes, infos_sup: Optional[bytes]) -> Tuple[int, List[bytes]]:
+        """
+        Découpe le message via paquets.charger_octets et l'inscrit dans l'historique.
+        Sans infos_sup explicite, le numéro du message y est placé.
+        Retourne (numéro du message, paquets) ; le numéro est infos_sup lu comme un entier.
+        """
+        numero = None
+        if infos_sup is None:
+            numero = self._numero_suivant()
+            infos_sup = numero.to_bytes(4, 'big')
+        paq_list = paquets.charger_octets(octets, self.fdc if self.fdc is not None else NotImplemented,
+                                          self.cle if self.cle is not None else b'', tdc, infos_sup,
+                                          marquer=self.retransmetteur is not None)
+        if tdc[0] not in TDC_INTERNES:
+            self.historique.ajouter(historique.ENVOYE, octets)
+        if numero is not None:
+            self._stocker(historique.ENVOYE, numero, tdc[0], octets)
+        return int.from_bytes(infos_sup, 'big'), paq_list
+
+    def emettre(self, datagramme: bytes):
+        """Envoie un datagramme au pair, préfixé par son identifiant de session."""
+        if self.id_distant is not None:
+            datagramme = paquets.prefixer_sid(self.id_distant, datagramme)
+        self.cet_appareil.sendto(datagramme, (self.destinataire.ip, self.destinataire.port))
+
+    def envoyer_octets(self, octets: bytes, tdc: bytes = b'\x00', infos_sup: Optional[bytes] = None):
+        """Envoie des octets sans passer par l'ordonnanceur (cadencés si la session a un régulateur)."""
+        for p in self._preparer(octets, tdc, infos_sup)[1]:
+            if self.regulateur is not None:
+                attente = self.regulateur.attente(len(p))
+                if attente > 0:
+                    time.sleep(attente)
+                self.regulateur.consommer(len(p))
+            self.emettre(p)
+
+    def envoyer(self, octets: bytes, tdc: bytes = b'\x00', infos_sup: Optional[bytes] = None,
+                priorite: Optional[int] = None, sur_fin: Optional[Callable] = None):
+        """
+        Met un message en file d'envoi. La priorité par défaut dépend du
+        type de contenu (voir PRIORITES). Dans un Chats, le message est
+        renvoyé tant que le pair ne l'a pas acquitté ; infos_sup (le numéro
+        du message par défaut) l'identifie dans la session.
+        `sur_fin(True)` est appelé à l'accusé du pair, `sur_fin(False)` si le
+        message est abandonné (sans retransmission : dès la mise en file).
+        """
+        if self._fermee:
+            raise ConnectionError("Session fermée")
+        if self.ordonnanceur is None:
+            self.envoyer_octets(octets, tdc, infos_sup)
+            if sur_fin is not None:
+                sur_fin(True)
+            return
+        if priorite is None:
+            priorite = PRIORITES.get(tdc[0], ordonnanceur.INTERACTIF)
+        numero, paq_list = self._preparer(octets, tdc, infos_sup)
+        if self.retransmetteur is None:
+            self.ordonnanceur.soumettre(self, paq_list, priorite)
+            if sur_fin is not None:
+                sur_fin(True)
+            return
+
+        def armer():
+            self.retransmetteur.armer(self, numero)
+
+        def renvoyer():
+            self.ordonnanceur.soumettre(self, paq_list, priorite, fin=armer)
+
+        self.retransmetteur.suivre(self, numero, renvoyer, sum(len(p) for p in paq_list), sur_fin)
+        self.ordonnanceur.soumettre(self, paq_list, priorite, fin=armer)
+
+    def _creer_reassembleur(self) -> paquets.Reassembleur:
+        # Avec retransmission (sessions d'un Chats), les paquets sont marqués :
+        # ceux d'un message dont l'entête est perdue ne sont pas mélangés au suivant
+        return paquets.Reassembleur(self.registre.creer,
+                                    self.fdd if self.fdd is not None else NotImplemented,
+                                    self.cle if self.cle is not None else b'',
+                                    marquage=self.retransmetteur is not None)
+
+    def recevoir_datagramme(self, datagramme: bytes):
+        """
+        Passe un datagramme au réassembleur de la session.
+        Retourne le résultat du gestionnaire de contenu quand le message est complet.
+        """
+        if self._reassembleur.cle != (self.cle if self.cle is not None else b''):
+            self._reassembleur = self._creer_reassembleur()  # nouvelle clé de session
+        resultat = self._reassembleur.ajouter(datagramme)
+        if resultat is not None:
+            tdc, infos_sup = self._reassembleur.dernier_entete
+            numero = int.from_bytes(infos_sup, 'big')
+            if self.accuser:
+                self.emettre(retransmission.encoder_accuse(numero))
+            if numero in self._recus:
+                return None  # renvoi d'un message déjà livré (accusé perdu)
+            self._recus.add(numero)
+            self._recus_ordre.append(numero)
+            if len(self._recus_ordre) > FENETRE_DOUBLONS:
+                self._recus.discard(self._recus_ordre.popleft())
+            if tdc == contenus.TDC_SYNCHRO:
+                self.synchro.traiter(resultat)
+                return resultat
+            if tdc in TDC_INTERNES:
+                self.transferts.traiter(tdc, resultat)
+                return resultat
+            if isinstance(resultat, (bytes, str)):
+                self.historique.ajouter(historique.RECU, resultat)
+                self._stocker(historique.RECU, numero, tdc, resultat)
+            self.octets_a_recevoir.put(resultat)
+        return resultat
+
+    def livrer(self, datagramme: bytes):
+        """Point d'entrée de la boucle de réception de Chats pour cette session."""
+        if datagramme.startswith(retransmission.ACCUSE_MAGIC):
+            numero = retransmission.decoder_accuse(datagramme)
+            if numero is not None and self.retransmetteur is not None:
+                self.retransmetteur.acquitter(self, numero)
+            return None
+        if datagramme.startswith(reprise.TICKET_MAGIC):
+            self._recevoir_ticket(datagramme[len(reprise.TICKET_MAGIC):])
+            return None
+        if datagramme.startswith(echange_cles.KEX_MAGIC):
+            file_brute = self._datagrammes_bruts
+            if file_brute is not None:
+                file_brute.put(datagramme)
+            else:
+                self._repondre_echange_cle(datagramme)
+            return None
+        return self.recevoir_datagramme(datagramme)
 
     def recevoir_octets(self, paquets_list: List[bytes]):
-        """Reconstitue les octets via paquets.decharger_octets."""
-        octets = paquets.decharger_octets(paquets_list, paquets.NotImplemented, b'')
-        self.octets_recus.append(octets)
-        return octets
-
-    def thread_envoi(self):
-        def _run():
-            from queue import Empty
-            while not self._stop_threads:
+        """Reconstitue un message complet à partir de sa liste de paquets."""
+        resultat = None
+        for p in paquets_list:
+            resultat = self.recevoir_datagramme(p)
+        return resultat
+
+    def _echange_cle(self, timeout: Optional[float] = None, retry: int = 3) -> bytes:
+        """
+        Échange de clés côté initiateur (voir echange_cles).
+        Sans timeout, chaque essai attend le RTO de la session.
+        """
+        initiateur = echange_cles.Initiateur()
+        self._datagrammes_bruts = Queue()
+        try:
+            for attempt in range(retry):
+                self.emettre(initiateur.offre)
                 try:
-                    data = self.octets_a_envoyer.get(timeout=0.5)
-                    self.envoyer_octets(data)
-                except Exception:
+                    reponse = self._datagrammes_bruts.get(timeout=timeout if timeout is not None else self.rtt.rto)
+                except Empty:
+                    self.rtt.reculer()
                     continue
-        self._thread_envoi = threading.Thread(target=_run, daemon=True)
-        self._thread_envoi.start()
-
-    def _echange_cle(self):
-        """Échange Diffie-Hellman minimaliste."""
-        a = secrets.randbelow(paquets.__dict__.get('p', 0xFFFFFFFF)) if hasattr(paquets, 'p') else secrets.randbelow(1 << 256)
-        A = pow(paquets.__dict__.get('g', 2) if hasattr(paquets, 'g') else 2, a, paquets.__dict__.get('p', (1 << 2048) - 1))
-        self.cet_appareil.sendto(A.to_bytes((A.bit_length() + 7) // 8, 'big'),
-                                 (self.destinataire.ip, self.destinataire.port))
-        data, _ = self.cet_appareil.recvfrom(4096)
-        B = int.from_bytes(data, 'big')
-        K = pow(B, a, paquets.__dict__.get('p', (1 << 2048) - 1))
-        return K.to_bytes((K.bit_length() + 7) // 8, 'big')
-
-    def creer_session(self, initiateur: bool = True, timeout: float = 1.0):
+                return initiateur.terminer(reponse)
+        finally:
+            self._datagrammes_bruts = None
+        raise ConnectionError("Pas de réponse à l'échange de clés")
+
+    def _repondre_echange_cle(self, offre: bytes):
+        """Échange de clés côté répondeur, appelé par la boucle de réception."""
+        if self.fdc is None:
+            self.emettre(echange_cles.refus())  # sans chiffrement, une clé ne servirait qu'au pair
+            return
+        if offre != self._derniere_offre:
+            try:
+                reponse, cle = echange_cles.repondre(offre)
+            except echange_cles.ErreurEchange:
+                return
+            self._derniere_offre, self._derniere_reponse = offre, reponse
+            self.cle = cle
+            if self.emetteur_tickets is not None:
+                ticket, expiration = self.emetteur_tickets.emettre(reprise.secret_de_reprise(cle))
+                self._dernier_ticket = reprise.TICKET_MAGIC + reprise.encoder_ticket(ticket, expiration)
+        self.emettre(self._derniere_reponse)
+        if self._dernier_ticket is not None:
+            self.emettre(self._dernier_ticket)
+
+    def _recevoir_ticket(self, octets: bytes):
+        """Ticket remis par le répondeur ; rangé dès que la clé de session est connue."""
+        if self.cle is None:
+            self._ticket_en_attente = octets
+            return
+        try:
+            ticket, expiration = reprise.decoder_ticket(octets)
+        except reprise.ErreurTicket:
+            return
+        if self.sur_ticket is not None:
+            self.sur_ticket(self, ticket, expiration)
+
+    def creer_session(self, initiateur: bool = True, timeout: Optional[float] = None):
         """Crée/initialise la session."""
-        if self.fdc is not None:
+        if self.fdc is not None and not self.cle_etablie and not self.kex_refuse:
+            # Pair qui n'a pas répondu à la part de clés du SESSION_REQUEST
             try:
-                cle_secrete = self._echange_cle()
-                self.cle = cle_secrete
-            except Exception:
+                self.cle = self._echange_cle(timeout)
+            except (ConnectionError, echange_cles.ErreurEchange, OSError):
                 self.cle = None
+            if self.cle is not None and self._ticket_en_attente is not None:
+                octets, self._ticket_en_attente = self._ticket_en_attente, None
+                self._recevoir_ticket(octets)
 
-        try:
-            if self.demander_preuve is not None:
-                result = self.demander_preuve(self)
-                self.authentique = bool(result)
-            else:
+        if not self.authentique:
+            # Preuve non faite pendant la poignée de main
+            try:
+                self.authentique = bool(self.demander_preuve(self)) if self.demander_preuve is not None else False
+            except Exception:
                 self.authentique = False
-        except Exception:
-            self.authentique = False
 
         self.session_active = True
-        self.thread_envoi()
 
     def get_historique(self) -> dict:
+        """Itérateurs paresseux sur (horodatage, sens, contenu), du plus ancien au plus récent."""
         return {
-            'envoyes': list(self.octets_envoyes),
-            'recus': list(self.octets_recus),
+            'envoyes': self.historique.iterer(historique.ENVOYE),
+            'recus': self.historique.iterer(historique.RECU),
             'authentique': bool(self.authentique)
         }
 
+    def synchroniser(self) -> synchro.Synchronisation:
+        """
+        Demande au pair les messages envoyés qui ne sont pas dans notre
+        magasin (coupure réseau, message abandonné) et les y range. Le pair
+        fait de même de son côté. Non bloquant : `attendre()` sur le résultat.
+        """
+        if self._fermee:
+            raise ConnectionError("Session fermée")
+        if self.synchro.termine.is_set():
+            self.synchro = synchro.Synchronisation(self)
+        return self.synchro.demarrer()
+
+    def envoyer_fichier(self, chemin: str, adapter: bool = True) -> transfert.EnvoiFichier:
+        """
+        Envoie un fichier par morceaux (voir transfert). Non bloquant :
+        `attendre()` sur le résultat pour connaître l'issue. Le pair reçoit
+        un transfert.FichierRecu dans octets_a_recevoir. Renvoyer le même
+        fichier après une coupure reprend là où le transfert s'est arrêté.
+        Les morceaux sont répartis sur les flux ouverts (self.flux) ; sans
+        `adapter`, tous les flux servent dès le départ.
+        """
+        if self._fermee:
+            raise ConnectionError("Session fermée")
+        return self.transferts.envoyer(chemin, voies=[f for f in self.flux if not f._fermee], adapter=adapter)
+
     def close(self):
-        self._stop_threads = True
+        self._fermee = True
         self.session_active = False
+        if self.ordonnanceur is not None:
+            self.ordonnanceur.retirer(self)
+        if self.retransmetteur is not None:
+            self.retransmetteur.retirer(self)
+        self.transferts.fermer()
+        for flux in self.flux:
+            flux.close()
+        self.historique.fermer()
+
+class TableSessions:
+    """
+    Sessions indexées par identifiant de session local, par (adresse,
+    identifiant du pair), par adresse du pair et par empreinte de clé
+    publique.
+
+    Les lectures (par_id, par_adresse, par_empreinte, actives) ne prennent
+    pas le verrou : les index sont des dict et la liste des sessions
+    actives est un tuple reconstruit à chaque modification.
+    """
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._par_id: Dict[int, Session] = {}
+        self._par_distant: Dict[Tuple[Tuple[str, int], int], Session] = {}
+        self._par_adresse: Dict[Tuple[str, int], Session] = {}
+        self._par_empreinte: Dict[bytes, Session] = {}
+        self._actives: Tuple[Session, ...] = ()
+        self._prochain_id = 1
+
+    def _allouer_id(self) -> int:
+        for _ in range(paquets.SID_MAX):
+            sid = self._prochain_id
+            self._prochain_id = sid % paquets.SID_MAX + 1  # 0 est réservé
+            if sid not in self._par_id:
+                return sid
+        raise ConnectionError("Plus d'identifiant de session disponible")
+
+    def inserer_ou_obtenir(self, adresse: Tuple[str, int], fabrique: Callable,
+                           id_distant: Optional[int] = None, unique: bool = False) -> Tuple[Session, bool]:
+        """
+        Retourne (session, créée). `fabrique(id_session)` crée la session
+        avec un identifiant local libre.
+
+        Avec `id_distant`, la session déjà ouverte par ce pair sous cet
+        identifiant est réutilisée (SESSION_REQUEST répété). Avec `unique`,
+        c'est la session non fermée à cette adresse, même en cours de
+        poignée de main. Sinon, une nouvelle session est toujours créée.
+        """
+        with self._verrou:
+            if unique:
+                existante = self._par_adresse.get(adresse)
+                if existante is not None and not existante._fermee:
+                    return existante, False
+            if id_distant is not None:
+                existante = self._par_distant.get((adresse, id_distant))
+                if existante is not None and not existante._fermee:
+                    return existante, False
+                if existante is not None:
+                    self._retirer(existante)
+            session = fabrique(self._allouer_id())
+            session._sur_changement = self._actualiser
+            self._par_id[session.id_session] = session
+            self._par_adresse[adresse] = session
+            if id_distant is not None:
+                session.id_distant = id_distant
+                self._par_distant[(adresse, id_distant)] = session
+            empreinte = session.empreinte
+            if empreinte is not None:
+                self._par_empreinte[empreinte] = session
+            self._reconstruire()
+            return session, True
+
+    def definir_distant(self, session: Session, id_distant: int):
+        """Enregistre l'identifiant choisi par le pair (reçu dans SESSION_ACK)."""
+        with self._verrou:
+            session.id_distant = id_distant
+            self._par_distant[((session.destinataire.ip, session.destinataire.port), id_distant)] = session
+
+    def readresser(self, session: Session, adresse: Tuple[str, int]):
+        """Le pair répond depuis une autre adresse (flux parallèle) : la session la suit."""
+        with self._verrou:
+            ancienne = (session.destinataire.ip, session.destinataire.port)
+            if self._par_adresse.get(ancienne) is session:
+                del self._par_adresse[ancienne]
+            session.destinataire.ip, session.destinataire.port = adresse
+            self._par_adresse[adresse] = session
+
+    def indexer_empreinte(self, session: Session):
+        """À appeler quand la clé publique du pair devient connue."""
+        empreinte = session.empreinte
+        if empreinte is not None:
+            with self._verrou:
+                self._par_empreinte[empreinte] = session
+
+    def par_adresse(self, adresse: Tuple[str, int]) -> Optional[Session]:
+        """Dernière session ouverte avec cette adresse."""
+        return self._par_adresse.get(adresse)
+
+    def par_distant(self, adresse: Tuple[str, int], id_distant: int) -> Optional[Session]:
+        """Session ouverte par ce pair sous cet identifiant, si elle existe encore."""
+        session = self._par_distant.get((adresse, id_distant))
+        return session if session is not None and not session._fermee else None
+
+    def par_id(self, id_session: int) -> Optional[Session]:
+        return self._par_id.get(id_session)
+
+    def par_empreinte(self, empreinte: bytes) -> Optional[Session]:
+        return self._par_empreinte.get(empreinte)
+
+    def actives(self) -> Tuple[Session, ...]:
+        return self._actives
+
+    def retirer(self, session: Session):
+        with self._verrou:
+            self._retirer(session)
+            self._reconstruire()
+
+    def _retirer(self, session: Session):
+        adresse = (session.destinataire.ip, session.destinataire.port)
+        if self._par_adresse.get(adresse) is session:
+            del self._par_adresse[adresse]
+        if session.id_distant is not None and self._par_distant.get((adresse, session.id_distant)) is session:
+            del self._par_distant[(adresse, session.id_distant)]
+        if self._par_id.get(session.id_session) is session:
+            del self._par_id[session.id_session]
+        empreinte = session.empreinte
+        if empreinte is not None and self._par_empreinte.get(empreinte) is session:
+            del self._par_empreinte[empreinte]
+        session._sur_changement = None
+
+    def _actualiser(self, session: Session):
+        with self._verrou:
+            self._reconstruire()
+
+    def _reconstruire(self):
+        self._actives = tuple(s for s in self._par_id.values() if s.session_active)
+
+    def clear(self):
+        with self._verrou:
+            for session in list(self._par_id.values()):
+                session._sur_changement = None
+            self._par_adresse.clear()
+            self._par_distant.clear()
+            self._par_id.clear()
+            self._par_empreinte.clear()
+            self._actives = ()
+
+    def __iter__(self):
+        return iter(tuple(self._par_id.values()))
+
+    def __len__(self) -> int:
+        return len(self._par_id)
+
+class Voie:
+    """
+    Socket UDP supplémentaire avec son fil de réception et son fil d'envoi
+    (ordonnanceur), pour les flux parallèles : un seul fil Python ne suffit
+    pas à remplir un lien rapide.
+    """
+
+    def __init__(self, chats: "Chats"):
+        self.sock = chats._creer_socket_p2p()
+        self.sock.settimeout(0.5)  # la boucle de réception vérifie _stop_mon
+        self.port = self.sock.getsockname()[1]
+        self.ordonnanceur = ordonnanceur.Ordonnanceur()
+        self._fil = threading.Thread(target=chats.boucle_reception, args=(self.sock,), daemon=True)
+        self._fil.start()
+
+    def fermer(self):
+        self.ordonnanceur.arreter()
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
 
 class Chats:
-    def __init__(self, ip: Optional[str] = None, multicast_active: bool = True):
+    def __init__(self, ip: Optional[str] = None, multicast_active: bool = True,
+                 magasin: Optional[stockage.MagasinMessages] = None,
+                 fdc: Optional[Callable] = None, fdd: Optional[Callable] = None,
+                 decouverte: int = DECOUVERTE_ANNONCES):
+        if fdc is not None and fdd is None:
+            raise ValueError("Fonction de déchiffrement (fdd) manquante")
         self.ip = ip if ip is not None else self._choose_local_ip()
-        self.sessions: List[Session] = []
-        self.contenu_chaines: List[Optional[dict]] = [None] * len(adresses_multicast)
+        self.decouverte = decouverte
+        self.magasin = magasin
+        # Chiffrement des sessions ouvertes par les pairs (clé issue de l'échange de clés)
+        self.fdc = fdc
+        self.fdd = fdd
+        # Reprise de session : tickets émis pour nos pairs, tickets reçus des pairs
+        self.tickets = reprise.EmetteurTickets()
+        self.cache_tickets = reprise.CacheTickets()
+        # Un seul fil d'envoi pour toutes les sessions
+        self.ordonnanceur = ordonnanceur.Ordonnanceur()
+        # Renvoi des messages non acquittés, au RTO estimé pour chaque pair
+        self.retransmetteur = retransmission.Retransmetteur()
+        self._estimateurs_rtt: Dict[Tuple[str, int], rtt.EstimateurRTT] = {}
+        # Débit d'envoi par pair (seau à jetons + AIMD)
+        self._regulateurs: Dict[Tuple[str, int], congestion.Regulateur] = {}
+        # Sert aussi d'aiguillage pour la boucle de réception
+        self.sessions = TableSessions()
+        # Fichiers en cours de réception, par identifiant de transfert (toutes sessions)
+        self.receptions_fichiers: Dict[bytes, transfert.ReceptionFichier] = {}
+        # Voies des flux parallèles, créées à la demande (voir ouvrir_flux)
+        self.voies: List[Voie] = []
+        self.voies_max = VOIES_MAX
+        self._prochaine_voie = 0
+        self._verrou_voies = threading.Lock()
+        # Flux demandés en attente de SESSION_ACK : id de session local -> adresse principale du pair
+        self._flux_attendus: Dict[int, Tuple[str, int]] = {}
+        # Demandes de session en attente d'un SESSION_ACK : id de session local -> Event
+        self._attentes_ack: Dict[int, threading.Event] = {}
+        # SESSION_ACK reçus, lus par l'initiateur à son réveil
+        self._acks_recus: Dict[int, bytes] = {}
+        # Poignée de main : preuve d'identité optionnelle, signée sur l'empreinte
+        # des messages échangés, et vérifiée avec verifier_preuve(session, empreinte, preuve)
+        # contre la clé d'empreinte session.empreinte
+        self.signer_preuve: Optional[Callable[[bytes], bytes]] = None
+        self.verifier_preuve: Optional[Callable[[Session, bytes, bytes], bool]] = None
+        # Cookies : émis pour les initiateurs, reçus des répondeurs (par adresse)
+        self.cookies = poignee.EmetteurCookies()
+        self._cookies_recus: Dict[Tuple[str, int], bytes] = {}
+        self._demi_ouvertes: Dict[Session, float] = {}
+        self.seuil_cookie = SEUIL_COOKIE
+        # Pairs découverts par multicast (voir annuaire ; lecture : contenu_chaines,
+        # suivi des arrivées et départs : annuaire.abonner)
+        self.annuaire = annuaire.Annuaire()
+        self.annuaire.abonner(self._pair_change)
         self.chaine_multicast: Optional[str] = None
+        # Identité qui fixe l'ordre d'essai des chaînes (voir ordre_chaines) ;
+        # à défaut de clé publique, l'adresse P2P. essais_chaine : rang de la chaîne prise.
+        self.identite_chaine: Optional[bytes] = None
+        # Notre clé publique : son empreinte est annoncée, la clé est remise à qui la demande
+        # (CLE_DEMANDE). Clés des pairs, obtenues à la demande, par empreinte (voir cle_publique_pair).
+        self.cle_publique: Optional[bytes] = None
+        self.cles_publiques: Dict[bytes, bytes] = {}
+        # Clés entières lues dans les annonces (ancien format) : cache séparé, qui
+        # ne peut pas évincer les clés demandées
+        self.cles_annoncees: Dict[bytes, bytes] = {}
+        self._cles_attendues: Dict[bytes, threading.Event] = {}
+        self.essais_chaine = 0
+        # Annonces au format compact (voir annonce) ; False : ancien format, pour les pairs
+        # qui ne lisent que lui. La dernière annonce construite est gardée (voir annonce_courante).
+        self.annonces_compactes = True
+        self._annonce_cache: Optional[Tuple[tuple, bytes]] = None
+        # Cadence de nos annonces (créée avec la chaîne)
+        self.trickle: Optional[trickle.Trickle] = None
+        # Recherche de chaîne en arrière-plan : prévenu quand on est annoncé (voir chercher_chaine_multicast)
+        self.chaine_prete = threading.Event()
+        self.sur_chaine: Optional[Callable[[str], None]] = None
         self.code_connexion: Optional[str] = None
         
         # Nouveau: Socket P2P dédiée pour les sessions
         self.sock_p2p = self._creer_socket_p2p()
+        self.sock_p2p.settimeout(0.5)  # la boucle de réception vérifie _stop_mon
         self.port_p2p = self.sock_p2p.getsockname()[1] if self.sock_p2p else None
 
         # Socket de recherche multicast
@@ -237,16 +907,25 @@ class Chats:
         except Exception:
             pass
 
-        # Démarrer la diffusion multicast automatiquement
+        self._stop_mon = False
+        self.erreurs_reception = 0  # datagrammes dont le traitement a échoué (voir boucle_reception)
+        # Démarrer la diffusion multicast automatiquement, sans bloquer le constructeur ;
+        # en mode requêtes, pas de chaîne : une requête (qui nous annonce aussi) au démarrage
+        if multicast_active and decouverte == DECOUVERTE_ANNONCES:
+            self.chercher_chaine_multicast()
+        elif multicast_active:
+            threading.Thread(target=self.interroger, daemon=True).start()
+        # Balayage unicast de secours (voir _secours_balayage) ; balayage : le dernier lancé
+        self.balayage_auto = multicast_active
+        self.balayage: Optional[balayage.Balayage] = None
         if multicast_active:
-            self.trouver_chaine_multicast()
+            threading.Thread(target=self._secours_balayage, daemon=True).start()
 
-        self._stop_mon = False
         if multicast_active:
             self._monitor_thread = threading.Thread(target=self.actualiser_contenu_chaines, daemon=True)
             self._monitor_thread.start()
 
-        self._incoming_thread = threading.Thread(target=self.ecouter_demandes_session, daemon=True)
+        self._incoming_thread = threading.Thread(target=self.boucle_reception, daemon=True)
         self._incoming_thread.start()
 
     def _creer_socket_p2p(self) -> socket.socket:
@@ -320,9 +999,11 @@ class Chats:
         return candidates[0] if candidates else "127.0.0.1"
 
     def _parse_multicast_payload(self, payload: bytes) -> Optional[dict]:
-        """Parse et valide un payload multicast."""
-        if not payload or len(payload) != MULTICAST_MSG_SIZE:
+        """Parse et valide un payload multicast, à l'ancien format ou au format compact."""
+        if not payload:
             return None
+        if len(payload) != MULTICAST_MSG_SIZE:
+            return self._parse_annonce_compacte(payload)
         try:
             pack = payload[:-CRC_SIZE]
             crc_recv = payload[-CRC_SIZE:]
@@ -344,77 +1025,146 @@ class Chats:
                 'prenoms': prenoms.decode(errors='ignore') if prenoms else "",
                 'taille_cle': taille_cle,
                 'cle_pub': cle_pub,
-                'infos_sup': infos_sup
+                'infos_sup': infos_sup,
+                'chaine': chaine_revendiquee(infos_sup),
+                'empreinte_cle': empreinte_cle(cle_pub)
             }
         except Exception:
             return None
 
+    def _parse_annonce_compacte(self, payload: bytes) -> Optional[dict]:
+        """
+        Annonce compacte, rendue sous la forme de l'ancien format : infos_sup
+        est reconstitué (IP, port, chaîne revendiquée, puis des zéros).
+        """
+        try:
+            champs = annonce.decoder(payload)
+        except annonce.ErreurAnnonce:
+            return None
+        adresse = champs.get(annonce.CHAMP_ADRESSE, b'')
+        chaine = champs.get(annonce.CHAMP_CHAINE, b'')
+        if len(adresse) != 6 or len(chaine) not in (0, 2):
+            return None
+        infos_sup = (adresse + (chaine or b'\x00\x00')).ljust(INFOS_SUP_SIZE, b'\x00')
+        noms = champs.get(annonce.CHAMP_NOMS, b'')
+        prenoms = champs.get(annonce.CHAMP_PRENOMS, b'')
+        cle_pub = champs.get(annonce.CHAMP_CLE_PUB) or None
+        empreinte = champs.get(annonce.CHAMP_EMPREINTE_CLE) or empreinte_cle(cle_pub)
+        return {
+            'noms': noms.decode(errors='ignore'),
+            'prenoms': prenoms.decode(errors='ignore'),
+            'taille_cle': len(cle_pub) if cle_pub else 0,
+            'cle_pub': cle_pub,
+            'infos_sup': infos_sup,
+            'chaine': chaine_revendiquee(infos_sup),
+            'etat': champs.get(annonce.CHAMP_ETAT, b''),
+            'requete': champs.get(annonce.CHAMP_REQUETE),
+            'empreinte_cle': empreinte
+        }
+
+    @property
+    def contenu_chaines(self) -> Tuple[dict, ...]:
+        """Pairs découverts, dans l'ordre d'arrivée (instantané de l'annuaire)."""
+        return self.annuaire.instantane()
+
+    @property
+    def etat_annuaire(self) -> bytes:
+        """Empreinte des pairs connus, annoncée : deux pairs de même empreinte ont le même état."""
+        return self.annuaire.empreinte
+
+    def periode_presence(self) -> float:
+        """Délai maximal entre deux de nos annonces (voir PRESENCE_MIN et DEBIT_PRESENCE)."""
+        return max(PRESENCE_MIN, len(self.annuaire) / DEBIT_PRESENCE)
+
+    def _pair_change(self, evenement: annuaire.Evenement):
+        """Un pair arrive ou disparaît : notre état change, les annonces sont relancées."""
+        regle = self.trickle
+        if regle is not None and evenement.type != annuaire.MIS_A_JOUR:
+            regle.incoherent()
+
+    def _annonce_entendue(self, ip: str, port: int, parsed: dict):
+        """Informe Trickle : une annonce d'un autre état relance les annonces."""
+        regle = self.trickle
+        etat = parsed.get('etat')
+        if regle is None or not etat or (ip, port) == (self.ip, self.port_p2p):
+            return
+        if etat != self.etat_annuaire:
+            regle.incoherent()
+        else:
+            regle.coherent()
+
     def actualiser_contenu_chaines(self):
         """Boucle d'écoute des annonces multicast."""
         self.sock_de_recherche.settimeout(0.1)
         while not self._stop_mon:
+            self.annuaire.expirer()  # pairs silencieux depuis plus que leur TTL
             try:
-                data, (ip_src, port_src) = self.sock_de_recherche.recvfrom(4096)
-                parsed = self._parse_multicast_payload(data)
-                if parsed is None:
-                    continue
-                    
-                infos = parsed.get('infos_sup', b'\x00' * INFOS_SUP_SIZE)
-                try:
-                    ip_bytes = infos[0:4]
-                    port_bytes = infos[4:6]
-                    ip_from_infos = socket.inet_ntoa(ip_bytes)
-                    port_from_infos = int.from_bytes(port_bytes, 'big')
-                except Exception:
-                    ip_from_infos = ip_src
-                    port_from_infos = port_src
-
-                # NOUVEAU: Détection des doublons par IP:port
-                deja_present = False
-                for i, entry in enumerate(self.contenu_chaines):
-                    if entry and entry.get('ip') == ip_from_infos and entry.get('port') == port_from_infos:
-                        # Mise à jour de l'entrée existante
-                        self.contenu_chaines[i] = {
-                            'payload': data,
-                            'ip': ip_from_infos,
-                            'port': port_from_infos,
-                            'parsed': parsed,
-                            'last_seen': time.time()
-                        }
-                        deja_present = True
-                        break
-
-                if not deja_present:
-                    # Stocker dans le premier slot libre
-                    for i in range(len(self.contenu_chaines)):
-                        if self.contenu_chaines[i] is None:
-                            self.contenu_chaines[i] = {
-                                'payload': data,
-                                'ip': ip_from_infos,
-                                'port': port_from_infos,
-                                'parsed': parsed,
-                                'last_seen': time.time()
-                            }
-                            break
-                    else:
-                        # Écraser la plus vieille entrée
-                        oldest_index = min(range(len(self.contenu_chaines)), 
-                                         key=lambda i: self.contenu_chaines[i]['last_seen'] if self.contenu_chaines[i] else float('inf'))
-                        self.contenu_chaines[oldest_index] = {
-                            'payload': data,
-                            'ip': ip_from_infos,
-                            'port': port_from_infos,
-                            'parsed': parsed,
-                            'last_seen': time.time()
-                        }
+                data, source = self.sock_de_recherche.recvfrom(4096)
+                self._datagramme_decouverte(data, source)
             except socket.timeout:
                 continue
             except Exception:
                 continue
 
+    def _datagramme_decouverte(self, data: bytes, source: Tuple[str, int]):
+        """
+        Annonce ou requête reçue sur le port des annonces, par multicast ou
+        en unicast (balayage d'un pair, voir balayer_sous_reseau).
+        """
+        ip_src, port_src = source
+        parsed = self._parse_multicast_payload(data)
+        if parsed is None:
+            return
+
+        infos = parsed.get('infos_sup', b'\x00' * INFOS_SUP_SIZE)
+        try:
+            ip_bytes = infos[0:4]
+            port_bytes = infos[4:6]
+            ip_from_infos = socket.inet_ntoa(ip_bytes)
+            port_from_infos = int.from_bytes(port_bytes, 'big')
+        except Exception:
+            ip_from_infos = ip_src
+            port_from_infos = port_src
+
+        if parsed['cle_pub']:
+            self._ranger_cle(parsed['cle_pub'], annoncee=True)  # ancien format : la clé entière est annoncée
+        # Une requête est aussi l'annonce du demandeur
+        requete = parsed.pop('requete', None)
+        ttl = FACTEUR_TTL * self.periode_presence() if self.decouverte == DECOUVERTE_ANNONCES else TTL_REPONSE
+        self.annuaire.ajouter(ip_from_infos, port_from_infos, parsed, data, ttl)
+        self._annonce_entendue(ip_from_infos, port_from_infos, parsed)
+        if requete is not None and (ip_from_infos, port_from_infos) != (self.ip, self.port_p2p):
+            self._repondre_requete(requete, (ip_src, port_src))
+
     def _build_multicast_payload(self, noms: bytes = None, prenoms: bytes = None,
-                                 cle_pub: Optional[bytes] = None, port_reception: Optional[int] = None) -> bytes:
-        """Construit le message multicast avec le port P2P actuel."""
+                                 cle_pub: Optional[bytes] = None, port_reception: Optional[int] = None,
+                                 requete: Optional[bytes] = None) -> bytes:
+        """
+        Construit le message multicast avec le port P2P actuel. Avec
+        `requete` (valeur de CHAMP_REQUETE), une requête de découverte
+        (format compact seulement).
+        """
+        # NOUVEAU: Utiliser le port P2P dédié dans infos_sup
+        try:
+            ip_bytes = socket.inet_aton(self.ip)
+        except Exception:
+            ip_bytes = b'\x00\x00\x00\x00'
+        port_field = (self.port_p2p if port_reception is None else port_reception).to_bytes(2, 'big')
+        # Chaîne dont nous sommes propriétaire : indice + 1, 0 si aucune
+        chaine = getattr(self, 'chaine_multicast', None)
+        chaine_field = (adresses_multicast.index(chaine) + 1 if chaine in adresses_multicast else 0).to_bytes(2, 'big')
+
+        if getattr(self, 'annonces_compactes', True):
+            return annonce.encoder([
+                (annonce.CHAMP_NOMS, (noms or b"")[:NOMS_SIZE]),
+                (annonce.CHAMP_PRENOMS, (prenoms or b"")[:PRENOMS_SIZE]),
+                (annonce.CHAMP_EMPREINTE_CLE, empreinte_cle(cle_pub[:CLE_PUB_MAX] if cle_pub else None) or b""),
+                (annonce.CHAMP_ADRESSE, ip_bytes + port_field),
+                (annonce.CHAMP_CHAINE, chaine_field if chaine_field != b'\x00\x00' else b''),
+                (annonce.CHAMP_ETAT, getattr(self, 'etat_annuaire', b'')),
+                (annonce.CHAMP_REQUETE, requete),
+            ])
+
         noms_b = (noms or b"")[:NOMS_SIZE].ljust(NOMS_SIZE, b'\x00')
         prenoms_b = (prenoms or b"")[:PRENOMS_SIZE].ljust(PRENOMS_SIZE, b'\x00')
         if cle_pub:
@@ -428,13 +1178,7 @@ class Chats:
             taille_field = (0).to_bytes(TAILLE_CLE_SIZE, 'big')
             cle_field = b'\x00' * CLE_PUB_MAX
 
-        # NOUVEAU: Utiliser le port P2P dédié dans infos_sup
-        try:
-            ip_bytes = socket.inet_aton(self.ip)
-        except Exception:
-            ip_bytes = b'\x00\x00\x00\x00'
-        port_field = (self.port_p2p if port_reception is None else port_reception).to_bytes(2, 'big')
-        infos = ip_bytes + port_field + (b'\x00' * (INFOS_SUP_SIZE - 6))
+        infos = ip_bytes + port_field + chaine_field + (b'\x00' * (INFOS_SUP_SIZE - 8))
 
         pack = noms_b + prenoms_b + taille_field + cle_field + infos
         try:
@@ -444,10 +1188,148 @@ class Chats:
             crc4 = b'\x00' * 4
         return pack + crc4
 
+    def annonce_courante(self, noms: bytes = None, prenoms: bytes = None,
+                         cle_pub: Optional[bytes] = None, port_reception: Optional[int] = None) -> bytes:
+        """
+        _build_multicast_payload, reconstruite seulement quand l'identité,
+        l'adresse, la chaîne revendiquée, l'état de l'annuaire ou le format
+        ont changé.
+        """
+        port = self.port_p2p if port_reception is None else port_reception
+        cle = (noms, prenoms, cle_pub, self.ip, port, self.chaine_multicast, self.annonces_compactes,
+               self.etat_annuaire)
+        cache = self._annonce_cache
+        if cache is None or cache[0] != cle:
+            cache = self._annonce_cache = (cle, self._build_multicast_payload(noms, prenoms, cle_pub, port))
+        return cache[1]
+
+    def _annonce_locale(self, requete: Optional[bytes] = None) -> bytes:
+        """Notre annonce (ou requête), telle que diffusée sur notre chaîne."""
+        # NOUVEAU: Utiliser les informations de l'utilisateur courant
+        noms, prenoms = b"Host", b"Test"  # À remplacer par CURRENT_USER
+        if requete is not None:
+            return self._build_multicast_payload(noms, prenoms, self.cle_publique, self.port_p2p, requete)
+        return self.annonce_courante(noms=noms, prenoms=prenoms, cle_pub=self.cle_publique,
+                                     port_reception=self.port_p2p)
+
+    def _envoyer_annonce(self, destination: Tuple[str, int]):
+        """Notre annonce, vers un groupe ou un demandeur."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+            sock.sendto(self._annonce_locale(), destination)
+        except OSError:
+            pass
+        finally:
+            sock.close()
+
+    def _repondre_requete(self, requete: bytes, source: Tuple[str, int]):
+        """
+        Réponse à une requête de découverte, après un délai tiré dans
+        DELAI_REPONSE (les réponses des pairs ne partent pas toutes ensemble) ;
+        aucune si le demandeur nous connaît déjà.
+        """
+        try:
+            multicast, connus = annonce.decoder_requete(requete)
+        except annonce.ErreurAnnonce:
+            return
+        if annuaire.empreinte_pair(self.ip, self.port_p2p) in connus:
+            return
+        destination = (MULTICAST_GROUP_DEFAULT, MULTICAST_PORT) if multicast else source
+        minuterie = threading.Timer(random.uniform(*DELAI_REPONSE), self._envoyer_annonce, args=(destination,))
+        minuterie.daemon = True
+        minuterie.start()
+
+    def interroger(self, duree: float = DUREE_REQUETE, multicast: bool = False) -> int:
+        """
+        Requête de découverte (voir annonce) : les pairs répondent par leur
+        annonce, sauf ceux que nous connaissons depuis moins de la moitié de
+        leur TTL, listés dans la requête. La requête porte aussi notre
+        annonce : elle nous fait connaître de tous. Les réponses sont
+        attendues `duree` secondes ; avec `multicast`, elles sont envoyées
+        sur le groupe, où tous les appareils les apprennent (et
+        actualiser_contenu_chaines les range), sinon à nous seuls.
+        Retourne le nombre de réponses reçues directement.
+        """
+        payload = self._annonce_locale(annonce.encoder_requete(multicast, self._connus()))
+        reponses = 0
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+            sock.sendto(payload, (MULTICAST_GROUP_DEFAULT, MULTICAST_PORT))
+            fin = time.monotonic() + duree
+            while True:
+                reste = fin - time.monotonic()
+                if reste <= 0:
+                    break
+                sock.settimeout(reste)
+                try:
+                    data, _ = sock.recvfrom(4096)
+                except socket.timeout:
+                    break
+                if self._ranger_reponse(data):
+                    reponses += 1
+        except OSError:
+            pass
+        finally:
+            sock.close()
+        return reponses
+
+    def _connus(self) -> List[int]:
+        """Empreintes des pairs vus depuis moins de la moitié de leur TTL (suppression des réponses connues)."""
+        maintenant = time.time()
+        return [annuaire.empreinte_pair(e['ip'], e['port']) for e in self.contenu_chaines
+                if maintenant - e['last_seen'] < e['ttl'] / 2 and (e['ip'], e['port']) != (self.ip, self.port_p2p)]
+
+    def _ranger_reponse(self, data: bytes, source: Optional[Tuple[str, int]] = None) -> bool:
+        """Réponse à une requête ou à une sonde, rangée dans l'annuaire ; False si invalide ou de nous."""
+        parsed = self._parse_multicast_payload(data)
+        if parsed is None:
+            return False
+        infos = parsed['infos_sup']
+        ip, port = socket.inet_ntoa(infos[0:4]), int.from_bytes(infos[4:6], 'big')
+        if (ip, port) == (self.ip, self.port_p2p):
+            return False
+        parsed.pop('requete', None)
+        self.annuaire.ajouter(ip, port, parsed, data, TTL_REPONSE)
+        return True
+
+    def balayer_sous_reseau(self, prefixe: int = PREFIXE_BALAYAGE, ports_cibles: Optional[List[int]] = None,
+                            debit: float = balayage.DEBIT) -> int:
+        """
+        Découverte sans multicast : une requête (voir interroger) est
+        envoyée en unicast à chaque hôte du sous-réseau /prefixe de notre
+        IP, sur chacun des ports d'écoute (ports_decoutes), à `debit`
+        sondes par seconde (voir balayage). Les pairs répondent comme à
+        une requête multicast et sont rangés dans l'annuaire ; chacun
+        apprend aussi notre annonce. Retourne le nombre d'hôtes qui ont
+        répondu.
+        """
+        try:
+            reseau = ipaddress.ip_network(f"{self.ip}/{prefixe}", strict=False)
+        except ValueError:
+            return 0
+        hotes = [str(h) for h in reseau.hosts()]
+        cibles = [(h, p) for p in (ports_cibles or ports_decoutes) for h in hotes]
+        sonde = self._annonce_locale(annonce.encoder_requete(False, self._connus()))
+        self.balayage = balayage.Balayage(cibles, sonde, self._ranger_reponse, debit)
+        return self.balayage.executer()
+
+    def _secours_balayage(self):
+        """Balaye le sous-réseau si le multicast n'a fait découvrir personne (voir DELAI_SECOURS)."""
+        fin = time.monotonic() + DELAI_SECOURS
+        while time.monotonic() < fin:
+            if self._stop_mon:
+                return
+            time.sleep(0.1)
+        if self.balayage_auto and not any((e['ip'], e['port']) != (self.ip, self.port_p2p)
+                                          for e in self.contenu_chaines):
+            self.balayer_sous_reseau()
+
     def publier_message_sur_chaine_onadresse(self, adresse: str, noms: bytes = None, prenoms: bytes = None,
                                              cle_pub: Optional[bytes] = None, port_reception: Optional[int] = None):
         """Envoie une annonce sur une adresse multicast."""
-        payload = self._build_multicast_payload(noms, prenoms, cle_pub, port_reception)
+        payload = self.annonce_courante(noms, prenoms, cle_pub, port_reception)
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         try:
             ttl = 1
@@ -462,79 +1344,144 @@ class Chats:
             except Exception:
                 pass
 
+    def chercher_chaine_multicast(self, noms: bytes = None, prenoms: bytes = None,
+                                  cle_pub: Optional[bytes] = None,
+                                  port_reception: Optional[int] = None) -> threading.Event:
+        """
+        trouver_chaine_multicast dans un fil. Retourne chaine_prete, levé
+        quand la chaîne est choisie (sur_chaine(adresse) est aussi appelé).
+        """
+        self.chaine_prete.clear()
+        threading.Thread(target=self.trouver_chaine_multicast, args=(noms, prenoms, cle_pub, port_reception),
+                         daemon=True).start()
+        return self.chaine_prete
+
     def trouver_chaine_multicast(self, noms: bytes = None, prenoms: bytes = None,
-                                 cle_pub: Optional[bytes] = None, port_reception: Optional[int] = None) -> Optional[str]:
-        """Tente d'approprier une chaîne multicast et démarre la diffusion."""
-        for adresse in adresses_multicast:
-            if not self._is_chain_quiet(adresse, MULTICAST_LISTEN_INTERVAL):
+                                 cle_pub: Optional[bytes] = None, port_reception: Optional[int] = None,
+                                 exclure: Tuple[str, ...] = ()) -> Optional[str]:
+        """
+        Approprie une chaîne multicast et démarre la diffusion. Toutes les
+        chaînes sont écoutées en même temps pendant MULTICAST_LISTEN_INTERVAL
+        (voir sondage), puis essayées dans l'ordre propre à notre identité
+        (voir ordre_chaines) : la première libre est prise. Une chaîne est
+        occupée si un pair s'en dit propriétaire, dans une annonce entendue
+        sur n'importe quelle chaîne ou déjà dans contenu_chaines, ou si un ancien pair (sans chaîne
+        annoncée) y émet. Deux pairs qui prennent la même chaîne se
+        départagent ensuite dans _broadcast_loop.
+        """
+        if cle_pub:
+            self.identite_chaine = self.cle_publique = cle_pub
+        identite = self.identite_chaine or f"{self.ip}:{self.port_p2p}".encode()
+        candidates = [adresses_multicast[i] for i in ordre_chaines(identite) if adresses_multicast[i] not in exclure]
+        try:
+            sondeur = sondage.Sondeur(self.ip, candidates, MULTICAST_PORT, self._datagramme_decouverte)
+        except OSError:
+            return None
+        try:
+            entendus = sondeur.ecouter(MULTICAST_LISTEN_INTERVAL, self._annonceur)
+        finally:
+            sondeur.fermer()
+        revendiquees = {chaine for annonceurs in entendus.values() for *_, chaine in annonceurs}
+        # Les pairs déjà connus, dont les annonces sont espacées (voir trickle)
+        revendiquees.update(e['parsed'].get('chaine') for e in self.contenu_chaines
+                            if (e['ip'], e['port']) != (self.ip, self.port_p2p))
+        for essai, adresse in enumerate(candidates, 1):
+            if adresse in revendiquees or None in {chaine for *_, chaine in entendus.get(adresse, ())}:
                 continue
-            for attempt in range(APPROPRIATION_ATTEMPTS):
-                self.publier_message_sur_chaine_onadresse(adresse, noms, prenoms, cle_pub, port_reception)
-                time.sleep(MULTICAST_LISTEN_INTERVAL / 2.0)
-                if self._is_chain_quiet(adresse, MULTICAST_LISTEN_INTERVAL / 2.0):
-                    self.chaine_multicast = adresse
-                    # NOUVEAU: Démarrer la diffusion périodique avec les bonnes infos
-                    t = threading.Thread(target=self._broadcast_loop, args=(adresse,), daemon=True)
-                    t.start()
-                    return adresse
-                else:
-                    time.sleep(random.random() * BACKOFF_MAX)
+            self.essais_chaine = essai
+            self.chaine_multicast = adresse
+            # NOUVEAU: Démarrer la diffusion périodique avec les bonnes infos
+            t = threading.Thread(target=self._broadcast_loop, args=(adresse,), daemon=True)
+            t.start()
+            self.chaine_prete.set()
+            if self.sur_chaine is not None:
+                try:
+                    self.sur_chaine(adresse)
+                except Exception:
+                    pass
+            return adresse
         return None
 
-    def _is_chain_quiet(self, adresse: str, duree: float) -> bool:
-        """Vérifie si une chaîne multicast est silencieuse."""
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.settimeout(duree)
-        try:
-            try:
-                mreq = socket.inet_aton(adresse) + socket.inet_aton(self.ip)
-                s.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
-            except Exception:
-                pass
-            try:
-                s.recvfrom(1024)
-                return False
-            except socket.timeout:
-                return True
-        finally:
-            try:
-                s.close()
-            except Exception:
-                pass
+    def _annonceur(self, payload: bytes) -> Optional[Tuple[str, int, Optional[str]]]:
+        """
+        (ip, port, chaîne revendiquée) d'un autre pair ; None pour nos propres
+        annonces ou un datagramme invalide.
+        """
+        parsed = self._parse_multicast_payload(payload)
+        if parsed is None:
+            return None
+        infos = parsed['infos_sup']
+        ip, port = socket.inet_ntoa(infos[0:4]), int.from_bytes(infos[4:6], 'big')
+        return None if (ip, port) == (self.ip, self.port_p2p) else (ip, port, parsed['chaine'])
 
     def _broadcast_loop(self, adresse: str):
-        """Diffusion périodique d'annonces sur la chaîne appropriée."""
+        """
+        Diffusion des annonces sur la chaîne appropriée, à la cadence de
+        Trickle (voir trickle ; les annonces entendues sont comptées par
+        actualiser_contenu_chaines). Entre deux annonces, la chaîne est
+        écoutée : si un autre pair la revendique aussi,
+        celui de plus grande adresse (ip, port) cède et reprend sa suite
+        d'essais (voir trouver_chaine_multicast) sans elle.
+        """
+        # Nouvelle chaîne : annonces rapides, puis espacées tant que rien ne change
+        regle = self.trickle = trickle.Trickle()
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sondeur = sondage.Sondeur(self.ip, [adresse], MULTICAST_PORT, self._datagramme_decouverte)
+        except OSError:
+            sondeur = None
         try:
             try:
                 sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
             except Exception:
                 pass
+            derniere = 0.0
             while self.chaine_multicast == adresse:
-                # NOUVEAU: Utiliser les informations de l'utilisateur courant
-                payload = self._build_multicast_payload(
-                    noms=b"Host",  # À remplacer par CURRENT_USER
-                    prenoms=b"Test",
-                    cle_pub=None,
-                    port_reception=self.port_p2p
-                )
-                try:
-                    sock.sendto(payload, (adresse, MULTICAST_PORT))
-                except Exception:
-                    pass
-                time.sleep(ANNOUNCE_INTERVAL)
+                if regle.avancer() or time.monotonic() - derniere >= self.periode_presence():
+                    payload = self._annonce_locale()
+                    try:
+                        sock.sendto(payload, (adresse, MULTICAST_PORT))
+                    except Exception:
+                        pass
+                    derniere = time.monotonic()
+                # Réveil au moins toutes les imin : une remise à imin est prise en compte aussitôt
+                attente = min(max(0.0, regle.echeance() - time.monotonic()), regle.imin)
+                if sondeur is None:
+                    time.sleep(attente)
+                    continue
+                autres = sondeur.ecouter(attente, self._annonceur).get(adresse, ())
+                if any(chaine in (adresse, None) and (ip, port) < (self.ip, self.port_p2p)
+                       for ip, port, chaine in autres) and self.chaine_multicast == adresse:
+                    self.chaine_multicast = None
+                    self.trouver_chaine_multicast(exclure=(adresse,))
         finally:
+            if self.trickle is regle:
+                self.trickle = None
+            if sondeur is not None:
+                sondeur.fermer()
             try:
                 sock.close()
             except Exception:
                 pass
 
     def creer_session_par_multicast(self, index: int, fdc: Optional[Callable] = None, cle: Optional[bytes] = None,
-                                    timeout: float = 0.5, retry: int = 3) -> Session:
-        """Crée une session avec un appareil détecté via multicast."""
-        if index < 0 or index >= len(self.contenu_chaines):
+                                    timeout: Optional[float] = None, retry: int = 3,
+                                    session_supplementaire: bool = False,
+                                    fdd: Optional[Callable] = None) -> Session:
+        """
+        Crée une session avec un appareil détecté via multicast.
+        `fdd` (déchiffrement) est requise avec `fdc`.
+        Avec session_supplementaire, une autre session peut être ouverte
+        avec un pair déjà connecté (elles sont distinguées par leur identifiant).
+        Sans timeout, chaque essai attend le RTO estimé pour ce pair, doublé
+        après chaque essai sans réponse.
+        """
+        if fdc is not None and fdd is None:
+            raise ValueError("Fonction de déchiffrement (fdd) manquante")
+        entrees = self.contenu_chaines
+        if index < 0 or index >= len(entrees):
             raise IndexError("Index hors plage pour contenu_chaines")
-        entry = self.contenu_chaines[index]
+        entry = entrees[index]
         if not entry:
             raise ValueError("Aucune annonce à cet index")
             
@@ -551,42 +1498,108 @@ class Chats:
                 except Exception:
                     raise ConnectionError("Impossible de déterminer IP/port du pair")
 
-        # NOUVEAU: Détection des doublons par IP:port
-        for s in self.sessions:
-            if (s.destinataire.ip == ip_target and 
-                s.destinataire.port == port_target and 
-                s.session_active):
-                raise ConnectionError("Session déjà existante avec ce pair")
+        # Les annonces ne portent que l'empreinte de la clé : la clé est demandée au pair
+        cle_pub = parsed.get('cle_pub')
+        if not cle_pub and parsed.get('empreinte_cle'):
+            cle_pub = self.cle_publique_pair((ip_target, port_target), parsed['empreinte_cle'], timeout, retry)
+            if cle_pub is None:
+                raise ConnectionError("Clé publique du pair introuvable")
+        utilisateur_temp = Utilisateur([parsed.get('noms') or "Inconnu"], [parsed.get('prenoms') or "Inconnu"],
+                                       cle_privee=None, cle_publique=cle_pub)
+        # Un seul appel à la fois crée la session vers ce pair (voir TableSessions.inserer_ou_obtenir)
+        session = self._ouvrir_session((ip_target, port_target), utilisateur_temp, fdc, fdd, cle, timeout, retry,
+                                       unique=not session_supplementaire)
+        if self.magasin is not None:
+            session.synchroniser()  # rattrape ce qui a été manqué depuis la dernière connexion
+        return session
 
+    def _ouvrir_session(self, adresse: Tuple[str, int], utilisateur: Utilisateur,
+                        fdc: Optional[Callable], fdd: Optional[Callable], cle: Optional[bytes],
+                        timeout: Optional[float], retry: int, voie: Optional["Voie"] = None,
+                        unique: bool = False) -> Session:
+        """
+        Poignée de main d'initiateur vers `adresse`. Avec une voie (flux
+        parallèle), la demande part de la socket de la voie et le pair
+        répond depuis une des siennes : la session suit cette adresse.
+        Avec `unique`, échoue si une session vers `adresse` existe déjà.
+        """
+        ip_target, port_target = adresse
         # Utiliser la socket P2P dédiée pour la session
-        sock_local = self.sock_p2p
+        sock_local = voie.sock if voie is not None else self.sock_p2p
+        appareil = Appareil(ip_target, port_target, utilisateur)
+        # La session (et son identifiant local) existe avant la demande, inactive
+        session, creee = self.sessions.inserer_ou_obtenir(
+            adresse,
+            lambda sid: Session(sock_local, appareil, fdc, cle, fdd, magasin=self.magasin,
+                                ordonnanceur_envoi=voie.ordonnanceur if voie is not None else self.ordonnanceur,
+                                id_session=sid, estimateur_rtt=self._estimateur_rtt(adresse),
+                                retransmetteur=self.retransmetteur,
+                                regulateur=congestion.Regulateur() if voie is not None else self._regulateur(adresse),
+                                receptions=self.receptions_fichiers),
+            unique=unique)
+        if not creee:
+            raise ConnectionError("Session déjà existante avec ce pair")
+        # Tickets rangés sous l'adresse principale du pair, même pour un flux
+        session.sur_ticket = lambda s, ticket, expiration: self._ranger_ticket(adresse, s, ticket, expiration)
+
+        # La clé se négocie dans la demande : ticket de reprise s'il y en a un, sinon part d'échange de clés
+        extensions = []
+        billet = self.cache_tickets.prendre(adresse) if fdc is not None else None
+        nonce = None
+        initiateur_kex = None
+        if billet is not None:
+            nonce = secrets.token_bytes(reprise.TAILLE_NONCE)
+            extensions.append((poignee.EXT_REPRISE, nonce + billet[0]))
+        elif fdc is not None:
+            initiateur_kex = echange_cles.Initiateur()
+            extensions.append((poignee.EXT_KEX, initiateur_kex.offre))
+        if voie is not None:
+            extensions.append((poignee.EXT_FLUX, b""))
         success = False
-        
-        for attempt in range(retry):
-            try:
-                # NOUVEAU: Envoyer la demande sur le port P2P de la cible
-                sock_local.sendto(SESSION_REQUEST, (ip_target, port_target))
-                sock_local.settimeout(timeout)
-                data, addr = sock_local.recvfrom(64)
-                if data == SESSION_ACK:
-                    success = True
-                    break
-            except socket.timeout:
-                continue
-            except Exception:
-                continue
+
+        # Le SESSION_ACK (ou SESSION_RETRY) est capté par la boucle de réception
+        ack = threading.Event()
+        self._attentes_ack[session.id_session] = ack
+        if voie is not None:
+            self._flux_attendus[session.id_session] = adresse
+        estimateur = session.rtt
+        ambigu = False  # une demande restée sans réponse : pas de mesure (règle de Karn)
+        try:
+            essais = 0
+            while essais < retry:
+                essais += 1
+                demande = self._demande_session(session.id_session, extensions, adresse)
+                envoi = time.monotonic()
+                try:
+                    # NOUVEAU: Envoyer la demande sur le port P2P de la cible
+                    sock_local.sendto(demande, adresse)
+                except OSError:
+                    continue
+                if ack.wait(timeout if timeout is not None else estimateur.rto):
+                    if not ambigu:
+                        estimateur.mesurer(time.monotonic() - envoi)
+                    if session.id_distant is not None:
+                        success = True
+                        break
+                    ack.clear()  # SESSION_RETRY : la prochaine demande porte le cookie
+                    essais -= 1
+                else:
+                    ambigu = True
+                    estimateur.reculer()
+        finally:
+            self._attentes_ack.pop(session.id_session, None)
+            self._flux_attendus.pop(session.id_session, None)
+            reponse = self._acks_recus.pop(session.id_session, b'')
 
         if not success:
+            self.sessions.retirer(session)
             raise ConnectionError("Pas de réponse à SESSION_REQUEST depuis le pair")
 
-        utilisateur_temp = Utilisateur([parsed.get('noms') or "Inconnu"], [parsed.get('prenoms') or "Inconnu"],
-                                       cle_privee=None, cle_publique=parsed.get('cle_pub'))
-        appareil = Appareil(ip_target, port_target, utilisateur_temp)
-        session = Session(sock_local, appareil, fdc, cle)
-        
+        self._terminer_poignee(session, demande, reponse, billet, nonce, initiateur_kex,
+                               adresse if voie is None else None)
+
         # NOUVEAU: Démarrer la session automatiquement
         session.creer_session(initiateur=True)
-        self.sessions.append(session)
         return session
 
     def generer_code_connexion(self) -> str:
@@ -595,44 +1608,423 @@ class Chats:
             raise ValueError("Aucun port P2P disponible")
         return encode_connexion_code(self.ip, self.port_p2p)
 
-    def liste_sessions_actives(self) -> List[Session]:
-        return [s for s in self.sessions if s.session_active]
+    def liste_sessions_actives(self) -> Tuple[Session, ...]:
+        return self.sessions.actives()
 
-    def ecouter_demandes_session(self):
-        """Écoute les demandes de session sur la socket P2P."""
+    def boucle_reception(self, sock: Optional[socket.socket] = None):
+        """
+        Unique lecteur de la socket P2P (ou de la socket d'une voie) : traite
+        le handshake et aiguille chaque datagramme vers la session de son expéditeur.
+        """
+        sock = sock if sock is not None else self.sock_p2p
         while not self._stop_mon:
             try:
-                data, (ip_src, port_src) = self.sock_p2p.recvfrom(64)
-            except Exception:
+                data, adresse = sock.recvfrom(SOCKET_RECV_BUFFER)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stop_mon:
+                    break
                 time.sleep(0.05)
                 continue
-
-            if not data or data != SESSION_REQUEST:
+            if not data:
                 continue
-
-            # Répondre par SESSION_ACK
+            # Le fil sert toutes les sessions : une erreur ne perd que ce datagramme
             try:
-                self.sock_p2p.sendto(SESSION_ACK, (ip_src, port_src))
-            except:
-                continue
+                self._traiter_datagramme(sock, adresse, data)
+            except Exception:
+                self.erreurs_reception += 1
+                journal.exception("Datagramme de %s:%s ignoré", *adresse[:2])
+
+    def _traiter_datagramme(self, sock: socket.socket, adresse: Tuple[str, int], data: bytes):
+        if data.startswith(SESSION_REQUEST):
+            self.ecouter_demandes_session(adresse, data)
+            return
+        if data.startswith(SESSION_ACK):
+            self._recevoir_ack(adresse, data)
+            return
+        if data.startswith(SESSION_RETRY):
+            self._recevoir_retry(adresse, data)
+            return
+        if data.startswith(CLE_DEMANDE):
+            self._fournir_cle(sock, adresse, data)
+            return
+        if data.startswith(CLE_REPONSE):
+            self._ranger_cle(data[len(CLE_REPONSE):])
+            return
+
+        try:
+            sid, reste = paquets.separer_sid(data)
+        except ValueError:
+            return
+        session = self.sessions.par_id(sid)
+        if session is None or session.destinataire.ip != adresse[0]:
+            return
+        if self._demi_ouvertes:
+            self._demi_ouvertes.pop(session, None)  # le pair a prouvé qu'il est joignable
+        try:
+            session.livrer(reste)
+        except (paquets.CRCError, ValueError, IndexError):
+            pass  # datagramme corrompu ou hors message
 
-            # Vérifier si session existe déjà
-            for s in self.sessions:
-                if s.destinataire.ip == ip_src and s.destinataire.port == port_src:
+    def cle_publique_pair(self, adresse: Tuple[str, int], empreinte: bytes,
+                          timeout: Optional[float] = None, retry: int = 3) -> Optional[bytes]:
+        """
+        Clé publique d'empreinte `empreinte`, depuis le cache, sinon demandée
+        au pair à `adresse` (port P2P). Sans timeout, chaque essai attend le
+        RTO estimé pour ce pair. None si le pair ne l'a pas fournie.
+        """
+        cle = self.cles_publiques.get(empreinte) or self.cles_annoncees.get(empreinte)
+        if cle is not None:
+            return cle
+        attente = self._cles_attendues.setdefault(empreinte, threading.Event())
+        estimateur = self._estimateur_rtt(adresse)
+        demande = (CLE_DEMANDE + empreinte).ljust(TAILLE_DEMANDE_CLE, b'\x00')
+        try:
+            for _ in range(retry):
+                try:
+                    self.sock_p2p.sendto(demande, adresse)
+                except OSError:
                     continue
+                if attente.wait(timeout if timeout is not None else estimateur.rto):
+                    break
+                estimateur.reculer()
+        finally:
+            self._cles_attendues.pop(empreinte, None)
+        return self.cles_publiques.get(empreinte) or self.cles_annoncees.get(empreinte)
+
+    def _fournir_cle(self, sock: socket.socket, adresse: Tuple[str, int], data: bytes):
+        """CLE_DEMANDE : notre clé, si c'est bien elle qui est demandée et si la demande est assez longue."""
+        empreinte = data[len(CLE_DEMANDE):len(CLE_DEMANDE) + TAILLE_EMPREINTE]
+        cle = self.cle_publique
+        if not cle or empreinte != empreinte_cle(cle) or len(data) < len(CLE_REPONSE) + len(cle):
+            return
+        try:
+            sock.sendto(CLE_REPONSE + cle, adresse)
+        except OSError:
+            pass
 
-            # Créer une nouvelle session passive
+    def _ranger_cle(self, cle: bytes, annoncee: bool = False):
+        """
+        Clé publique reçue : rangée sous son empreinte (calculée, donc vérifiée).
+        Une CLE_REPONSE n'est gardée que si nous attendons cette empreinte
+        (voir cle_publique_pair) : un pair ne peut pas vider le cache en
+        envoyant des clés que personne n'a demandées. Une clé annoncée non
+        demandée va dans cles_annoncees, borné à part.
+        """
+        empreinte = empreinte_cle(cle)
+        if empreinte is None:
+            return
+        attente = self._cles_attendues.get(empreinte)
+        if attente is not None:
+            cache, maximum = self.cles_publiques, CLES_MAX
+        elif annoncee and empreinte not in self.cles_publiques:
+            cache, maximum = self.cles_annoncees, CLES_ANNONCEES_MAX
+        else:
+            return
+        if empreinte not in cache and len(cache) >= maximum:
+            del cache[next(iter(cache))]  # la plus ancienne
+        cache[empreinte] = cle
+        if attente is not None:
+            attente.set()
+
+    def _demande_session(self, sid: int, extensions: list, adresse: Tuple[str, int]) -> bytes:
+        """SESSION_REQUEST : extensions, cookie de ce répondeur s'il en a donné un, puis preuve."""
+        extensions = list(extensions)
+        if self.cle_publique:
+            extensions.append((poignee.EXT_IDENTITE, empreinte_cle(self.cle_publique)))
+        if self.retransmetteur is not None:
+            extensions.append((poignee.EXT_RETRANSMISSION, b""))
+        cookie = self._cookies_recus.get(adresse)
+        if cookie is not None:
+            extensions.append((poignee.EXT_COOKIE, cookie))
+        demande = SESSION_REQUEST + sid.to_bytes(paquets.TAILLE_SID, 'big') + poignee.encoder_extensions(extensions)
+        if self.signer_preuve is not None:
+            preuve = self.signer_preuve(hashlib.sha256(demande).digest())
+            demande += poignee.encoder_extensions([(poignee.EXT_PREUVE, preuve)])
+        return demande
+
+    def _terminer_poignee(self, session: Session, demande: bytes, reponse: bytes,
+                          billet: Optional[Tuple[bytes, bytes]], nonce: Optional[bytes],
+                          initiateur_kex: Optional[echange_cles.Initiateur],
+                          adresse: Optional[Tuple[str, int]] = None):
+        """
+        Côté initiateur : clé, ticket et preuve portés par le SESSION_ACK ; le
+        cookie remis est gardé pour la prochaine demande à `adresse`.
+        """
+        try:
+            extensions = poignee.decoder_extensions(reponse[len(SESSION_ACK) + 2 * paquets.TAILLE_SID:])
+        except poignee.ErreurPoignee:
+            return
+        cookie = extensions.get(poignee.EXT_COOKIE)
+        if adresse is not None and cookie is not None and len(cookie) == poignee.TAILLE_COOKIE:
+            self._cookies_recus[adresse] = cookie
+        nonce_repondeur = extensions.get(poignee.EXT_REPRISE)
+        if billet is not None and nonce_repondeur is not None and len(nonce_repondeur) == reprise.TAILLE_NONCE:
+            session.cle = reprise.cle_de_reprise(billet[1], nonce, nonce_repondeur)
+            session.reprise = True
+            session.cle_etablie = True
+        elif initiateur_kex is not None and poignee.EXT_KEX in extensions:
+            try:
+                session.cle = initiateur_kex.terminer(extensions[poignee.EXT_KEX])
+                session.cle_etablie = True
+            except echange_cles.ErreurEchange:
+                pass
+        elif initiateur_kex is not None:
+            # Répondeur sans fonction de chiffrement : il n'a pas de clé, nous non plus
+            session.cle = None
+            session.kex_refuse = True
+        if session.cle_etablie and poignee.EXT_TICKET in extensions:
+            session._recevoir_ticket(extensions[poignee.EXT_TICKET])
+        self._noter_identite(session, extensions.get(poignee.EXT_IDENTITE))
+        session.accuser = poignee.EXT_RETRANSMISSION in extensions
+        if poignee.EXT_PREUVE in extensions and self.verifier_preuve is not None:
+            empreinte = poignee.contexte_preuve(reponse, extensions, demande)
             try:
+                session.authentique = bool(self.verifier_preuve(session, empreinte, extensions[poignee.EXT_PREUVE]))
+            except Exception:
+                session.authentique = False
+        if session.authentique:
+            self.sessions.indexer_empreinte(session)
+
+    def _recevoir_ack(self, adresse: Tuple[str, int], data: bytes):
+        """SESSION_ACK : note l'identifiant choisi par le pair et réveille l'initiateur."""
+        debut = len(SESSION_ACK)
+        fin_ids = debut + 2 * paquets.TAILLE_SID
+        if len(data) < fin_ids:
+            return
+        sid_local = int.from_bytes(data[debut:debut + paquets.TAILLE_SID], 'big')
+        sid_distant = int.from_bytes(data[debut + paquets.TAILLE_SID:fin_ids], 'big')
+        ack = self._attentes_ack.get(sid_local)
+        session = self.sessions.par_id(sid_local)
+        if ack is None or session is None:
+            return
+        if (session.destinataire.ip, session.destinataire.port) != adresse:
+            # Flux parallèle : le pair répond depuis la socket d'une de ses voies
+            principale = self._flux_attendus.get(sid_local)
+            if principale is None or principale[0] != adresse[0]:
+                return
+            self.sessions.readresser(session, adresse)
+        self.sessions.definir_distant(session, sid_distant)
+        self._acks_recus[sid_local] = data
+        ack.set()
+
+    def _recevoir_retry(self, adresse: Tuple[str, int], data: bytes):
+        """SESSION_RETRY : garde le cookie du répondeur et réveille l'initiateur pour qu'il redemande."""
+        fin_id = len(SESSION_RETRY) + paquets.TAILLE_SID
+        if len(data) != fin_id + poignee.TAILLE_COOKIE:
+            return
+        ack = self._attentes_ack.get(int.from_bytes(data[len(SESSION_RETRY):fin_id], 'big'))
+        if ack is None:
+            return
+        self._cookies_recus[adresse] = data[fin_id:]
+        ack.set()
+
+    def _estimateur_rtt(self, adresse: Tuple[str, int]) -> rtt.EstimateurRTT:
+        estimateur = self._estimateurs_rtt.get(adresse)
+        if estimateur is None:
+            estimateur = self._estimateurs_rtt.setdefault(adresse, rtt.EstimateurRTT())
+        return estimateur
+
+    def _regulateur(self, adresse: Tuple[str, int]) -> congestion.Regulateur:
+        regulateur = self._regulateurs.get(adresse)
+        if regulateur is None:
+            regulateur = self._regulateurs.setdefault(adresse, congestion.Regulateur())
+        return regulateur
+
+    def _ranger_ticket(self, adresse: Tuple[str, int], session: Session, ticket: bytes, expiration: float):
+        """Garde le ticket remis par le pair pour la prochaine connexion."""
+        self.cache_tickets.ranger(adresse, ticket, reprise.secret_de_reprise(session.cle), expiration)
+
+    def _admettre(self, adresse: Tuple[str, int], extensions: dict) -> bool:
+        """Vrai si la demande peut créer une session sans preuve d'accessibilité supplémentaire."""
+        maintenant = time.monotonic()
+        for session, creation in list(self._demi_ouvertes.items()):
+            if maintenant - creation > DELAI_DEMI_OUVERTE:
+                del self._demi_ouvertes[session]
+        if len(self._demi_ouvertes) < self.seuil_cookie:
+            return True
+        cookie = extensions.get(poignee.EXT_COOKIE)
+        return cookie is not None and self.cookies.verifier(adresse, cookie)
+
+    def ecouter_demandes_session(self, adresse: Tuple[str, int], data: bytes):
+        """Répond à une demande de session reçue par la boucle de réception."""
+        ip_src, port_src = adresse
+        fin_id = len(SESSION_REQUEST) + paquets.TAILLE_SID
+        if len(data) < fin_id:
+            return
+        sid_distant = int.from_bytes(data[len(SESSION_REQUEST):fin_id], 'big')
+        try:
+            extensions = poignee.decoder_extensions(data[fin_id:])
+        except poignee.ErreurPoignee:
+            return
+
+        # Une demande répétée retrouve sa session ; sinon, rien n'est créé avant le cookie s'il est exigé
+        session = self.sessions.par_distant(adresse, sid_distant)
+        if session is None:
+            if not self._admettre(adresse, extensions):
+                try:
+                    self.sock_p2p.sendto(SESSION_RETRY + data[len(SESSION_REQUEST):fin_id]
+                                         + self.cookies.emettre(adresse), adresse)
+                except OSError:
+                    pass
+                return
+
+            # Flux parallèle : la session vit sur une voie (socket, fils de réception et d'envoi à elle)
+            voie = self._voie() if poignee.EXT_FLUX in extensions else None
+
+            def fabrique(sid):
                 ut = Utilisateur(["Inconnu"], ["Inconnu"], cle_publique=None, cle_privee=None)
-                appareil = Appareil(ip_src, port_src, ut)
-                session = Session(self.sock_p2p, appareil, None, None)
+                if voie is not None:
+                    return Session(voie.sock, Appareil(ip_src, port_src, ut), self.fdc, None, self.fdd,
+                                   magasin=self.magasin, ordonnanceur_envoi=voie.ordonnanceur, id_session=sid,
+                                   estimateur_rtt=self._estimateur_rtt(adresse), retransmetteur=self.retransmetteur,
+                                   regulateur=congestion.Regulateur(), receptions=self.receptions_fichiers)
+                return Session(self.sock_p2p, Appareil(ip_src, port_src, ut), self.fdc, None, self.fdd,
+                               magasin=self.magasin, ordonnanceur_envoi=self.ordonnanceur, id_session=sid,
+                               estimateur_rtt=self._estimateur_rtt(adresse), retransmetteur=self.retransmetteur,
+                               regulateur=self._regulateur(adresse), receptions=self.receptions_fichiers)
+
+            try:
+                session, creee = self.sessions.inserer_ou_obtenir(adresse, fabrique, sid_distant)
+            except ConnectionError:
+                return  # table pleine : pas de réponse
+            if creee:
+                try:
+                    session._ack_envoye = self._accepter(session, data, extensions)
+                except Exception:
+                    self.sessions.retirer(session)  # pas de session sans SESSION_ACK
+                    session.close()
+                    raise
+                self._demi_ouvertes[session] = time.monotonic()
                 session.session_active = True
-                self.sessions.append(session)
+
+        # Répondre par SESSION_ACK (le même si la demande est répétée), depuis la socket de la session
+        if session._ack_envoye is None:
+            return  # session d'une autre demande, pas encore acceptée
+        try:
+            session.cet_appareil.sendto(session._ack_envoye, adresse)
+        except OSError:
+            return
+
+    def _accepter(self, session: Session, demande: bytes, extensions: dict) -> bytes:
+        """
+        Côté répondeur : fixe la clé (ticket ou part d'échange de clés),
+        vérifie la preuve de l'initiateur et construit le SESSION_ACK.
+        """
+        reponse = []
+        if session.cet_appareil is not self.sock_p2p:
+            reponse.append((poignee.EXT_FLUX, b""))
+        self._noter_identite(session, extensions.get(poignee.EXT_IDENTITE))
+        if self.cle_publique:
+            reponse.append((poignee.EXT_IDENTITE, empreinte_cle(self.cle_publique)))
+        session.accuser = poignee.EXT_RETRANSMISSION in extensions
+        if self.retransmetteur is not None:
+            reponse.append((poignee.EXT_RETRANSMISSION, b""))
+        # Cookie pour la prochaine demande de ce pair, qui sera acceptée sans SESSION_RETRY
+        reponse.append((poignee.EXT_COOKIE, self.cookies.emettre((session.destinataire.ip, session.destinataire.port))))
+        if self.fdc is not None:
+            session.emetteur_tickets = self.tickets
+            if poignee.EXT_REPRISE in extensions:
+                nonce = self._reprendre(session, extensions[poignee.EXT_REPRISE])
+                if nonce is not None:
+                    reponse.append((poignee.EXT_REPRISE, nonce))
+            if not session.cle_etablie and poignee.EXT_KEX in extensions:
+                try:
+                    reponse_kex, session.cle = echange_cles.repondre(extensions[poignee.EXT_KEX])
+                    session.cle_etablie = True
+                    reponse.append((poignee.EXT_KEX, reponse_kex))
+                except echange_cles.ErreurEchange:
+                    pass
+            if session.cle_etablie:
+                ticket, expiration = self.tickets.emettre(reprise.secret_de_reprise(session.cle))
+                reponse.append((poignee.EXT_TICKET, reprise.encoder_ticket(ticket, expiration)))
+
+        if poignee.EXT_PREUVE in extensions and self.verifier_preuve is not None:
+            try:
+                session.authentique = bool(self.verifier_preuve(
+                    session, poignee.contexte_preuve(demande, extensions), extensions[poignee.EXT_PREUVE]))
             except Exception:
-                continue
+                session.authentique = False
+        if session.authentique:
+            self.sessions.indexer_empreinte(session)
+
+        ack = (SESSION_ACK + demande[len(SESSION_REQUEST):len(SESSION_REQUEST) + paquets.TAILLE_SID]
+               + session.id_session.to_bytes(paquets.TAILLE_SID, 'big') + poignee.encoder_extensions(reponse))
+        if self.signer_preuve is not None:
+            preuve = self.signer_preuve(hashlib.sha256(demande + ack).digest())
+            ack += poignee.encoder_extensions([(poignee.EXT_PREUVE, preuve)])
+        return ack
+
+    def _noter_identite(self, session: Session, empreinte: Optional[bytes]):
+        """
+        EXT_IDENTITE : empreinte de la clé du pair, contre laquelle sa preuve
+        est vérifiée. Une fois prouvée, elle identifie la conversation des deux
+        côtés, quelle que soit la façon dont la session a été ouverte (voir
+        Session.conversation). Ignorée si la clé du pair est déjà connue.
+        """
+        if (empreinte is None or len(empreinte) != TAILLE_EMPREINTE
+                or session.destinataire.ut.cle_publique is not None):
+            return
+        session.empreinte_pair = empreinte
+
+    def _reprendre(self, session: Session, demande_reprise: bytes) -> Optional[bytes]:
+        """
+        Ouvre le ticket présenté et fixe la clé de la session reprise.
+        Retourne le nonce du répondeur, None si le ticket est refusé
+        (la clé vient alors de l'échange de clés).
+        """
+        if len(demande_reprise) != reprise.TAILLE_NONCE + reprise.TAILLE_TICKET:
+            return None
+        try:
+            secret = self.tickets.ouvrir(demande_reprise[reprise.TAILLE_NONCE:])
+        except reprise.ErreurTicket:
+            return None
+        nonce = secrets.token_bytes(reprise.TAILLE_NONCE)
+        session.cle = reprise.cle_de_reprise(secret, demande_reprise[:reprise.TAILLE_NONCE], nonce)
+        session.reprise = True
+        session.cle_etablie = True
+        return nonce
+
+    def _voie(self) -> "Voie":
+        """Voie pour un nouveau flux : une nouvelle tant qu'il y en a moins de voies_max, sinon à tour de rôle."""
+        with self._verrou_voies:
+            if len(self.voies) < self.voies_max:
+                self.voies.append(Voie(self))
+                return self.voies[-1]
+            voie = self.voies[self._prochaine_voie % len(self.voies)]
+            self._prochaine_voie += 1
+            return voie
+
+    def ouvrir_flux(self, session: Session, n: int = 1, timeout: Optional[float] = None) -> List[Session]:
+        """
+        Ouvre `n` flux parallèles vers le pair de `session` pour les gros
+        envois (voir Session.envoyer_fichier). Chaque flux est une session
+        complète (clé, preuve) portée par une voie de chaque côté : sa
+        propre socket, son fil de réception et son fil d'envoi.
+        Retourne les flux ouverts (moins de `n` si le pair ne répond pas).
+        """
+        adresse = (session.destinataire.ip, session.destinataire.port)
+        ouverts = []
+        for _ in range(n):
+            try:
+                flux = self._ouvrir_session(adresse, session.destinataire.ut, session.fdc, session.fdd, None,
+                                            timeout, 3, voie=self._voie())
+            except ConnectionError:
+                break
+            session.flux.append(flux)
+            ouverts.append(flux)
+        return ouverts
 
     def close_all(self):
         self._stop_mon = True
+        self.chaine_multicast = None  # arrête la diffusion des annonces
+        if self.balayage is not None:
+            self.balayage.arreter()
+        self.ordonnanceur.arreter()
+        for voie in self.voies:
+            voie.fermer()
+        self.retransmetteur.arreter()
         try:
             self.sock_de_recherche.close()
         except Exception:
@@ -0,0 +1,143 @@
+# reprise.py
+"""
+Tickets de reprise de session.
+
+Après un échange de clés, le répondeur remet à l'initiateur un ticket :
+le secret de reprise et sa date d'expiration, scellés avec une clé que
+seul le répondeur connaît. Les deux côtés dérivent ce secret de la clé
+de session. À la reconnexion, l'initiateur présente le ticket dans son
+SESSION_REQUEST avec un nonce ; le répondeur ouvre le ticket et les deux
+côtés dérivent la nouvelle clé des deux nonces, sans cryptographie
+asymétrique et en un seul aller-retour.
+
+Structure d'un ticket :
+    [Nonce: 16 octets] [Chiffré: secret de reprise (32 octets) + expiration (8 octets)] [MAC: 16 octets]
+"""
+
+import hashlib
+import hmac
+import secrets
+import struct
+import threading
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+from echange_cles import hkdf, TAILLE_CLE_SESSION
+
+TICKET_MAGIC = b"PORTS_TICKET"
+TICKET_DUREE = 6 * 3600  # s
+
+TAILLE_NONCE = 16
+TAILLE_MAC = 16
+TAILLE_SECRET = 32
+_EXPIRATION = struct.Struct(">d")
+TAILLE_TICKET = TAILLE_NONCE + TAILLE_SECRET + _EXPIRATION.size + TAILLE_MAC
+
+
+class ErreurTicket(Exception):
+    """Ticket illisible, expiré ou déjà utilisé"""
+    pass
+
+
+def secret_de_reprise(cle_session: bytes) -> bytes:
+    """Secret de reprise dérivé de la clé de session (calculé des deux côtés)."""
+    return hkdf(cle_session, b"", b"lan-chat reprise", TAILLE_SECRET)
+
+
+def cle_de_reprise(secret: bytes, nonce_initiateur: bytes, nonce_repondeur: bytes) -> bytes:
+    """Clé de la session reprise."""
+    return hkdf(secret, nonce_initiateur + nonce_repondeur, b"lan-chat cle de reprise", TAILLE_CLE_SESSION)
+
+
+def _flux(cle: bytes, nonce: bytes, longueur: int) -> bytes:
+    sortie = b""
+    compteur = 0
+    while len(sortie) < longueur:
+        sortie += hmac.new(cle, nonce + compteur.to_bytes(4, 'big'), hashlib.sha256).digest()
+        compteur += 1
+    return sortie[:longueur]
+
+
+class EmetteurTickets:
+    """
+    Côté répondeur : scelle et ouvre les tickets. Un ticket n'est accepté
+    qu'une fois ; les tickets déjà utilisés sont retenus jusqu'à leur expiration.
+    """
+
+    def __init__(self, duree_vie: float = TICKET_DUREE):
+        self.duree_vie = duree_vie
+        cle = secrets.token_bytes(32)
+        self._cle_chiffrement = hkdf(cle, b"", b"lan-chat ticket chiffrement")
+        self._cle_mac = hkdf(cle, b"", b"lan-chat ticket mac")
+        self._utilises: Dict[bytes, float] = {}
+        self._verrou = threading.Lock()
+
+    def emettre(self, secret: bytes) -> Tuple[bytes, float]:
+        """Retourne (ticket, expiration)."""
+        expiration = time.time() + self.duree_vie
+        nonce = secrets.token_bytes(TAILLE_NONCE)
+        clair = secret + _EXPIRATION.pack(expiration)
+        chiffre = bytes(a ^ b for a, b in zip(clair, _flux(self._cle_chiffrement, nonce, len(clair))))
+        mac = hmac.new(self._cle_mac, nonce + chiffre, hashlib.sha256).digest()[:TAILLE_MAC]
+        return nonce + chiffre + mac, expiration
+
+    def ouvrir(self, ticket: bytes) -> bytes:
+        """Retourne le secret de reprise du ticket."""
+        if len(ticket) != TAILLE_TICKET:
+            raise ErreurTicket("Taille de ticket invalide")
+        nonce = ticket[:TAILLE_NONCE]
+        chiffre = ticket[TAILLE_NONCE:-TAILLE_MAC]
+        mac = hmac.new(self._cle_mac, nonce + chiffre, hashlib.sha256).digest()[:TAILLE_MAC]
+        if not hmac.compare_digest(mac, ticket[-TAILLE_MAC:]):
+            raise ErreurTicket("Ticket non reconnu")
+        clair = bytes(a ^ b for a, b in zip(chiffre, _flux(self._cle_chiffrement, nonce, len(chiffre))))
+        secret = clair[:TAILLE_SECRET]
+        expiration, = _EXPIRATION.unpack(clair[TAILLE_SECRET:])
+        maintenant = time.time()
+        if expiration < maintenant:
+            raise ErreurTicket("Ticket expiré")
+        with self._verrou:
+            for nonce_utilise in [n for n, e in self._utilises.items() if e < maintenant]:
+                del self._utilises[nonce_utilise]
+            if nonce in self._utilises:
+                raise ErreurTicket("Ticket déjà utilisé")
+            self._utilises[nonce] = expiration
+        return secret
+
+
+class CacheTickets:
+    """Côté initiateur : un ticket à usage unique par pair."""
+
+    def __init__(self):
+        self._tickets: Dict[Hashable, Tuple[bytes, bytes, float]] = {}
+        self._verrou = threading.Lock()
+
+    def ranger(self, pair: Hashable, ticket: bytes, secret: bytes, expiration: float):
+        with self._verrou:
+            self._tickets[pair] = (ticket, secret, expiration)
+
+    def prendre(self, pair: Hashable) -> Optional[Tuple[bytes, bytes]]:
+        """Retire et retourne (ticket, secret) s'il est encore valide."""
+        with self._verrou:
+            entree = self._tickets.pop(pair, None)
+        if entree is None or entree[2] < time.time():
+            return None
+        return entree[0], entree[1]
+
+    def __len__(self) -> int:
+        return len(self._tickets)
+
+
+def encoder_ticket(ticket: bytes, expiration: float) -> bytes:
+    """Ticket tel qu'il voyage : [Ticket] [Expiration: 8 octets]."""
+    return ticket + _EXPIRATION.pack(expiration)
+
+
+def decoder_ticket(octets: bytes) -> Tuple[bytes, float]:
+    if len(octets) != TAILLE_TICKET + _EXPIRATION.size:
+        raise ErreurTicket("Taille de ticket invalide")
+    expiration, = _EXPIRATION.unpack(octets[TAILLE_TICKET:])
+    return octets[:TAILLE_TICKET], expiration
+
+
+TAILLE_TICKET_ENCODE = TAILLE_TICKET + _EXPIRATION.size
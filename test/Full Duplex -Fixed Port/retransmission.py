@@ -0,0 +1,172 @@
+# retransmission.py
+"""
+Retransmission des messages non acquittés.
+
+Le récepteur acquitte chaque message terminé par un datagramme court :
+    [ACCUSE_MAGIC: 9 octets] [Numéro du message: 4 octets]
+seulement si l'émetteur a annoncé qu'il retransmet (extension
+EXT_RETRANSMISSION de la poignée de main) : sinon l'accusé ne servirait à
+rien et doublerait le nombre de datagrammes.
+
+Côté émetteur, un seul fil par Chats garde un tas d'échéances. L'échéance
+d'un message est armée quand son dernier paquet est parti (pas quand il est
+mis en file, pour ne pas compter l'attente dans l'ordonnanceur) et vaut
+le RTO de la session (voir rtt). À l'expiration, le message est renvoyé en
+entier et le RTO double ; un accusé sur un message renvoyé ne donne pas
+de mesure (règle de Karn).
+
+Accusés et expirations sont aussi transmis au régulateur de la session
+(voir congestion), s'il y en a un.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+ACCUSE_MAGIC = b"PORTS_ACQ"
+ESSAIS_MAX = 8  # renvois avant d'abandonner un message
+
+
+def encoder_accuse(numero: int) -> bytes:
+    return ACCUSE_MAGIC + numero.to_bytes(4, 'big')
+
+
+def decoder_accuse(datagramme: bytes) -> Optional[int]:
+    if len(datagramme) != len(ACCUSE_MAGIC) + 4:
+        return None
+    return int.from_bytes(datagramme[len(ACCUSE_MAGIC):], 'big')
+
+
+class _Suivi:
+    __slots__ = ("renvoyer", "taille", "fin", "essais", "envoi")
+
+    def __init__(self, renvoyer: Callable, taille: int, fin: Optional[Callable]):
+        self.renvoyer = renvoyer
+        self.taille = taille
+        self.fin = fin
+        self.essais = 0
+        self.envoi: Optional[float] = None
+
+
+class Retransmetteur:
+    """
+    Args:
+        essais_max: nombre de renvois avant d'abandonner un message
+            (l'erreur est alors placée dans session.derniere_erreur)
+    """
+
+    def __init__(self, essais_max: int = ESSAIS_MAX):
+        self.essais_max = essais_max
+        self._condition = threading.Condition()
+        self._suivis: Dict[Tuple[object, int], _Suivi] = {}
+        self._echeances: List[tuple] = []
+        self._compteur = itertools.count()
+        self._arret = False
+        self._fil = threading.Thread(target=self._boucle, daemon=True)
+        self._fil.start()
+
+    def suivre(self, session, numero: int, renvoyer: Callable, taille: int = 0,
+               fin: Optional[Callable] = None):
+        """
+        Commence le suivi d'un message de `taille` octets (à appeler avant sa
+        mise en file). `fin(True)` est appelé à l'accusé, `fin(False)` à l'abandon.
+        """
+        with self._condition:
+            self._suivis[(session, numero)] = _Suivi(renvoyer, taille, fin)
+
+    def armer(self, session, numero: int):
+        """Le dernier paquet du message vient de partir : arme son échéance."""
+        with self._condition:
+            suivi = self._suivis.get((session, numero))
+            if suivi is None:
+                return  # déjà acquitté
+            suivi.envoi = time.monotonic()
+            rto = session.rtt.rto
+            heapq.heappush(self._echeances, (suivi.envoi + rto, next(self._compteur),
+                                             session, numero, suivi.essais, rto))
+            self._condition.notify()
+
+    def acquitter(self, session, numero: int):
+        """Accusé reçu : fin du suivi, et mesure du RTT si le message n'a pas été renvoyé."""
+        with self._condition:
+            suivi = self._suivis.pop((session, numero), None)
+        if suivi is None:
+            return
+        if suivi.fin is not None:
+            suivi.fin(True)
+        if suivi.envoi is None:
+            return
+        mesure = time.monotonic() - suivi.envoi if suivi.essais == 0 else None
+        if mesure is not None:
+            session.rtt.mesurer(mesure)
+        regulateur = getattr(session, 'regulateur', None)
+        if regulateur is not None:
+            regulateur.accuse(suivi.taille, mesure)
+
+    def retirer(self, session):
+        """Abandonne le suivi des messages de la session."""
+        with self._condition:
+            abandonnes = [self._suivis.pop(c) for c in [c for c in self._suivis if c[0] is session]]
+        for suivi in abandonnes:
+            if suivi.fin is not None:
+                suivi.fin(False)
+
+    def en_vol(self, session) -> int:
+        """Nombre de messages de la session pas encore acquittés."""
+        with self._condition:
+            return sum(1 for c in self._suivis if c[0] is session)
+
+    def arreter(self):
+        with self._condition:
+            self._arret = True
+            self._condition.notify()
+        if threading.current_thread() is not self._fil:
+            self._fil.join()
+
+    # ------------------------------------------------------------------
+
+    def _expire(self):
+        """
+        Retire du tas la prochaine échéance dépassée (verrou tenu).
+        Retourne (session, suivi, rto, abandon) ou None.
+        """
+        maintenant = time.monotonic()
+        while self._echeances and self._echeances[0][0] <= maintenant:
+            _, _, session, numero, essai, rto = heapq.heappop(self._echeances)
+            suivi = self._suivis.get((session, numero))
+            if suivi is None or suivi.essais != essai or suivi.envoi is None:
+                continue  # acquitté ou déjà renvoyé
+            suivi.essais += 1
+            suivi.envoi = None
+            if suivi.essais > self.essais_max:
+                del self._suivis[(session, numero)]
+                session.derniere_erreur = TimeoutError(f"Message {numero} non acquitté")
+                return session, suivi, rto, True
+            return session, suivi, rto, False
+        return None
+
+    def _boucle(self):
+        while True:
+            with self._condition:
+                expire = self._expire()
+                while expire is None and not self._arret:
+                    delai = self._echeances[0][0] - time.monotonic() if self._echeances else None
+                    self._condition.wait(delai)
+                    expire = self._expire()
+                if self._arret:
+                    return
+            session, suivi, rto, abandon = expire
+            if abandon:
+                if suivi.fin is not None:
+                    suivi.fin(False)
+                continue
+            session.rtt.reculer(rto)
+            regulateur = getattr(session, 'regulateur', None)
+            if regulateur is not None:
+                regulateur.perte()
+            try:
+                suivi.renvoyer()
+            except Exception as e:
+                session.derniere_erreur = e
@@ -0,0 +1,69 @@
+# rtt.py
+"""
+Estimation du temps d'aller-retour et du délai de retransmission (RFC 6298).
+
+SRTT et RTTVAR sont lissés à chaque mesure ; le délai de retransmission
+(RTO) vaut SRTT + max(G, 4 * RTTVAR). Les mesures ne portent que sur des
+envois non retransmis (règle de Karn) et chaque expiration double le
+RTO jusqu'à la prochaine mesure.
+
+Les bornes sont celles d'un réseau local : le RTO minimal est de quelques
+millisecondes au lieu de la seconde du RFC, pensée pour Internet.
+"""
+
+import threading
+from typing import Optional
+
+ALPHA = 1 / 8
+BETA = 1 / 4
+K = 4
+GRANULARITE = 0.001  # s
+
+RTO_INITIAL = 0.5  # s, avant toute mesure
+RTO_MIN = 0.005
+RTO_MAX = 8.0
+
+
+class EstimateurRTT:
+    """
+    Args:
+        rto_initial: délai utilisé tant qu'aucune mesure n'est faite
+        rto_min, rto_max: bornes du délai de retransmission
+    """
+
+    def __init__(self, rto_initial: float = RTO_INITIAL, rto_min: float = RTO_MIN, rto_max: float = RTO_MAX):
+        self.rto_min = rto_min
+        self.rto_max = rto_max
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self._rto = rto_initial
+        self._recul = 1
+        self._verrou = threading.Lock()
+
+    def mesurer(self, rtt: float):
+        """Ajoute une mesure (envoi non retransmis uniquement) et annule le recul."""
+        with self._verrou:
+            if self.srtt is None:
+                self.srtt = rtt
+                self.rttvar = rtt / 2
+            else:
+                self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+                self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+            self._rto = min(max(self.srtt + max(GRANULARITE, K * self.rttvar), self.rto_min), self.rto_max)
+            self._recul = 1
+
+    def reculer(self, rto_expire: Optional[float] = None):
+        """
+        Expiration : double le délai (recul exponentiel). Avec `rto_expire`
+        (le délai qui vient d'expirer), plusieurs expirations d'un même
+        délai ne doublent qu'une fois.
+        """
+        with self._verrou:
+            if rto_expire is not None and self._rto * self._recul > rto_expire:
+                return
+            if self._rto * self._recul < self.rto_max:
+                self._recul *= 2
+
+    @property
+    def rto(self) -> float:
+        return min(self._rto * self._recul, self.rto_max)
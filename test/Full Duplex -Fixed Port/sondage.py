@@ -0,0 +1,158 @@
+# sondage.py
+"""
+Écoute simultanée de plusieurs chaînes multicast.
+
+Au lieu d'écouter les adresses une à une (une socket et un délai
+d'écoute par adresse), toutes les adresses sont écoutées pendant la même
+fenêtre, sous un seul sélecteur.
+
+Sous Linux, une seule socket liée au port des annonces lit tout : le
+groupe de destination de chaque datagramme est donné par IP_PKTINFO.
+Les abonnements sont répartis sur des sockets annexes, qui ne sont
+jamais lues, par paquets de GROUPES_PAR_SOCKET (limite IP_MAX_MEMBERSHIPS
+par défaut du noyau). Ailleurs, chaque groupe a sa socket, liée au groupe
+quand le système le permet.
+
+Le lecteur unique partage le port des annonces avec les autres sockets
+d'écoute (SO_REUSEADDR) : un datagramme unicast vers ce port n'est remis
+qu'à l'une d'elles, souvent la dernière liée, donc lui. Ces datagrammes
+sont passés à `hors_groupe` au lieu d'être perdus.
+"""
+
+import selectors
+import socket
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+GROUPES_PAR_SOCKET = 20
+TAILLE_MAX = 4096
+
+# Absent du module socket avant Python 3.12 ; valeur Linux
+IP_PKTINFO = getattr(socket, "IP_PKTINFO", 8 if sys.platform.startswith("linux") else None)
+
+
+def _abonner(sock: socket.socket, adresse: str, ip_locale: str):
+    mreq = socket.inet_aton(adresse) + socket.inet_aton(ip_locale)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+
+
+def _est_multicast(adresse: str) -> bool:
+    return 224 <= int(adresse.split('.', 1)[0]) <= 239
+
+
+def _destination(ancillaires) -> Optional[str]:
+    """Groupe de destination lu dans in_pktinfo (ifindex, spec_dst, addr)."""
+    for niveau, type_, donnees in ancillaires:
+        if niveau == socket.IPPROTO_IP and type_ == IP_PKTINFO and len(donnees) >= 12:
+            return socket.inet_ntoa(donnees[8:12])
+    return None
+
+
+class Sondeur:
+    """
+    Args:
+        ip_locale: interface sur laquelle s'abonner aux groupes
+        adresses: groupes à écouter
+        port: port des annonces
+        hors_groupe: appelé avec (données, source) pour les datagrammes
+            unicast reçus pendant l'écoute (lecteur unique seulement)
+    """
+
+    def __init__(self, ip_locale: str, adresses: Iterable[str], port: int,
+                 hors_groupe: Optional[Callable[[bytes, tuple], None]] = None):
+        self.adresses = list(adresses)
+        self.hors_groupe = hors_groupe
+        self._candidates = set(self.adresses)
+        self._selecteur = selectors.DefaultSelector()
+        self._sockets: List[socket.socket] = []
+        try:
+            if IP_PKTINFO is not None:
+                self._ouvrir_lecteur_unique(ip_locale, port)
+            else:
+                self._ouvrir_par_groupe(ip_locale, port)
+        except Exception:
+            self.fermer()
+            raise
+
+    def _socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sockets.append(sock)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setblocking(False)
+        return sock
+
+    def _ouvrir_lecteur_unique(self, ip_locale: str, port: int):
+        lecteur = self._socket()
+        lecteur.bind(('', port))
+        lecteur.setsockopt(socket.IPPROTO_IP, IP_PKTINFO, 1)
+        self._selecteur.register(lecteur, selectors.EVENT_READ, None)
+        porteur, abonnes = lecteur, 0
+        for adresse in self.adresses:
+            if abonnes == GROUPES_PAR_SOCKET:
+                porteur, abonnes = self._socket(), 0
+            try:
+                _abonner(porteur, adresse, ip_locale)
+            except OSError:
+                continue
+            abonnes += 1
+
+    def _ouvrir_par_groupe(self, ip_locale: str, port: int):
+        for adresse in self.adresses:
+            sock = self._socket()
+            try:
+                sock.bind((adresse, port))
+            except OSError:
+                sock.bind(('', port))  # Windows : pas de liaison à un groupe
+            try:
+                _abonner(sock, adresse, ip_locale)
+            except OSError:
+                continue
+            self._selecteur.register(sock, selectors.EVENT_READ, adresse)
+
+    def ecouter(self, duree: float, identifier: Optional[Callable[[bytes], object]] = None) -> Dict[str, Set]:
+        """
+        Écoute toutes les adresses pendant `duree` secondes. Retourne, pour
+        chaque adresse entendue, les émetteurs identifiés : `identifier(données)`
+        (None : datagramme ignoré, par exemple notre propre annonce), sinon
+        l'adresse source.
+        """
+        entendus: Dict[str, Set] = {}
+        fin = time.monotonic() + duree
+        while True:
+            reste = fin - time.monotonic()
+            if reste <= 0:
+                return entendus
+            for cle, _ in self._selecteur.select(reste):
+                sock = cle.fileobj
+                try:
+                    if cle.data is None:
+                        donnees, ancillaires, _, source = sock.recvmsg(TAILLE_MAX, socket.CMSG_SPACE(12))
+                        adresse = _destination(ancillaires)
+                    else:
+                        donnees, source = sock.recvfrom(TAILLE_MAX)
+                        adresse = cle.data
+                except OSError:
+                    continue
+                if adresse not in self._candidates:
+                    if self.hors_groupe is not None and adresse is not None and not _est_multicast(adresse):
+                        try:
+                            self.hors_groupe(donnees, source)
+                        except Exception:
+                            pass
+                    continue
+                emetteur = identifier(donnees) if identifier is not None else source
+                if emetteur is not None:
+                    entendus.setdefault(adresse, set()).add(emetteur)
+
+    def fermer(self):
+        try:
+            self._selecteur.close()
+        except Exception:
+            pass
+        for sock in self._sockets:
+            try:
+                sock.close()
+            except Exception:
+                pass
+        self._sockets = []
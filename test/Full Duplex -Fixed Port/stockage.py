@@ -0,0 +1,279 @@
+# stockage.py
+"""
+Stockage persistant des conversations (SQLite en mode WAL).
+
+Les écritures passent par un fil d'écriture unique qui regroupe les
+messages arrivés ensemble dans une seule transaction : une rafale de
+messages coûte un commit, pas un commit par message. Les lectures
+utilisent une connexion par fil et ne bloquent pas l'écriture (WAL).
+Une écriture qui échoue ne perd que ses messages : l'erreur est gardée
+dans derniere_erreur et vider() retourne False.
+
+Chaque message porte une empreinte de 32 bits (numéro, type, contenu) :
+la somme des empreintes et le nombre de messages d'une plage de numéros
+résument la plage pour la synchronisation entre pairs (voir synchro).
+"""
+
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from historique import ENVOYE, RECU
+
+TAILLE_LOT = 256
+DELAI_GROUPE = 0.005  # attente max pour grouper une rafale (s)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation TEXT NOT NULL,
+    pair TEXT NOT NULL,
+    id_message INTEGER NOT NULL,
+    sens INTEGER NOT NULL,
+    horodatage REAL NOT NULL,
+    tdc INTEGER NOT NULL,
+    contenu BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_conversation_horodatage ON messages(conversation, horodatage);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pair_message ON messages(pair, id_message, sens);
+"""
+
+# Ajoutés après coup : créés par _migrer sur les bases existantes
+_INDEX_EMPREINTES = ("CREATE INDEX IF NOT EXISTS idx_pair_sens_empreinte "
+                     "ON messages(pair, sens, id_message, empreinte)")
+
+_INSERTION = ("INSERT OR IGNORE INTO messages "
+              "(conversation, pair, id_message, sens, horodatage, tdc, contenu, empreinte) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+# (conversation, pair, id_message, sens, horodatage, tdc, contenu)
+Message = Tuple[str, str, int, int, float, int, bytes]
+
+
+def empreinte_message(id_message: int, tdc: int, contenu: Optional[bytes]) -> int:
+    """Empreinte de 32 bits d'un message, identique chez l'émetteur et le récepteur."""
+    hache = hashlib.sha256(id_message.to_bytes(4, 'big') + bytes([tdc]) + (contenu or b''))
+    return int.from_bytes(hache.digest()[:4], 'big')
+
+
+class MagasinMessages:
+    """
+    Magasin de messages.
+
+    Args:
+        chemin: fichier de la base SQLite
+        taille_lot: nombre max de messages par transaction
+        delai_groupe: temps d'attente pour compléter un lot après le premier message
+    """
+
+    def __init__(self, chemin: str, taille_lot: int = TAILLE_LOT, delai_groupe: float = DELAI_GROUPE):
+        self.chemin = chemin
+        self.taille_lot = taille_lot
+        self.delai_groupe = delai_groupe
+        self._local = threading.local()
+
+        connexion = self._ouvrir()
+        connexion.executescript(_SCHEMA)
+        self._migrer(connexion)
+        connexion.commit()
+
+        self._file: queue.Queue = queue.Queue()
+        self._ferme = False
+        # Écritures en échec (le fil d'écriture continue) ; voir vider
+        self.erreurs = 0
+        self.derniere_erreur: Optional[Exception] = None
+        self._fil_ecriture = threading.Thread(target=self._ecrire, daemon=True)
+        self._fil_ecriture.start()
+
+    def _ouvrir(self) -> sqlite3.Connection:
+        connexion = sqlite3.connect(self.chemin, check_same_thread=False)
+        connexion.execute("PRAGMA journal_mode=WAL")
+        connexion.execute("PRAGMA synchronous=NORMAL")
+        return connexion
+
+    @staticmethod
+    def _migrer(connexion: sqlite3.Connection):
+        """Ajoute la colonne des empreintes (et les calcule) sur une base créée avant elle."""
+        colonnes = [ligne[1] for ligne in connexion.execute("PRAGMA table_info(messages)")]
+        if "empreinte" not in colonnes:
+            connexion.execute("ALTER TABLE messages ADD COLUMN empreinte INTEGER")
+            lignes = connexion.execute("SELECT id, id_message, tdc, contenu FROM messages").fetchall()
+            connexion.executemany("UPDATE messages SET empreinte = ? WHERE id = ?",
+                                  [(empreinte_message(id_message, tdc, contenu), id_)
+                                   for id_, id_message, tdc, contenu in lignes])
+        connexion.execute(_INDEX_EMPREINTES)
+
+    def _connexion(self) -> sqlite3.Connection:
+        """Connexion de lecture propre au fil appelant."""
+        connexion = getattr(self._local, 'connexion', None)
+        if connexion is None:
+            connexion = self._ouvrir()
+            self._local.connexion = connexion
+        return connexion
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+
+    def ajouter(self, conversation: str, pair: str, id_message: int, sens: int,
+                contenu: bytes, tdc: int = 0, horodatage: Optional[float] = None):
+        """Met un message en file d'écriture (non bloquant). Les doublons (pair, id_message, sens) sont ignorés."""
+        if self._ferme:
+            raise ValueError("Magasin fermé")
+        self._file.put((conversation, pair, id_message, sens,
+                        time.time() if horodatage is None else horodatage, tdc, contenu,
+                        empreinte_message(id_message, tdc, contenu)))
+
+    def vider(self, timeout: Optional[float] = None) -> bool:
+        """
+        Attend que tous les messages déjà en file soient traités. False au
+        timeout, ou si une écriture a échoué entre-temps (voir derniere_erreur).
+        """
+        erreurs = self.erreurs
+        fait = threading.Event()
+        self._file.put(fait)
+        return fait.wait(timeout) and self.erreurs == erreurs
+
+    def _ecrire(self):
+        connexion = self._ouvrir()
+        try:
+            while True:
+                element = self._file.get()
+                if element is None:
+                    return
+                lot: List[Message] = []
+                signaux: List[threading.Event] = []
+                fin = False
+                limite = time.monotonic() + self.delai_groupe
+                while True:
+                    if element is None:
+                        fin = True
+                    elif isinstance(element, threading.Event):
+                        signaux.append(element)
+                    else:
+                        lot.append(element)
+                    if fin or len(lot) >= self.taille_lot:
+                        break
+                    reste = limite - time.monotonic()
+                    try:
+                        element = self._file.get(timeout=reste) if reste > 0 else self._file.get_nowait()
+                    except queue.Empty:
+                        break
+                if lot:
+                    self._inserer(connexion, lot)
+                for signal in signaux:
+                    signal.set()
+                if fin:
+                    return
+        finally:
+            connexion.close()
+
+    def _inserer(self, connexion: sqlite3.Connection, lot: List[Message]):
+        """Écrit le lot en une transaction ; en cas d'échec, message par message."""
+        try:
+            with connexion:  # une transaction, un commit pour tout le lot
+                connexion.executemany(_INSERTION, lot)
+            return
+        except Exception:
+            pass
+        for message in lot:
+            try:
+                with connexion:
+                    connexion.execute(_INSERTION, message)
+            except Exception as e:
+                self.erreurs += 1
+                self.derniere_erreur = e
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def plage(self, conversation: str, debut: Optional[float] = None, fin: Optional[float] = None,
+              limite: int = 100) -> List[Message]:
+        """Messages de la conversation avec debut <= horodatage < fin, du plus ancien au plus récent."""
+        requete = "SELECT conversation, pair, id_message, sens, horodatage, tdc, contenu FROM messages WHERE conversation = ?"
+        args: list = [conversation]
+        if debut is not None:
+            requete += " AND horodatage >= ?"
+            args.append(debut)
+        if fin is not None:
+            requete += " AND horodatage < ?"
+            args.append(fin)
+        requete += " ORDER BY horodatage LIMIT ?"
+        args.append(limite)
+        return self._connexion().execute(requete, args).fetchall()
+
+    def avant(self, conversation: str, horodatage: Optional[float] = None, limite: int = 50) -> List[Message]:
+        """Page précédant `horodatage` (défilement vers le haut), du plus ancien au plus récent."""
+        requete = "SELECT conversation, pair, id_message, sens, horodatage, tdc, contenu FROM messages WHERE conversation = ?"
+        args: list = [conversation]
+        if horodatage is not None:
+            requete += " AND horodatage < ?"
+            args.append(horodatage)
+        requete += " ORDER BY horodatage DESC LIMIT ?"
+        args.append(limite)
+        lignes = self._connexion().execute(requete, args).fetchall()
+        lignes.reverse()
+        return lignes
+
+    def message(self, pair: str, id_message: int, sens: int) -> Optional[Message]:
+        return self._connexion().execute(
+            "SELECT conversation, pair, id_message, sens, horodatage, tdc, contenu FROM messages "
+            "WHERE pair = ? AND id_message = ? AND sens = ?", (pair, id_message, sens)).fetchone()
+
+    def dernier_id(self, pair: str, sens: int) -> int:
+        """Plus grand id_message connu pour ce pair et ce sens (-1 si aucun)."""
+        ligne = self._connexion().execute(
+            "SELECT MAX(id_message) FROM messages WHERE pair = ? AND sens = ?", (pair, sens)).fetchone()
+        return -1 if ligne[0] is None else ligne[0]
+
+    # ------------------------------------------------------------------
+    # Plages de numéros (synchronisation)
+    # ------------------------------------------------------------------
+
+    def resume_plage(self, pair: str, sens: int, debut: int, fin: int) -> Tuple[int, int]:
+        """(nombre de messages, somme des empreintes) pour debut <= id_message <= fin."""
+        nombre, somme = self._connexion().execute(
+            "SELECT COUNT(*), COALESCE(SUM(empreinte), 0) FROM messages "
+            "WHERE pair = ? AND sens = ? AND id_message BETWEEN ? AND ?", (pair, sens, debut, fin)).fetchone()
+        return nombre, somme
+
+    def decouper_plage(self, pair: str, sens: int, debut: int, fin: int, parts: int) -> List[Tuple[int, int]]:
+        """Découpe [debut, fin] en au plus `parts` plages contenant autant de messages."""
+        nombre = self.resume_plage(pair, sens, debut, fin)[0]
+        pas = -(-nombre // parts) if nombre else 0
+        bornes = [debut]
+        connexion = self._connexion()
+        for decalage in range(pas, nombre, pas or 1):
+            ligne = connexion.execute(
+                "SELECT id_message FROM messages WHERE pair = ? AND sens = ? AND id_message BETWEEN ? AND ? "
+                "ORDER BY id_message LIMIT 1 OFFSET ?", (pair, sens, debut, fin, decalage)).fetchone()
+            if ligne is not None and ligne[0] > bornes[-1]:
+                bornes.append(ligne[0])
+        return [(b, (bornes[i + 1] - 1) if i + 1 < len(bornes) else fin) for i, b in enumerate(bornes)]
+
+    def ids_plage(self, pair: str, sens: int, debut: int, fin: int) -> List[int]:
+        return [ligne[0] for ligne in self._connexion().execute(
+            "SELECT id_message FROM messages WHERE pair = ? AND sens = ? AND id_message BETWEEN ? AND ? "
+            "ORDER BY id_message", (pair, sens, debut, fin))]
+
+    def messages_plage(self, pair: str, sens: int, debut: int, fin: int) -> List[Message]:
+        return self._connexion().execute(
+            "SELECT conversation, pair, id_message, sens, horodatage, tdc, contenu FROM messages "
+            "WHERE pair = ? AND sens = ? AND id_message BETWEEN ? AND ? ORDER BY id_message",
+            (pair, sens, debut, fin)).fetchall()
+
+    def fermer(self):
+        """Écrit ce qui reste en file puis arrête le fil d'écriture."""
+        if self._ferme:
+            return
+        self._ferme = True
+        self._file.put(None)
+        self._fil_ecriture.join()
+        connexion = getattr(self._local, 'connexion', None)
+        if connexion is not None:
+            connexion.close()
+            self._local.connexion = None
@@ -0,0 +1,239 @@
+# synchro.py
+"""
+Rattrapage de l'historique entre deux pairs, par comparaison de plages.
+
+Chaque pair vérifie qu'il a bien reçu tout ce que l'autre lui a envoyé :
+le demandeur compare ses messages RECU du pair aux messages ENVOYE du
+fournisseur, par plages de numéros de message. Une plage est résumée par
+(nombre de messages, somme des empreintes) (voir stockage) ; deux résumés
+égaux : rien à faire. Sinon la plage est découpée en PARTS sous-plages
+résumées à leur tour, jusqu'à ce que le demandeur n'y ait plus que
+SEUIL_LISTE messages : il envoie alors leurs numéros et le fournisseur
+renvoie ceux qui manquent. Le trafic croît avec l'écart (fois le
+logarithme de l'historique), pas avec la taille de l'historique.
+
+Message (tdc TDC_SYNCHRO) : [Rôle de l'expéditeur: 1 octet] + éléments
+    RESUME : [Type: 1 octet] [Début: 4 octets] [Fin: 4 octets] [Nombre: 4 octets] [Somme: 8 octets]
+    LISTE  : [Type: 1 octet] [Début: 4 octets] [Fin: 4 octets] [n: 2 octets] [n numéros de 4 octets]
+    ENTREE : [Type: 1 octet] [Numéro: 4 octets] [Horodatage: 8 octets] [tdc: 1 octet]
+             [Longueur: 4 octets] [Contenu]
+Les plages sont bornes incluses. LISTE va du demandeur au fournisseur,
+ENTREE du fournisseur au demandeur.
+
+Le fournisseur répond à chaque message du demandeur, même sans élément :
+le demandeur sait ainsi quand la synchronisation est finie.
+
+Seul un pair authentique (preuve d'identité vérifiée, voir
+Chats.verifier_preuve) est servi : sinon le fournisseur répond sans
+élément et le demandeur ne demande rien.
+
+Le demandeur ne prend que ce qu'il a demandé : un RESUME du fournisseur
+doit tomber dans une plage qu'il a résumée, une ENTREE dans une plage
+qu'il a listée, sur un numéro absent de sa liste. Les entrées sont rangées
+comme reçues du pair (RECU), puisque c'est lui qui les envoie.
+"""
+
+import struct
+import threading
+from typing import List, Optional, Set, Tuple
+
+import contenus
+from historique import ENVOYE, RECU
+
+DEMANDEUR = 0
+FOURNISSEUR = 1
+
+RESUME = 0
+LISTE = 1
+ENTREE = 2
+
+PARTS = 16
+SEUIL_LISTE = 16
+NUMERO_MAX = (1 << 32) - 1
+
+_RESUME = struct.Struct(">BIIIQ")
+_LISTE = struct.Struct(">BIIH")
+_ENTREE = struct.Struct(">BIdBI")
+
+
+class ErreurSynchro(Exception):
+    """Message de synchronisation illisible"""
+    pass
+
+
+def encoder_resume(debut: int, fin: int, nombre: int, somme: int) -> bytes:
+    return _RESUME.pack(RESUME, debut, fin, nombre, somme)
+
+
+def encoder_liste(debut: int, fin: int, numeros: List[int]) -> bytes:
+    return _LISTE.pack(LISTE, debut, fin, len(numeros)) + b"".join(n.to_bytes(4, 'big') for n in numeros)
+
+
+def encoder_entree(numero: int, horodatage: float, tdc: int, contenu: Optional[bytes]) -> bytes:
+    contenu = contenu or b''
+    return _ENTREE.pack(ENTREE, numero, horodatage, tdc, len(contenu)) + contenu
+
+
+def decoder_elements(octets: bytes) -> List[tuple]:
+    """Éléments d'un message : (RESUME, début, fin, nombre, somme), (LISTE, début, fin, numéros)
+    ou (ENTREE, numéro, horodatage, tdc, contenu)."""
+    elements = []
+    i = 0
+    while i < len(octets):
+        type_element = octets[i]
+        if type_element == RESUME and i + _RESUME.size <= len(octets):
+            elements.append(_RESUME.unpack_from(octets, i))
+            i += _RESUME.size
+        elif type_element == LISTE and i + _LISTE.size <= len(octets):
+            _, debut, fin, n = _LISTE.unpack_from(octets, i)
+            i += _LISTE.size
+            if i + 4 * n > len(octets):
+                raise ErreurSynchro("Liste tronquée")
+            numeros = [int.from_bytes(octets[j:j + 4], 'big') for j in range(i, i + 4 * n, 4)]
+            elements.append((LISTE, debut, fin, numeros))
+            i += 4 * n
+        elif type_element == ENTREE and i + _ENTREE.size <= len(octets):
+            _, numero, horodatage, tdc, longueur = _ENTREE.unpack_from(octets, i)
+            i += _ENTREE.size
+            if i + longueur > len(octets):
+                raise ErreurSynchro("Entrée tronquée")
+            elements.append((ENTREE, numero, horodatage, tdc, octets[i:i + longueur]))
+            i += longueur
+        else:
+            raise ErreurSynchro("Élément inconnu ou tronqué")
+    return elements
+
+
+class Synchronisation:
+    """
+    Synchronisation de l'historique d'une session, dans les deux rôles.
+    Le magasin et l'identifiant de conversation sont ceux de la session ;
+    sans magasin, ou avec un pair qui n'a pas prouvé son identité, la
+    session ne demande rien et ne fournit rien.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.rattrapes = 0  # messages reçus par la synchronisation
+        self.termine = threading.Event()
+        self._demarree = False
+        self._en_attente = 0  # messages du demandeur sans réponse
+        # Plages envoyées comme demandeur : résumées, et listées avec nos numéros
+        self._plages_resumees: List[Tuple[int, int]] = []
+        self._plages_listees: List[Tuple[int, int, Set[int]]] = []
+        self._verrou = threading.Lock()
+
+    def demarrer(self) -> "Synchronisation":
+        """Demande au pair les messages qui nous manquent (une fois par session)."""
+        with self._verrou:
+            if self._demarree:
+                return self
+            self._demarree = True
+        magasin = self.session.magasin
+        if magasin is None or not self.session.authentique:
+            self.termine.set()
+            return self
+        nombre, somme = magasin.resume_plage(self.session.conversation, RECU, 0, NUMERO_MAX)
+        self._envoyer(DEMANDEUR, [encoder_resume(0, NUMERO_MAX, nombre, somme)])
+        return self
+
+    def attendre(self, timeout: Optional[float] = None) -> bool:
+        return self.termine.wait(timeout)
+
+    def traiter(self, octets: bytes):
+        """Message de synchronisation remis par la session (boucle de réception)."""
+        if not octets:
+            return
+        try:
+            elements = decoder_elements(octets[1:])
+        except ErreurSynchro:
+            return
+        if octets[0] == DEMANDEUR:
+            self._fournir(elements)
+            self.demarrer()  # le pair rattrape son retard : nous aussi
+        elif octets[0] == FOURNISSEUR and self._demarree:
+            self._demander(elements)
+
+    # ------------------------------------------------------------------
+
+    def _envoyer(self, role: int, elements: List[bytes]):
+        if self.session._fermee:
+            return
+        if role == DEMANDEUR:
+            with self._verrou:
+                self._en_attente += 1
+                for element in decoder_elements(b"".join(elements)):
+                    if element[0] == RESUME:
+                        self._plages_resumees.append(element[1:3])
+                    elif element[0] == LISTE:
+                        self._plages_listees.append((element[1], element[2], set(element[3])))
+        self.session.envoyer(bytes([role]) + b"".join(elements), contenus.tdc_en_octet(contenus.TDC_SYNCHRO))
+
+    def _resumes(self, sens: int, debut: int, fin: int) -> List[bytes]:
+        """Résumés des sous-plages de [debut, fin], découpée selon nos messages."""
+        magasin = self.session.magasin
+        conversation = self.session.conversation
+        return [encoder_resume(d, f, *magasin.resume_plage(conversation, sens, d, f))
+                for d, f in magasin.decouper_plage(conversation, sens, debut, fin, PARTS)]
+
+    def _fournir(self, elements: List[tuple]):
+        """Fournisseur : nos messages ENVOYE face aux messages RECU du demandeur."""
+        magasin = self.session.magasin
+        conversation = self.session.conversation
+        reponse = []
+        for element in elements if magasin is not None and self.session.authentique else ():
+            if element[0] == RESUME:
+                _, debut, fin, nombre, somme = element
+                if magasin.resume_plage(conversation, ENVOYE, debut, fin) != (nombre, somme):
+                    reponse.extend(self._resumes(ENVOYE, debut, fin))
+            elif element[0] == LISTE:
+                _, debut, fin, numeros = element
+                connus = set(numeros)
+                for _, _, numero, _, horodatage, tdc, contenu in magasin.messages_plage(conversation, ENVOYE,
+                                                                                       debut, fin):
+                    if numero not in connus:
+                        reponse.append(encoder_entree(numero, horodatage, tdc, contenu))
+        self._envoyer(FOURNISSEUR, reponse)
+
+    def _demande(self, numero: int) -> bool:
+        """Le numéro est dans une plage listée et nous manquait (il ne sera pris qu'une fois)."""
+        for debut, fin, connus in self._plages_listees:
+            if debut <= numero <= fin and numero not in connus:
+                connus.add(numero)
+                return True
+        return False
+
+    def _demander(self, elements: List[tuple]):
+        """Demandeur : range les messages rattrapés et affine les plages qui diffèrent encore."""
+        with self._verrou:
+            if self._en_attente == 0 or not self.session.authentique:
+                return  # réponse que nous n'attendions pas
+        magasin = self.session.magasin
+        conversation = self.session.conversation
+        reponse = []
+        for element in elements:
+            if element[0] == ENTREE:
+                _, numero, horodatage, tdc, contenu = element
+                if not self._demande(numero):
+                    continue
+                magasin.ajouter(conversation, conversation, numero, RECU, contenu, tdc, horodatage)
+                self.rattrapes += 1
+            elif element[0] == RESUME:
+                _, debut, fin, nombre, somme = element
+                if not any(d <= debut <= fin <= f for d, f in self._plages_resumees):
+                    continue
+                nous = magasin.resume_plage(conversation, RECU, debut, fin)
+                if nous == (nombre, somme):
+                    continue
+                if nous[0] <= SEUIL_LISTE:
+                    reponse.append(encoder_liste(debut, fin, magasin.ids_plage(conversation, RECU, debut, fin)))
+                else:
+                    reponse.extend(self._resumes(RECU, debut, fin))
+        if reponse:
+            self._envoyer(DEMANDEUR, reponse)
+        with self._verrou:
+            self._en_attente -= 1
+            fini = self._en_attente == 0
+        if fini:
+            magasin.vider()
+            self.termine.set()
@@ -2,7 +2,9 @@ import threading
 import time
 import socket
 import sys
+import queue
 
+import annuaire
 from ports import Chats, Utilisateur, Session
 
 # ---------------------------------------------------------------------------
@@ -56,6 +58,16 @@ def print_menu():
     print("Choix: ", end="", flush=True)
 
 
+def print_peer_event(evenement):
+    """Arrivées et départs des pairs, au fil de l'eau (abonnement à l'annuaire)."""
+    entry = evenement.entree
+    p = entry["parsed"]
+    if evenement.type == annuaire.APPARU:
+        print(f"\n[+] {p['noms']} {p['prenoms']} ({entry['ip']}:{entry['port']})")
+    elif evenement.type == annuaire.DISPARU:
+        print(f"\n[-] {p['noms']} {p['prenoms']} ({entry['ip']}:{entry['port']})")
+
+
 # ---------------------------------------------------------------------------
 # Option 1 : Affichage des appareils détectés
 # ---------------------------------------------------------------------------
@@ -125,6 +137,7 @@ def connect_from_detected():
         session = APP.creer_session_par_multicast(
             index=index,
             fdc=fdc_aes_interne,
+            fdd=fdc_aes_interne,
             cle=b"ma_cle_interne_test"
         )
         print("✅ Session créée avec succès.")
@@ -172,32 +185,22 @@ def chat_in_session():
     print("Tapez /exit pour revenir au menu.")
     print("----------------------------------------")
 
-    # Thread pour la réception des messages
+    # Affichage des messages livrés par la boucle de réception de Chats
+    en_discussion = threading.Event()
+    en_discussion.set()
+
     def receiver():
-        while RUNNING and sess.session_active:
+        while RUNNING and sess.session_active and en_discussion.is_set():
             try:
-                data, addr = sess.cet_appareil.recvfrom(4096)
-                # Vérifier que le message vient du bon destinataire
-                if addr[0] == sess.destinataire.ip and addr[1] == sess.destinataire.port:
-                    try:
-                        # Essayer de déchiffrer et afficher le message
-                        message = data.decode('utf-8', errors='ignore')
-                        print(f"\n[Message reçu] {message}")
-                        print(">>> ", end="", flush=True)
-                    except Exception as e:
-                        print(f"\n[Données brutes reçues] {len(data)} octets")
-                        print(">>> ", end="", flush=True)
-            except socket.timeout:
+                message = sess.octets_a_recevoir.get(timeout=0.5)
+            except queue.Empty:
                 continue
-            except Exception as e:
-                if RUNNING:  # Ne pas afficher l'erreur si on quitte normalement
-                    print(f"\nErreur réception: {e}")
-                break
+            if isinstance(message, str):
+                print(f"\n[Message reçu] {message}")
+            else:
+                print(f"\n[Données reçues] {message!r}")
+            print(">>> ", end="", flush=True)
 
-    # Configurer le timeout pour la réception
-    sess.cet_appareil.settimeout(0.5)
-    
-    # Démarrer le thread de réception
     t = threading.Thread(target=receiver, daemon=True)
     t.start()
 
@@ -214,12 +217,14 @@ def chat_in_session():
             
         if msg.strip():  # Ne pas envoyer de message vide
             try:
-                # Utiliser la file d'envoi de la session
-                sess.octets_a_envoyer.put(msg.encode('utf-8'))
+                # Mis en file de l'ordonnanceur d'envoi de Chats
+                sess.envoyer(msg.encode('utf-8'))
                 print("[Message envoyé]")
             except Exception as e:
                 print(f"Erreur envoi: {e}")
 
+    en_discussion.clear()
+
 
 # ---------------------------------------------------------------------------
 # Option 6 : Générer code de connexion
@@ -259,7 +264,8 @@ def main():
 
     try:
         # Pass CURRENT_USER to Chats so it uses the right name in multicast
-        APP = Chats(multicast_active=True)
+        APP = Chats(multicast_active=True, fdc=fdc_aes_interne, fdd=fdc_aes_interne)
+        APP.annuaire.abonner(print_peer_event)
         
         print("\n✅ Système démarré avec succès!")
         print(f"✅ Identité: {my_name} {my_surname}")
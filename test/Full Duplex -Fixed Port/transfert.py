@@ -0,0 +1,613 @@
+# transfert.py
+"""
+Transfert de fichiers sur une session, avec reprise.
+
+L'émetteur lit le fichier par mmap et l'envoie en morceaux : un message
+par morceau, acquitté et renvoyé au besoin par la session, au plus
+FENETRE morceaux en vol. Le récepteur écrit chaque morceau à sa place
+(pwrite) dans un fichier préalloué et note sa réception dans une carte
+de bits persistante : après une déconnexion, une nouvelle offre du même
+fichier ne demande que les morceaux manquants. La mémoire utilisée ne
+dépend pas de la taille du fichier.
+
+Le SHA-256 du fichier est envoyé avec l'offre ; le récepteur calcule le
+sien au fil des morceaux contigus et ne garde le fichier que s'ils sont égaux.
+
+Messages de contrôle (tdc TDC_TRANSFERT) : [Type: 1 octet] [Id du transfert: 8 octets] + contenu
+    OFFRE   : [Taille: 8 octets] [Taille des morceaux: 4 octets] [SHA-256: 32 octets] [Nom (UTF-8)]
+    ETAT    : carte de bits des morceaux reçus
+    FIN     : (vide) tous les morceaux ont été acquittés
+    TERMINE : [Succès: 1 octet]
+    REFUS   : (vide) offre refusée (tailles hors limites, refus de `accepter`, disque)
+Morceau (tdc TDC_MORCEAU) : [Id du transfert: 8 octets] [Index: 4 octets] [Données]
+
+L'identifiant d'un transfert est tiré du contenu du fichier : renvoyer
+le même fichier reprend le transfert interrompu.
+
+Une offre doit respecter TAILLE_FICHIER_MAX, TAILLE_MORCEAU_MAX et
+MORCEAUX_MAX (taille de la carte de bits). Elle est ensuite soumise à
+Transferts.accepter s'il est défini ; sinon elle n'est acceptée d'office
+que jusqu'à Transferts.taille_max. Rien n'est créé sur le disque avant ces
+vérifications.
+
+Les fichiers reçus vont dans un dossier propre à l'utilisateur (voir
+historique.dossier_prive), en 0o700, et sont créés en 0o600 sans suivre
+de lien symbolique.
+
+Flux parallèles : les morceaux peuvent partir sur plusieurs sessions vers
+le même pair (voir Chats.ouvrir_flux), chacune avec sa socket, son fil
+d'envoi et sa fenêtre, le contrôle restant sur la session principale.
+Le récepteur les écrit par position quelle que soit la session qui les
+apporte. Le nombre de flux utilisés grandit tant que le débit acquitté
+augmente d'au moins GAIN_FLUX, puis redescend d'un cran.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from queue import Queue, Empty
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import contenus
+from historique import MODE_DOSSIER, MODE_FICHIER, dossier_prive
+
+OFFRE = 0
+ETAT = 1
+FIN = 2
+TERMINE = 3
+REFUS = 4
+
+TAILLE_ID = 8
+TAILLE_ENTETE_MORCEAU = TAILLE_ID + 4
+TAILLE_MORCEAU = 64 * 1431 - TAILLE_ENTETE_MORCEAU  # un morceau = 64 paquets pleins
+TAILLE_MORCEAU_MAX = 16 * 1024 * 1024
+MORCEAUX_MAX = 1 << 22  # carte de bits de 512 Kio au plus
+TAILLE_FICHIER_MAX = 64 * 1024 ** 3  # au-delà, refusé même par Transferts.accepter
+TAILLE_AUTO_MAX = 64 * 1024 * 1024  # accepté sans Transferts.accepter (voir Transferts.taille_max)
+FENETRE = 32  # morceaux en vol
+DELAI_REPONSE = 30.0  # s
+TAILLE_LECTURE = 1024 * 1024  # tranche de hachage
+INTERVALLE_MESURE = 0.5  # s entre deux ajustements du nombre de flux
+GAIN_FLUX = 0.1  # gain de débit qui justifie un flux de plus
+
+DOSSIER_TRANSFERTS = dossier_prive("transferts")
+
+_OFFRE = struct.Struct(">QI32s")
+
+
+class FichierRecu(NamedTuple):
+    chemin: str
+    nom: str
+    taille: int
+    sha256: bytes
+
+
+def _ecrire_a(fichier, donnees, position: int):
+    if hasattr(os, 'pwrite'):
+        os.pwrite(fichier.fileno(), donnees, position)
+    else:
+        fichier.seek(position)
+        fichier.write(donnees)
+        fichier.flush()
+
+
+def _lire_a(fichier, n: int, position: int) -> bytes:
+    if hasattr(os, 'pread'):
+        return os.pread(fichier.fileno(), n, position)
+    fichier.seek(position)
+    return fichier.read(n)
+
+
+def _preparer_dossier(dossier: str):
+    os.makedirs(dossier, mode=MODE_DOSSIER, exist_ok=True)
+    try:
+        os.chmod(dossier, MODE_DOSSIER)  # existant, ou créé avec un umask plus large
+    except OSError:
+        pass
+
+
+def _ouvrir_prive(chemin: str, vider: bool = False):
+    """Ouvre `chemin` en lecture-écriture, créé 0o600, sans suivre de lien symbolique."""
+    drapeaux = (os.O_RDWR | os.O_CREAT | (os.O_TRUNC if vider else 0)
+                | getattr(os, "O_BINARY", 0) | getattr(os, "O_NOFOLLOW", 0))
+    fd = os.open(chemin, drapeaux, MODE_FICHIER)
+    if hasattr(os, "fchmod"):
+        os.fchmod(fd, MODE_FICHIER)  # fichier déjà présent
+    return os.fdopen(fd, 'r+b')
+
+
+def _nombre_morceaux(taille: int, taille_morceau: int) -> int:
+    return (taille + taille_morceau - 1) // taille_morceau
+
+
+def offre_valide(taille: int, taille_morceau: int, taille_max: int = TAILLE_FICHIER_MAX) -> bool:
+    return 0 < taille_morceau <= TAILLE_MORCEAU_MAX and 0 <= taille <= taille_max \
+        and _nombre_morceaux(taille, taille_morceau) <= MORCEAUX_MAX
+
+
+def _bit(carte: bytes, i: int) -> bool:
+    return bool(carte[i >> 3] >> (i & 7) & 1)
+
+
+class CarteBits:
+    """Un bit par morceau reçu, gardé sur disque."""
+
+    def __init__(self, chemin: str, n: int):
+        self.n = n
+        taille = (n + 7) // 8
+        existe = os.path.exists(chemin) and os.path.getsize(chemin) == taille
+        self._fichier = _ouvrir_prive(chemin, vider=not existe)
+        if existe:
+            self.bits = bytearray(self._fichier.read())
+        else:
+            self.bits = bytearray(taille)
+            self._fichier.write(self.bits)
+            self._fichier.flush()
+        self.compte = sum(bin(b).count('1') for b in self.bits)
+
+    def __contains__(self, i: int) -> bool:
+        return _bit(self.bits, i)
+
+    def marquer(self, i: int):
+        if i in self:
+            return
+        octet = i >> 3
+        self.bits[octet] |= 1 << (i & 7)
+        self.compte += 1
+        _ecrire_a(self._fichier, self.bits[octet:octet + 1], octet)
+
+    def complete(self) -> bool:
+        return self.compte == self.n
+
+    def fermer(self):
+        self._fichier.close()
+
+
+class ReceptionFichier:
+    """Côté récepteur : fichier partiel préalloué + carte de bits, repris s'ils existent déjà."""
+
+    def __init__(self, dossier: str, id_transfert: bytes, taille: int, taille_morceau: int,
+                 sha256: bytes, nom: str):
+        if not offre_valide(taille, taille_morceau, taille):
+            raise ValueError("Taille de morceau invalide")
+        _preparer_dossier(dossier)
+        self.id_transfert = id_transfert
+        self.taille = taille
+        self.taille_morceau = taille_morceau
+        self.sha256 = sha256
+        self.nom = os.path.basename(nom) or id_transfert.hex()
+        base = os.path.join(dossier, id_transfert.hex())
+        self.chemin_partiel = base + ".part"
+        self.chemin_final = f"{base}-{self.nom}"
+
+        self._fichier = _ouvrir_prive(self.chemin_partiel)
+        try:
+            if os.fstat(self._fichier.fileno()).st_size != taille:
+                self._fichier.truncate(taille)
+                if hasattr(os, 'posix_fallocate') and taille:
+                    try:
+                        os.posix_fallocate(self._fichier.fileno(), 0, taille)
+                    except OSError:
+                        pass  # système de fichiers sans préallocation : fichier creux
+            self.carte = CarteBits(base + ".bits", _nombre_morceaux(taille, taille_morceau))
+        except OSError:
+            # Fichiers inutilisables : rien ne reste sur le disque
+            self._fichier.close()
+            for chemin in (self.chemin_partiel, base + ".bits"):
+                try:
+                    os.remove(chemin)
+                except OSError:
+                    pass
+            raise
+        self._hache = hashlib.sha256()
+        self._hache_jusqua = 0  # morceaux contigus déjà hachés
+        # Transferts de la session qui a reçu l'offre (les morceaux peuvent venir d'autres flux)
+        self.origine: Optional["Transferts"] = None
+        self._verrou = threading.Lock()
+        self._complete = False
+
+    def ecrire(self, position: int, donnees: bytes):
+        if not self._fichier.closed:  # session fermée pendant la réception
+            _ecrire_a(self._fichier, donnees, position)
+
+    def morceau_recu(self, index: int) -> bool:
+        """
+        Note le morceau et avance le hachage. Retourne True quand tout est
+        reçu (une seule fois, même si des flux parallèles appellent en même temps).
+        """
+        with self._verrou:
+            if self._fichier.closed or self._complete:
+                return False
+            self.carte.marquer(index)
+            while self._hache_jusqua < self.carte.n and self._hache_jusqua in self.carte:
+                debut = self._hache_jusqua * self.taille_morceau
+                self._hache.update(_lire_a(self._fichier, min(self.taille_morceau, self.taille - debut), debut))
+                self._hache_jusqua += 1
+            self._complete = self.carte.complete()
+            return self._complete
+
+    def terminer(self) -> Optional[FichierRecu]:
+        """Vérifie l'empreinte : le fichier est gardé si elle est bonne, effacé sinon."""
+        valide = self._hache.digest() == self.sha256
+        self.fermer()
+        if not valide:
+            os.remove(self.chemin_partiel)
+            os.remove(self.carte_chemin)
+            return None
+        os.replace(self.chemin_partiel, self.chemin_final)
+        os.remove(self.carte_chemin)
+        return FichierRecu(self.chemin_final, self.nom, self.taille, self.sha256)
+
+    @property
+    def carte_chemin(self) -> str:
+        return self.chemin_partiel[:-len(".part")] + ".bits"
+
+    def fermer(self):
+        self._fichier.close()
+        self.carte.fermer()
+
+
+class GestionnaireMorceau(contenus.Gestionnaire):
+    """Écrit un morceau directement à sa place dans le fichier partiel."""
+
+    def __init__(self, infos_sup: bytes, reception: Callable[[bytes], Optional[ReceptionFichier]]):
+        super().__init__(infos_sup)
+        self._trouver = reception
+        self._entete = bytearray()
+        self.id_transfert = None
+        self.index = None
+        self._reception: Optional[ReceptionFichier] = None
+        self._position = 0
+        self._fin = 0
+
+    def recevoir(self, morceau: bytes):
+        if self.index is None:
+            manque = TAILLE_ENTETE_MORCEAU - len(self._entete)
+            self._entete += morceau[:manque]
+            morceau = morceau[manque:]
+            if len(self._entete) < TAILLE_ENTETE_MORCEAU:
+                return
+            self.id_transfert = bytes(self._entete[:TAILLE_ID])
+            self.index = int.from_bytes(self._entete[TAILLE_ID:], 'big')
+            reception = self._trouver(self.id_transfert)
+            if reception is not None and self.index < reception.carte.n:
+                self._reception = reception
+                self._position = self.index * reception.taille_morceau
+                self._fin = min(self._position + reception.taille_morceau, reception.taille)
+        if self._reception is not None:
+            n = min(len(morceau), self._fin - self._position)
+            if n > 0:
+                self._reception.ecrire(self._position, morceau[:n])
+                self._position += n
+
+    def terminer(self):
+        """(id du transfert, index, morceau complet)"""
+        return self.id_transfert, self.index, self._reception is not None and self._position == self._fin
+
+
+class EnvoiFichier:
+    """
+    Côté émetteur. `attendre()` bloque jusqu'à la fin du transfert et
+    retourne True si le pair a vérifié le fichier.
+
+    Args:
+        voies: sessions supplémentaires vers le même pair, pour les morceaux
+        adapter: ajuste le nombre de flux au débit (sinon tous servent)
+    """
+
+    def __init__(self, session, chemin: str, taille_morceau: int = TAILLE_MORCEAU, fenetre: int = FENETRE,
+                 voies: List = (), adapter: bool = True):
+        self.session = session
+        self.chemin = chemin
+        self.taille_morceau = taille_morceau
+        self._fichier = open(chemin, 'rb')
+        self.taille = os.fstat(self._fichier.fileno()).st_size
+        self._mm = mmap.mmap(self._fichier.fileno(), 0, access=mmap.ACCESS_READ) if self.taille else None
+        self.n = _nombre_morceaux(self.taille, taille_morceau)
+        self.sha256 = self._empreinte()
+        self.id_transfert = hashlib.sha256(self.sha256 + self.taille.to_bytes(8, 'big')).digest()[:TAILLE_ID]
+        self.envoyes = 0  # morceaux envoyés par ce transfert (hors morceaux déjà présents chez le pair)
+        self.succes: Optional[bool] = None
+        self.erreur: Optional[Exception] = None
+        self.termine = threading.Event()
+        self._reponses: Queue = Queue()
+        self._taille_fenetre = fenetre
+        self._abandon = False
+        # Une fenêtre par flux ; la session principale est le flux 0
+        self.voies = [session] + list(voies)
+        self._fenetres = [threading.Semaphore(fenetre) for _ in self.voies]
+        self._mortes = set()  # flux fermés ou muets, délaissés jusqu'à la fin
+        self.actifs = 1 if adapter else len(self.voies)
+        self._croissance = adapter
+        self._meilleur = 0.0  # meilleur débit acquitté mesuré (octets/s)
+        self._acquittes = 0
+        self._mesure = (time.monotonic(), 0)
+        self._verrou = threading.Lock()
+
+    def _empreinte(self) -> bytes:
+        hache = hashlib.sha256()
+        if self._mm is not None:
+            vue = memoryview(self._mm)
+            try:
+                for debut in range(0, self.taille, TAILLE_LECTURE):
+                    hache.update(vue[debut:debut + TAILLE_LECTURE])
+            finally:
+                vue.release()
+        return hache.digest()
+
+    def demarrer(self):
+        threading.Thread(target=self._boucle, daemon=True).start()
+        return self
+
+    def attendre(self, timeout: Optional[float] = None) -> Optional[bool]:
+        self.termine.wait(timeout)
+        return self.succes
+
+    def recevoir_reponse(self, reponse):
+        """Carte de bits (ETAT) ou succès (TERMINE) envoyés par le pair."""
+        self._reponses.put(reponse)
+
+    def interrompre(self):
+        """Session fermée : le transfert s'arrête (il pourra être repris)."""
+        self._abandon = True
+        self._reponses.put(ConnectionError("Transfert interrompu"))
+
+    # ------------------------------------------------------------------
+
+    def _controle(self, type_message: int, contenu: bytes = b''):
+        self.session.envoyer(bytes([type_message]) + self.id_transfert + contenu,
+                             contenus.tdc_en_octet(contenus.TDC_TRANSFERT))
+
+    def _attendre_reponse(self):
+        try:
+            reponse = self._reponses.get(timeout=DELAI_REPONSE)
+        except Empty:
+            raise TimeoutError("Pas de réponse du pair au transfert")
+        if isinstance(reponse, Exception):
+            raise reponse
+        return reponse
+
+    def _acquitte(self, voie: int, taille: int, recu: bool):
+        with self._verrou:
+            if recu:
+                self._acquittes += taille
+            elif voie == 0:
+                self._abandon = True
+            else:
+                self._mortes.add(voie)  # le morceau sera redemandé par l'ETAT suivant
+        self._fenetres[voie].release()
+
+    def _envoyer_morceau(self, voie: int, index: int) -> bool:
+        """Retourne False si le flux ne peut plus servir (le morceau n'est pas parti)."""
+        self._fenetres[voie].acquire()
+        if self._abandon or self.session._fermee:
+            raise ConnectionError("Transfert interrompu")
+        session = self.voies[voie]
+        debut = index * self.taille_morceau
+        donnees = self._mm[debut:debut + self.taille_morceau]
+        try:
+            if voie in self._mortes or session._fermee:
+                raise ConnectionError("Flux fermé")
+            session.envoyer(self.id_transfert + index.to_bytes(4, 'big') + donnees,
+                            contenus.tdc_en_octet(contenus.TDC_MORCEAU),
+                            sur_fin=lambda recu: self._acquitte(voie, len(donnees), recu))
+        except (ConnectionError, RuntimeError):
+            if voie == 0:
+                raise
+            self._mortes.add(voie)
+            self._fenetres[voie].release()
+            return False
+        with self._verrou:
+            self.envoyes += 1
+        return True
+
+    def _actif(self, voie: int) -> bool:
+        vivantes = [v for v in range(len(self.voies)) if v not in self._mortes]
+        return voie in vivantes[:self.actifs]
+
+    def _travailleur(self, voie: int, a_envoyer: Queue):
+        """Fil d'un flux : envoie des morceaux de la file tant qu'il fait partie des flux actifs."""
+        try:
+            while not self._abandon and voie not in self._mortes:
+                if not self._actif(voie):
+                    if a_envoyer.empty():
+                        return
+                    time.sleep(INTERVALLE_MESURE / 10)
+                    continue
+                try:
+                    index = a_envoyer.get_nowait()
+                except Empty:
+                    return
+                if not self._envoyer_morceau(voie, index):
+                    a_envoyer.put(index)  # repris par un autre flux, sinon au tour suivant
+        except Exception as e:
+            self.erreur = e
+            self._abandon = True
+
+    def _envoyer_manquants(self, carte: bytes):
+        if len(carte) < (self.n + 7) // 8:
+            raise ValueError("Carte de bits incomplète")
+        a_envoyer: Queue = Queue()
+        for index in range(self.n):
+            if not _bit(carte, index):
+                a_envoyer.put(index)
+        travailleurs = [threading.Thread(target=self._travailleur, args=(voie, a_envoyer), daemon=True)
+                        for voie in range(len(self.voies))]
+        for t in travailleurs:
+            t.start()
+        for t in travailleurs:
+            while t.is_alive():
+                t.join(INTERVALLE_MESURE)
+                self._ajuster()
+        if self._abandon:
+            raise self.erreur if self.erreur is not None else ConnectionError("Transfert interrompu")
+
+    def _ajuster(self):
+        """Ajoute un flux tant que le débit acquitté progresse, sinon revient au nombre précédent."""
+        if not self._croissance:
+            return
+        maintenant = time.monotonic()
+        debut, acquittes = self._mesure
+        if maintenant - debut < INTERVALLE_MESURE:
+            return
+        self._mesure = (maintenant, self._acquittes)
+        debit = (self._acquittes - acquittes) / (maintenant - debut)
+        if debit > self._meilleur * (1 + GAIN_FLUX):
+            self._meilleur = debit
+            if self.actifs < len(self.voies) - len(self._mortes):
+                self.actifs += 1
+            else:
+                self._croissance = False
+        else:
+            self.actifs = max(1, self.actifs - 1)
+            self._croissance = False
+
+    def _vider_fenetre(self):
+        """Attend que tous les morceaux en vol soient acquittés."""
+        for fenetre in self._fenetres:
+            for _ in range(self._taille_fenetre):
+                fenetre.acquire()
+            for _ in range(self._taille_fenetre):
+                fenetre.release()
+        if self._abandon:
+            raise ConnectionError("Transfert interrompu")
+
+    def _boucle(self):
+        try:
+            nom = os.path.basename(self.chemin).encode('utf-8')
+            self._controle(OFFRE, _OFFRE.pack(self.taille, self.taille_morceau, self.sha256) + nom)
+            reponse = self._attendre_reponse()
+            while not isinstance(reponse, bool):
+                self._envoyer_manquants(reponse)
+                self._vider_fenetre()
+                self._controle(FIN)
+                reponse = self._attendre_reponse()
+            self.succes = reponse
+        except (ConnectionError, TimeoutError, RuntimeError, OSError, ValueError, IndexError) as e:
+            self.erreur = e
+            self.succes = False
+        finally:
+            if self._mm is not None:
+                self._mm.close()
+            self._fichier.close()
+            self.session.transferts.envois.pop(self.id_transfert, None)
+            self.termine.set()
+
+
+class Transferts:
+    """Transferts d'une session, dans les deux sens."""
+
+    def __init__(self, session, dossier: str = DOSSIER_TRANSFERTS,
+                 receptions: Optional[Dict[bytes, ReceptionFichier]] = None):
+        self.session = session
+        self.dossier = dossier
+        self.envois: Dict[bytes, EnvoiFichier] = {}
+        # Partagé par les sessions d'un Chats : les morceaux d'un flux parallèle
+        # arrivent sur une autre session que l'offre
+        self.receptions: Dict[bytes, ReceptionFichier] = receptions if receptions is not None else {}
+        self._termines: Dict[bytes, bool] = {}
+        # Taille acceptée d'office ; au-delà, ou toujours s'il est défini, accepter(nom, taille) décide
+        self.taille_max = TAILLE_AUTO_MAX
+        self.accepter: Optional[Callable[[str, int], bool]] = None
+
+    def enregistrer(self, registre: contenus.RegistreContenus):
+        registre.enregistrer(contenus.TDC_MORCEAU, lambda infos_sup: GestionnaireMorceau(infos_sup, self._reception))
+        registre.enregistrer(contenus.TDC_TRANSFERT, contenus.Gestionnaire)
+
+    def _reception(self, id_transfert: bytes) -> Optional[ReceptionFichier]:
+        """Réception à laquelle cette session peut apporter des morceaux (offerte par le même pair)."""
+        reception = self.receptions.get(id_transfert)
+        if reception is None or reception.origine is None \
+                or reception.origine.session.destinataire.ip != self.session.destinataire.ip:
+            return None
+        return reception
+
+    def envoyer(self, chemin: str, taille_morceau: int = TAILLE_MORCEAU, voies: List = (),
+                adapter: bool = True) -> EnvoiFichier:
+        if not 0 < taille_morceau <= TAILLE_MORCEAU_MAX:
+            raise ValueError("Taille de morceau invalide")
+        envoi = EnvoiFichier(self.session, chemin, taille_morceau, voies=voies, adapter=adapter)
+        if envoi.id_transfert in self.envois:
+            raise ValueError("Ce fichier est déjà en cours d'envoi")
+        self.envois[envoi.id_transfert] = envoi
+        return envoi.demarrer()
+
+    def _repondre(self, type_message: int, id_transfert: bytes, contenu: bytes = b''):
+        if self.session._fermee:
+            return
+        try:
+            self.session.envoyer(bytes([type_message]) + id_transfert + contenu,
+                                 contenus.tdc_en_octet(contenus.TDC_TRANSFERT))
+        except (ConnectionError, RuntimeError):
+            pass  # session ou ordonnanceur arrêté pendant la fermeture (close_all)
+
+    def traiter(self, tdc: int, resultat):
+        """Messages de transfert remis par la session (boucle de réception)."""
+        if tdc == contenus.TDC_MORCEAU:
+            id_transfert, index, complet = resultat
+            reception = self._reception(id_transfert)
+            if complet and reception is not None and reception.morceau_recu(index):
+                reception.origine._terminer(reception)
+            return
+
+        if len(resultat) < 1 + TAILLE_ID:
+            return
+        type_message, id_transfert, contenu = resultat[0], resultat[1:1 + TAILLE_ID], resultat[1 + TAILLE_ID:]
+        if type_message == OFFRE:
+            if len(contenu) < _OFFRE.size:
+                return
+            reception = self.receptions.get(id_transfert)
+            if reception is None:
+                taille, taille_morceau, sha256 = _OFFRE.unpack(contenu[:_OFFRE.size])
+                nom = contenu[_OFFRE.size:].decode('utf-8', errors='replace')
+                if not offre_valide(taille, taille_morceau) \
+                        or (self.accepter is None and taille > self.taille_max) \
+                        or (self.accepter is not None and not self.accepter(nom, taille)):
+                    self._repondre(REFUS, id_transfert)
+                    return
+                try:
+                    reception = ReceptionFichier(self.dossier, id_transfert, taille, taille_morceau, sha256, nom)
+                except (OSError, ValueError):
+                    self._repondre(REFUS, id_transfert)
+                    return
+                self._termines.pop(id_transfert, None)
+                self.receptions[id_transfert] = reception
+            reception.origine = self
+            if reception.carte.complete():
+                self._terminer(reception)
+            else:
+                self._repondre(ETAT, id_transfert, bytes(reception.carte.bits))
+        elif type_message == FIN:
+            reception = self.receptions.get(id_transfert)
+            if reception is not None:
+                self._repondre(ETAT, id_transfert, bytes(reception.carte.bits))
+            elif id_transfert in self._termines:
+                self._repondre(TERMINE, id_transfert, bytes([self._termines[id_transfert]]))
+        elif type_message in (ETAT, TERMINE):
+            envoi = self.envois.get(id_transfert)
+            if envoi is not None:
+                envoi.recevoir_reponse(contenu if type_message == ETAT else contenu[:1] == b'\x01')
+        elif type_message == REFUS:
+            envoi = self.envois.get(id_transfert)
+            if envoi is not None:
+                envoi.recevoir_reponse(ConnectionRefusedError("Le pair refuse le fichier"))
+
+    def _terminer(self, reception: ReceptionFichier):
+        self.receptions.pop(reception.id_transfert, None)
+        fichier = reception.terminer()
+        self._termines[reception.id_transfert] = fichier is not None
+        self._repondre(TERMINE, reception.id_transfert, b'\x01' if fichier is not None else b'\x00')
+        if fichier is not None:
+            self.session.octets_a_recevoir.put(fichier)
+
+    def fermer(self):
+        """Interrompt les envois et ferme les fichiers partiels (gardés pour une reprise)."""
+        for envoi in list(self.envois.values()):
+            envoi.interrompre()
+        for id_transfert, reception in list(self.receptions.items()):
+            if reception.origine is self:
+                reception.fermer()
+                self.receptions.pop(id_transfert, None)
@@ -0,0 +1,90 @@
+# trickle.py
+"""
+Cadence des annonces multicast selon l'algorithme Trickle (RFC 6206).
+
+Le temps est découpé en intervalles de durée I, entre imin et
+imax = imin * 2^doublements. Dans chaque intervalle, une émission est
+prévue à un instant t tiré au hasard dans [I/2, I) ; elle n'a lieu que si
+moins de k annonces « cohérentes » (même état que le nôtre) ont été
+entendues depuis le début de l'intervalle. À la fin de l'intervalle, I
+double. Une annonce incohérente (état différent, nouveau pair) ramène I
+à imin.
+
+Quand tout est stable, il ne part donc qu'environ k annonces par imax
+sur tout le réseau, quel que soit le nombre d'appareils ; un changement
+est propagé en quelques imin.
+"""
+
+import random
+import threading
+import time
+from typing import Callable
+
+IMIN = 0.1        # s
+DOUBLEMENTS = 8   # imax = IMIN * 2^8 = 25.6 s
+K = 3
+
+
+class Trickle:
+    """
+    Args:
+        imin: durée minimale d'un intervalle (s)
+        doublements: nombre de doublements de imin jusqu'à imax
+        k: constante de redondance (annonces cohérentes qui suppriment la nôtre)
+        horloge: source de temps, time.monotonic par défaut
+    """
+
+    def __init__(self, imin: float = IMIN, doublements: int = DOUBLEMENTS, k: int = K,
+                 horloge: Callable[[], float] = time.monotonic):
+        self.imin = imin
+        self.imax = imin * (1 << doublements)
+        self.k = k
+        self.horloge = horloge
+        self.intervalle = imin
+        self._verrou = threading.Lock()
+        self._nouvel_intervalle(horloge())
+
+    def _nouvel_intervalle(self, debut: float):
+        """Verrou tenu (ou dans le constructeur)."""
+        self._debut = debut
+        self._t = debut + random.uniform(self.intervalle / 2, self.intervalle)
+        self._c = 0
+        self._t_passe = False
+
+    def coherent(self):
+        """Annonce entendue, de même état que le nôtre."""
+        with self._verrou:
+            self._c += 1
+
+    def incoherent(self):
+        """Annonce d'un autre état, ou changement local : retour à imin."""
+        with self._verrou:
+            if self.intervalle > self.imin:
+                self.intervalle = self.imin
+                self._nouvel_intervalle(self.horloge())
+
+    def echeance(self) -> float:
+        """Instant du prochain événement (émission prévue ou fin d'intervalle)."""
+        with self._verrou:
+            return self._debut + self.intervalle if self._t_passe else self._t
+
+    def avancer(self) -> bool:
+        """
+        Traite les événements échus. Retourne True si une annonce doit
+        partir maintenant (instant t atteint et moins de k annonces cohérentes).
+        """
+        maintenant = self.horloge()
+        emettre = False
+        with self._verrou:
+            while True:
+                if not self._t_passe:
+                    if maintenant < self._t:
+                        break
+                    self._t_passe = True
+                    emettre = self._c < self.k
+                fin = self._debut + self.intervalle
+                if maintenant < fin:
+                    break
+                self.intervalle = min(2 * self.intervalle, self.imax)
+                self._nouvel_intervalle(fin)
+        return emettre